@@ -1,18 +1,32 @@
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for
+from flask import Flask, render_template, jsonify, request, session, redirect, url_for, g, Response, send_from_directory, stream_with_context, has_request_context, make_response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
+import sys
 import json
+import mimetypes
 import re
 import secrets
+import time
+import bisect
+import math
+import threading
+import random
+import cProfile
+import tracemalloc
+import hashlib
+import zlib
+import concurrent.futures
+import csv
+import io
+from datetime import datetime
+import mmap
+import numpy as np
 from pathlib import Path
-from functools import wraps
-try:
-    from pypdf import PdfReader
-except ImportError:
-    import PyPDF2
-    PdfReader = PyPDF2.PdfReader
-from docx import Document
+from functools import wraps, lru_cache
+from contextlib import contextmanager, nullcontext, ExitStack
+from collections import OrderedDict
 
 app = Flask(__name__)
 CORS(app)
@@ -22,23 +36,445 @@ app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
 
 # Default credentials (should be changed via environment variables in production)
 DEFAULT_USERNAME = os.environ.get('APP_USERNAME', 'aaron')
-# Use pbkdf2:sha256 method for compatibility
-_default_password = os.environ.get('APP_PASSWORD', 'm05pass2025')
-DEFAULT_PASSWORD_HASH = os.environ.get('APP_PASSWORD_HASH', generate_password_hash(_default_password, method='pbkdf2:sha256'))
 
-# Directories
+@lru_cache(maxsize=None)
+def default_password_hash():
+    """Password hash to check logins against
+    
+    Hashing APP_PASSWORD is slow (pbkdf2), so it is done on first use or by the
+    startup warm-up rather than at import. Setting APP_PASSWORD_HASH skips it.
+    """
+    if os.environ.get('APP_PASSWORD_HASH'):
+        return os.environ['APP_PASSWORD_HASH']
+    # Use pbkdf2:sha256 method for compatibility
+    return generate_password_hash(os.environ.get('APP_PASSWORD', 'm05pass2025'), method='pbkdf2:sha256')
+
+# Directories (for the default module; others live in modules/<NAME>/exam_papers and study_text)
 EXAM_PAPERS_DIR = Path("exam_papers")
 STUDY_TEXT_DIR = Path("study_text")
 QUESTIONS_FILE = Path("questions.json")
+QUESTION_ALIASES_FILE = Path("question_aliases.json")  # Old question ID -> current ID
+# Saved quiz results, one folder per user (results_history.json is the single-file history it replaced)
+RESULTS_DIR = Path(os.environ.get('RESULTS_DIR', 'results'))
+RESULTS_HISTORY_FILE = Path("results_history.json")
+MODULES_DIR = Path(os.environ.get('MODULES_DIR', 'modules'))
+DEFAULT_MODULE = os.environ.get('DEFAULT_MODULE', 'M05').upper()
+# Approximate memory loaded modules may use before the least recently used are unloaded
+MODULE_MEMORY_BUDGET_MB = float(os.environ.get('MODULE_MEMORY_BUDGET_MB', '512'))
+FEEDBACK_CACHE_SIZE = int(os.environ.get('FEEDBACK_CACHE_SIZE', '5000'))
+# Explanations are built off the request thread; results wait this long to be collected
+FEEDBACK_WORKERS = int(os.environ.get('FEEDBACK_WORKERS', '4'))
+FEEDBACK_JOB_LIMIT = int(os.environ.get('FEEDBACK_JOB_LIMIT', '10000'))
+FEEDBACK_MAX_WAIT_SECONDS = float(os.environ.get('FEEDBACK_MAX_WAIT_SECONDS', '25'))
+# Explanations waiting for a worker beyond this and new ones are turned away with a 503
+FEEDBACK_QUEUE_LIMIT = int(os.environ.get('FEEDBACK_QUEUE_LIMIT', '200'))
+# Requests allowed to block at once waiting for an explanation (long polls and wait_for_explanation)
+FEEDBACK_MAX_WAITERS = int(os.environ.get('FEEDBACK_MAX_WAITERS', '32'))
+# Admission control for the expensive endpoints: requests running at once, requests allowed to
+# wait for a slot (and for how long), and each session's sustained rate (per second) and burst
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '5'))
+RETRIEVAL_CONCURRENCY = int(os.environ.get('RETRIEVAL_CONCURRENCY', '4'))
+RETRIEVAL_QUEUE = int(os.environ.get('RETRIEVAL_QUEUE', '16'))
+RETRIEVAL_RATE = float(os.environ.get('RETRIEVAL_RATE', '5'))
+RETRIEVAL_BURST = int(os.environ.get('RETRIEVAL_BURST', '30'))
+RELOAD_RATE = float(os.environ.get('RELOAD_RATE', '0.1'))
+RELOAD_BURST = int(os.environ.get('RELOAD_BURST', '2'))
+STREAM_CONCURRENCY = int(os.environ.get('STREAM_CONCURRENCY', '2'))
+STREAM_QUEUE = int(os.environ.get('STREAM_QUEUE', '4'))
+STREAM_RATE = float(os.environ.get('STREAM_RATE', '0.2'))
+STREAM_BURST = int(os.environ.get('STREAM_BURST', '3'))
+# Estimated Jaccard similarity (question + options) above which two questions count as repeats
+DUPLICATE_THRESHOLD = float(os.environ.get('DUPLICATE_THRESHOLD', '0.7'))
+# Most questions /api/questions/batch returns in one request
+MAX_BATCH_QUESTIONS = int(os.environ.get('MAX_BATCH_QUESTIONS', '200'))
+OCR_CORRECTIONS_FILE = Path(os.environ.get('OCR_CORRECTIONS_FILE', 'ocr_corrections.json'))
+# Memory-mapped copies of the normalised study text, shared by every worker process
+STUDY_TEXT_STORE_DIR = Path(os.environ.get('STUDY_TEXT_STORE_DIR', '.study_text_store'))
+# Written by build_assets.py: logical static file name -> minified, content-hashed copy in static/dist/
+ASSET_DIST_DIR = Path("static") / "dist"
+ASSET_MANIFEST_FILE = ASSET_DIST_DIR / "manifest.json"
+# How many earlier offline bank versions to remember for incremental sync (older clients get a full copy)
+OFFLINE_VERSION_HISTORY = int(os.environ.get('OFFLINE_VERSION_HISTORY', '20'))
+
+# Startup: 'background' binds the port immediately and builds the study text index on a
+# background thread; 'eager' builds everything before serving (the old behaviour)
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'background').lower()
+# How long a request waits for the background build before getting a 503 "warming up"
+WARMUP_WAIT_SECONDS = float(os.environ.get('WARMUP_WAIT_SECONDS', '10'))
+# After a failed warm-up, the next request (at most this often) or a reload retries the build
+STARTUP_RETRY_SECONDS = float(os.environ.get('STARTUP_RETRY_SECONDS', '30'))
+
+# Metrics (exposed on /metrics in Prometheus text format)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # If set, /metrics requires "Authorization: Bearer <token>"
+
+class Metrics:
+    """In-process counters, gauges and latency histograms
+    
+    Recording is a dict lookup and a bucket increment under a lock; the
+    Prometheus text is only built when /metrics is scraped.
+    """
+    
+    # Latency buckets in seconds
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    
+    DESCRIPTIONS = {
+        'm05_requests_total': ('counter', 'HTTP requests by endpoint, method and status'),
+        'm05_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint'),
+        'm05_stage_duration_seconds': ('histogram', 'Time spent in named processing stages'),
+        'm05_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit/miss)'),
+        'm05_corpus_generation': ('gauge', 'Number of times each module\'s question corpus has been rebuilt'),
+        'm05_corpus_questions': ('gauge', 'Questions in each module\'s current corpus'),
+        'm05_module_evictions_total': ('counter', 'Modules unloaded to stay within the memory budget'),
+        'm05_admission_rejections_total': ('counter', 'Requests turned away by admission control, by class and reason'),
+        'm05_admission_wait_seconds': ('histogram', 'Time admitted requests waited for a slot, by class'),
+        'm05_admission_in_progress': ('gauge', 'Requests running in each admission class'),
+        'm05_admission_queued': ('gauge', 'Requests waiting for a slot in each admission class'),
+    }
+    
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.gauges = {}      # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+    
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items())) if labels else ()
+    
+    def inc(self, name, labels=None, amount=1):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def set_gauge(self, name, value, labels=None):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+    
+    def observe(self, name, value, labels=None):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        index = bisect.bisect_left(self.BUCKETS, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(self.BUCKETS) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+    
+    @contextmanager
+    def timer(self, stage):
+        """Time a block of code as a named stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('m05_stage_duration_seconds', time.perf_counter() - start, {'stage': stage})
+    
+    def timed(self, stage):
+        """Decorator form of timer()"""
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return f(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    @staticmethod
+    def _format_labels(labels, extra=None):
+        items = list(labels) + ([extra] if extra else [])
+        if not items:
+            return ''
+        escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in items]
+        return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+    
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = {key: list(values) for key, values in self.histograms.items()}
+        
+        by_name = {}
+        for (name, labels), value in list(counters.items()) + list(gauges.items()):
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), values in histograms.items():
+            by_name.setdefault(name, []).append((labels, values))
+        
+        lines = []
+        for name in sorted(by_name):
+            metric_type, help_text = self.DESCRIPTIONS.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+                if metric_type != 'histogram':
+                    lines.append(f'{name}{self._format_labels(labels)} {value}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS, value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self._format_labels(labels, ("le", bound))} {cumulative}')
+                cumulative += value[len(self.BUCKETS)]
+                lines.append(f'{name}_bucket{self._format_labels(labels, ("le", "+Inf"))} {cumulative}')
+                lines.append(f'{name}_sum{self._format_labels(labels)} {value[-1]}')
+                lines.append(f'{name}_count{self._format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics(enabled=METRICS_ENABLED)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that records time spent encoding responses"""
+    
+    def dumps(self, obj, **kwargs):
+        with metrics.timer('json_encode'):
+            return super().dumps(obj, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+# Request profiling (off unless a sample rate or slow threshold is set)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))  # Fraction of requests to profile (0-1)
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', '0'))  # Keep profiles of requests slower than this (0 = off)
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', 'profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '50'))
+# Trace Python allocations from startup with this many frames per traceback (0 = only from the first snapshot)
+TRACEMALLOC_FRAMES = int(os.environ.get('TRACEMALLOC_FRAMES', '0'))
+if TRACEMALLOC_FRAMES > 0:
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+
+class RequestProfiler:
+    """Capture cProfile dumps for a sample of live requests and/or slow requests
+    
+    Dumps are written to PROFILE_DIR as <timestamp>_<endpoint>_<ms>ms.prof and
+    the oldest are deleted once there are more than PROFILE_MAX_FILES.
+    Inspect them with `python -m pstats <file>` or snakeviz.
+    """
+    
+    def __init__(self, sample_rate=0.0, slow_ms=0.0, directory=PROFILE_DIR, max_files=PROFILE_MAX_FILES):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.lock = threading.Lock()
+    
+    @property
+    def active(self):
+        return self.sample_rate > 0 or self.slow_ms > 0
+    
+    def configure(self, sample_rate=None, slow_ms=None, max_files=None):
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if slow_ms is not None:
+            self.slow_ms = max(float(slow_ms), 0.0)
+        if max_files is not None:
+            self.max_files = max(int(max_files), 1)
+    
+    def settings(self):
+        return {
+            'sample_rate': self.sample_rate,
+            'slow_ms': self.slow_ms,
+            'directory': str(self.directory),
+            'max_files': self.max_files,
+            'captures': self.list_captures(),
+        }
+    
+    def start(self):
+        """Start profiling the current request if it is sampled (or a slow threshold is set)
+        
+        Returns (profiler, sampled) or (None, False) when the request is not profiled.
+        A slow threshold means every request has to be profiled, since we only know
+        it was slow once it has finished, so it costs more than sampling alone.
+        """
+        if not self.active:
+            return None, False
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and self.slow_ms <= 0:
+            return None, False
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this interpreter (Python 3.12+)
+            return None, False
+        return profiler, sampled
+    
+    def finish(self, profiler, sampled, endpoint, elapsed):
+        """Stop profiling and keep the dump if the request was sampled or slow"""
+        profiler.disable()
+        elapsed_ms = elapsed * 1000
+        if not sampled and not (self.slow_ms > 0 and elapsed_ms >= self.slow_ms):
+            return None
+        
+        timestamp = time.strftime('%Y%m%d-%H%M%S') + f'-{int(time.time() * 1000) % 1000:03d}'
+        safe_endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint or 'unmatched')
+        file_path = self.directory / f'{timestamp}_{safe_endpoint}_{int(elapsed_ms)}ms.prof'
+        try:
+            with self.lock:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(str(file_path))
+                self.rotate()
+        except OSError as e:
+            print(f"Error writing profile {file_path}: {e}")
+            return None
+        return file_path
+    
+    def list_captures(self):
+        if not self.directory.exists():
+            return []
+        return sorted(p.name for p in self.directory.glob('*.prof'))
+    
+    def rotate(self):
+        """Delete the oldest dumps beyond max_files"""
+        captures = sorted(self.directory.glob('*.prof'), key=lambda p: p.stat().st_mtime)
+        for old_file in captures[:max(len(captures) - self.max_files, 0)]:
+            try:
+                old_file.unlink()
+            except OSError:
+                pass
+
+request_profiler = RequestProfiler(PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS)
+
+class AssetManifest:
+    """Point templates at the fingerprinted static files built by build_assets.py
+    
+    Falls back to the plain /static/ files when no build exists, and in debug mode
+    so edits show up without rebuilding.
+    """
+    
+    def __init__(self, manifest_file):
+        self.manifest_file = manifest_file
+        self.files = self.load()
+    
+    def load(self):
+        if not self.manifest_file.exists():
+            return {}
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading asset manifest from {self.manifest_file}: {e}")
+            return {}
+    
+    def url(self, name):
+        fingerprinted = None if app.debug else self.files.get(name)
+        if fingerprinted:
+            return url_for('fingerprinted_asset', filename=fingerprinted)
+        return url_for('static', filename=name)
+
+asset_manifest = AssetManifest(ASSET_MANIFEST_FILE)
+
+@app.context_processor
+def inject_asset_url():
+    return {'asset_url': asset_manifest.url}
+
+class TextNormalizer:
+    """Clean source text once when it is loaded, so request handlers only see clean text
+    
+    - normalises line endings, dashes and horizontal whitespace
+    - strips PDF headers/footers ("Examination Guide E05", "Page 3 of 20", "1/15", "2025/2026 13"),
+      bullet markers and duplicated headings ("Chapter 1Chapter 1")
+    - applies OCR word corrections from OCR_CORRECTIONS_FILE in a single compiled pass
+    
+    Line breaks are kept because the parsers rely on them.
+    """
+    
+    DASHES = str.maketrans({'‐': '-', '–': '-', '—': '-'})
+    
+    # PDF artifacts, removed in one pass. Only their known shapes are matched, so ordinary
+    # sentences mentioning "page 12" or "the Examination Guide" are left alone
+    ARTIFACTS = re.compile(r"""
+        ^[ \t]*(?:(?:Examination[ \t]+Guide(?:[ \t]+(?:E\d+|\d{4}/\d{4}(?:[ \t]+\d+)?))?[ \t]*)+  # header lines
+                 | Page[ \t]+\d+(?:[ \t]+of[ \t]+\d+)?[ \t]*     # "Page 3" / "Page 3 of 20" footers
+                 | \d+/\d+[ \t]*                                # "1/15" page numbers
+                 | \d{4}/\d{4}[ \t]+\d+[ \t]*                     # "2025/2026 13" footers
+                )$\n?                                         # (removed with their newline)
+        | [ \t]*\bExamination[ \t]+Guide[ \t]+(?:E\d+|\d{4}/\d{4}(?:[ \t]+\d+)?)\b  # header text glued onto content
+        | [ \t]*\b\d{4}/\d{4}[ \t]+\d+[ \t]*$                # footer glued onto a line of content
+        | ^[ \t]*(?:-{3,}|={3,}|_{3,})[ \t]*$              # separator rules (the blank line still splits paragraphs)
+        | ^[ \t]*[•*-][ \t]+                            # bullet markers at line start
+        | [ \t]*•[ \t]*                                  # stray bullets
+        """, re.MULTILINE | re.IGNORECASE | re.VERBOSE)
+    
+    # Headings repeated back to back by PDF extraction, e.g. "Chapter 1Chapter 1"
+    DUPLICATED_HEADING = re.compile(r'\b((?:Chapter|Section|Part|Unit)[ \t]\d+)[ \t]*\1\b', re.IGNORECASE)
+    
+    HORIZONTAL_SPACE = re.compile(r'[ \t\f\v\xa0]+')
+    TRAILING_SPACE = re.compile(r' +$', re.MULTILINE)
+    
+    def __init__(self, corrections=None):
+        self.corrections = {k.lower(): v for k, v in (corrections or {}).items()}
+        if self.corrections:
+            # Whole whitespace-delimited words, optionally followed by one punctuation mark
+            words = '|'.join(re.escape(w) for w in sorted(self.corrections, key=len, reverse=True))
+            self.ocr_pattern = re.compile(rf'(?<!\S)({words})(?=[.,!?;:]?(?!\S))', re.IGNORECASE)
+        else:
+            self.ocr_pattern = None
+    
+    @classmethod
+    def from_file(cls, file_path):
+        """Load OCR corrections from a JSON file mapping wrong word -> correct word"""
+        file_path = Path(file_path)
+        if not file_path.exists():
+            return cls()
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return cls(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error loading OCR corrections from {file_path}: {e}")
+            return cls()
+    
+    def _correct_word(self, match):
+        word = match.group(1)
+        corrected = self.corrections[word.lower()]
+        # Preserve original capitalization
+        return corrected.capitalize() if word[0].isupper() else corrected
+    
+    def fix_ocr_errors(self, text):
+        """Apply the OCR word corrections"""
+        if not text or self.ocr_pattern is None:
+            return text
+        return self.ocr_pattern.sub(self._correct_word, text)
+    
+    def normalize(self, text, fix_ocr=True):
+        """Run the full cleaning pipeline over a document"""
+        if not text:
+            return text
+        text = text.replace('\r\n', '\n').replace('\r', '\n').translate(self.DASHES)
+        text = self.ARTIFACTS.sub('', text)
+        text = self.DUPLICATED_HEADING.sub(r'\1', text)
+        if fix_ocr:
+            text = self.fix_ocr_errors(text)
+        text = self.HORIZONTAL_SPACE.sub(' ', text)
+        return self.TRAILING_SPACE.sub('', text)
+    
+    def normalize_line(self, text):
+        """Normalise a short snippet (e.g. an explanation) onto a single line"""
+        return re.sub(r'\s+', ' ', self.normalize(text)).strip()
+
+text_normalizer = TextNormalizer.from_file(OCR_CORRECTIONS_FILE)
 
 class QuestionParser:
     """Parse questions from exam papers"""
     
     @staticmethod
+    @metrics.timed('extract_text')
     def extract_text_from_pdf(pdf_path):
         """Extract text from PDF file"""
         text = ""
         try:
+            # Imported here so startup doesn't pay for the PDF library unless a PDF is present
+            try:
+                from pypdf import PdfReader
+            except ImportError:
+                from PyPDF2 import PdfReader
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PdfReader(file)
                 for page in pdf_reader.pages:
@@ -48,10 +484,12 @@ class QuestionParser:
         return text
     
     @staticmethod
+    @metrics.timed('extract_text')
     def extract_text_from_docx(docx_path):
         """Extract text from DOCX file"""
         text = ""
         try:
+            from docx import Document  # Imported here, only needed when a DOCX is present
             doc = Document(docx_path)
             for para in doc.paragraphs:
                 text += para.text + "\n"
@@ -60,6 +498,7 @@ class QuestionParser:
         return text
     
     @staticmethod
+    @metrics.timed('parse_questions')
     def parse_questions(text):
         """Parse multiple choice questions from text (works for both PDF and text files)"""
         questions = []
@@ -137,12 +576,9 @@ class QuestionParser:
                 elif current_option:
                     # Continue current option (multi-line option text)
                     # Only append if line doesn't look like a new question or option
-                    # Also skip common PDF artifacts (headers, footers, page numbers)
+                    # (PDF headers, footers and page numbers were stripped by text_normalizer)
                     if (not re.match(r'^\d+[\.\)]', line) and 
                         not re.match(r'^[A-E][\.\)]', line) and
-                        not re.search(r'Examination\s+Guide\s+E\d+', line, re.IGNORECASE) and
-                        not re.search(r'\d{4}/\d{4}\s+\d+$', line) and
-                        not re.search(r'^Page\s+\d+', line, re.IGNORECASE) and
                         len(line.strip()) > 0):
                         current_option['text'] += ' ' + line
             
@@ -153,19 +589,12 @@ class QuestionParser:
             # Clean up option text
             for opt in options:
                 opt['text'] = re.sub(r'\s+', ' ', opt['text']).strip()
-                # Remove common PDF artifacts (page numbers, headers, footers)
-                # Remove patterns like "Examination Guide E05 Examination Guide 2025/2026 13"
-                opt['text'] = re.sub(r'\s*Examination\s+Guide\s+E\d+.*?$', '', opt['text'], flags=re.IGNORECASE)
-                opt['text'] = re.sub(r'\s*Examination\s+Guide.*?$', '', opt['text'], flags=re.IGNORECASE)
-                opt['text'] = re.sub(r'\s*\d{4}/\d{4}\s+\d+.*?$', '', opt['text'])  # Remove "2025/2026 13" patterns
-                opt['text'] = re.sub(r'\s*Page\s+\d+.*?$', '', opt['text'], flags=re.IGNORECASE)
+                # Headers, footers and "Page N" lines were stripped by text_normalizer
                 # Remove trailing standalone numbers that are likely page numbers (but preserve if part of sentence)
                 # Only remove if it's a standalone number at the end (not part of text like "2021" in a sentence)
                 opt['text'] = re.sub(r'\s+\d{1,2}\s*$', '', opt['text'])  # Remove trailing 1-2 digit numbers (likely page refs)
                 # Remove common footer/header patterns
                 opt['text'] = re.sub(r'^\d+/\d+\s*', '', opt['text'])  # Remove page numbers like "1/15"
-                # Remove any remaining "Examination Guide" text
-                opt['text'] = re.sub(r'\s*Examination\s+Guide.*', '', opt['text'], flags=re.IGNORECASE)
                 opt['text'] = re.sub(r'\s+', ' ', opt['text']).strip()
                 # Preserve trailing periods if they're part of the option text (don't remove them)
                 # Only remove if it's clearly an artifact (multiple periods or periods with spaces)
@@ -214,7 +643,7 @@ class QuestionParser:
             # Only add if we have a valid question with at least 2 options
             if clean_question and len(options) >= 2 and len(clean_question) > 10:
                 questions.append({
-                    'id': None,  # Will be assigned in load_questions_from_files
+                    'id': None,  # Will be assigned in load_questions_from_files (stable_question_id)
                     'question': clean_question,
                     'options': options,
                     'correct_answer': correct_answer or options[0]['letter'],  # Default to first if not found
@@ -227,6 +656,7 @@ class QuestionParser:
         return questions
     
     @staticmethod
+    @metrics.timed('extract_answer_key')
     def extract_answer_key(text):
         """Extract answer key and learning objectives from text (look for 'Specimen Examination Answers' section)"""
         answer_key = {}
@@ -283,77 +713,164 @@ class QuestionParser:
         return answer_key, learning_objectives
     
     @staticmethod
-    def load_questions_from_files():
-        """Load and parse questions from all exam papers"""
-        all_questions = []
-        global_id_counter = 1  # Global counter to ensure unique IDs across all papers
-        
-        if not EXAM_PAPERS_DIR.exists():
-            EXAM_PAPERS_DIR.mkdir()
-            return all_questions
-        
-        for file_path in sorted(EXAM_PAPERS_DIR.iterdir()):  # Sort for consistent ordering
-            if file_path.suffix.lower() == '.pdf':
-                text = QuestionParser.extract_text_from_pdf(file_path)
-            elif file_path.suffix.lower() == '.docx':
-                text = QuestionParser.extract_text_from_docx(file_path)
-            elif file_path.suffix.lower() in ['.txt', '.rtf']:
-                # RTF files are text-based and can be read as text
-                # They may contain RTF formatting codes, but the parser will handle them
-                text = file_path.read_text(encoding='utf-8')
-            else:
-                continue
-            
+    def stable_question_id(source_file, question_number, question_text):
+        """Derive a question's ID from its paper, question number and normalised text
+        
+        Adding a paper or editing another question doesn't renumber anything, and
+        cosmetic edits (case, punctuation, whitespace) keep the same ID. 13 hex
+        digits keeps the ID below 2**53 so it survives JavaScript numbers.
+        """
+        text_key = re.sub(r'[^a-z0-9]+', ' ', question_text.lower()).strip()
+        text_hash = hashlib.sha1(text_key.encode('utf-8')).hexdigest()[:12]
+        key = f"{Path(source_file).stem}|{question_number}|{text_hash}"
+        return int(hashlib.sha1(key.encode('utf-8')).hexdigest()[:13], 16)
+    
+    @staticmethod
+    def content_hash(question):
+        """Hash of everything shown or graded for a question (changes if any of it is edited)"""
+        content = [question['question'], question['options'], question.get('correct_answer'),
+                   question.get('learning_objective')]
+        return hashlib.sha1(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    
+    @staticmethod
+    def iter_paper_files(exam_papers_dir=EXAM_PAPERS_DIR):
+        """Exam paper files, sorted for consistent ordering"""
+        if not exam_papers_dir.exists():
+            exam_papers_dir.mkdir(parents=True)
+            return
+        for file_path in sorted(exam_papers_dir.iterdir()):
+            if file_path.suffix.lower() in ('.pdf', '.docx', '.txt', '.rtf'):
+                yield file_path
+    
+    @staticmethod
+    def extract_text(file_path):
+        if file_path.suffix.lower() == '.pdf':
+            return QuestionParser.extract_text_from_pdf(file_path)
+        if file_path.suffix.lower() == '.docx':
+            return QuestionParser.extract_text_from_docx(file_path)
+        # RTF files are text-based and can be read as text
+        # They may contain RTF formatting codes, but the parser will handle them
+        return file_path.read_text(encoding='utf-8')
+    
+    @staticmethod
+    def iter_paper_texts(file_paths):
+        for file_path in file_paths:
+            text = QuestionParser.extract_text(file_path)
+            # Strip headers/footers and normalise whitespace once, before any parsing
+            yield file_path, text_normalizer.normalize(text, fix_ocr=False)
+    
+    @staticmethod
+    def iter_parsed_papers(paper_texts):
+        """Yield (file_path, questions, answer_key, learning_objectives) one paper at a time"""
+        for file_path, text in paper_texts:
             # Extract answer key and learning objectives
             answer_key, learning_objectives = QuestionParser.extract_answer_key(text)
-            
             # Parse questions
             questions = QuestionParser.parse_questions(text)
+            yield file_path, questions, answer_key, learning_objectives
+    
+    @staticmethod
+    def enrich_questions(file_path, questions, answer_key, learning_objectives, explanation_answers, seen_ids):
+        """Assign answers, learning objectives and IDs to one paper's questions, preserving order"""
+        for question, exp_answer in zip(questions, explanation_answers):
+            q_num = question.get('question_number', '')
+            q_text = question['question'].strip()
             
-            # Match answers to questions and preserve order
-            # Use explanations file as source of truth (highest priority), then PDF answer key
-            global_explanations = QuestionExplanations()
+            # Highest priority: answer from explanations file (user's source of truth)
+            # Use fuzzy matching to handle slight text differences
+            if exp_answer:
+                question['correct_answer'] = exp_answer
+                # Check if it's multiple choice based on comma in answer
+                question['is_multiple_choice'] = ',' in exp_answer
+            # Second priority: answer from answer key in PDF
+            elif q_num in answer_key:
+                question['correct_answer'] = answer_key[q_num].upper()
+                # Check if it's multiple choice based on comma in answer
+                question['is_multiple_choice'] = ',' in answer_key[q_num]
             
-            for question in questions:
-                q_num = question.get('question_number', '')
-                q_text = question['question'].strip()
-                
-                # Highest priority: answer from explanations file (user's source of truth)
-                # Use fuzzy matching to handle slight text differences
-                exp_answer = global_explanations.get_answer(q_text)
-                if exp_answer:
-                    question['correct_answer'] = exp_answer
-                    # Check if it's multiple choice based on comma in answer
-                    question['is_multiple_choice'] = ',' in exp_answer
-                # Second priority: answer from answer key in PDF
-                elif q_num in answer_key:
-                    question['correct_answer'] = answer_key[q_num].upper()
-                    # Check if it's multiple choice based on comma in answer
-                    question['is_multiple_choice'] = ',' in answer_key[q_num]
-                
-                # Ensure we have a valid answer (fallback to first option if nothing found)
-                if not question.get('correct_answer') or question['correct_answer'] == question['options'][0]['letter']:
-                    # Only use first option as fallback if we truly have no answer
-                    # This will be flagged for manual review
-                    pass
-                
-                if q_num in learning_objectives:
-                    question['learning_objective'] = learning_objectives[q_num]
-                question['source_file'] = file_path.name
-                # Store original question number for sorting
-                question['original_order'] = int(q_num) if q_num.isdigit() else 999999
-                # Assign unique global ID
-                question['id'] = global_id_counter
-                global_id_counter += 1
+            # Ensure we have a valid answer (fallback to first option if nothing found)
+            if not question.get('correct_answer') or question['correct_answer'] == question['options'][0]['letter']:
+                # Only use first option as fallback if we truly have no answer
+                # This will be flagged for manual review
+                pass
             
-            all_questions.extend(questions)
+            if q_num in learning_objectives:
+                question['learning_objective'] = learning_objectives[q_num]
+            question['source_file'] = file_path.name
+            # Store original question number for sorting
+            question['original_order'] = int(q_num) if q_num.isdigit() else 999999
+            # Assign an ID derived from the question itself (stable across reloads)
+            question_id = QuestionParser.stable_question_id(file_path.name, q_num, q_text)
+            while question_id in seen_ids:
+                # Same number and text twice in one paper - still deterministic
+                question_id += 1
+            seen_ids.add(question_id)
+            question['id'] = question_id
+            question['content_hash'] = QuestionParser.content_hash(question)
+            yield question
+    
+    @staticmethod
+    def iter_questions(exam_papers_dir=EXAM_PAPERS_DIR, study_text_dir=STUDY_TEXT_DIR):
+        """Stream enriched questions: file -> extracted text -> parsed paper -> enriched question
+        
+        Only one paper is held at a time, so memory doesn't grow with the size of
+        the bank. Yields the same questions, in the same order, as
+        load_questions_from_files() (minus the clustering the corpus adds).
+        """
+        explanations = QuestionExplanations(study_text_dir)
+        seen_ids = set()
+        papers = QuestionParser.iter_parsed_papers(
+            QuestionParser.iter_paper_texts(QuestionParser.iter_paper_files(exam_papers_dir))
+        )
+        for file_path, questions, answer_key, learning_objectives in papers:
+            # Explanations file first (source of truth), then the PDF answer key
+            explanation_answers = explanations.get_answers([q['question'].strip() for q in questions])
+            yield from QuestionParser.enrich_questions(file_path, questions, answer_key, learning_objectives,
+                                                       explanation_answers, seen_ids)
+    
+    @staticmethod
+    def load_questions_from_files(exam_papers_dir=EXAM_PAPERS_DIR, study_text_dir=STUDY_TEXT_DIR):
+        """Load and parse questions from all exam papers"""
+        # First pass: parse every paper
+        papers = list(QuestionParser.iter_parsed_papers(
+            QuestionParser.iter_paper_texts(QuestionParser.iter_paper_files(exam_papers_dir))
+        ))
+        
+        # Match every question against the explanations file in one batch
+        # Use explanations file as source of truth (highest priority), then PDF answer key
+        global_explanations = QuestionExplanations(study_text_dir)
+        explanation_answers = global_explanations.get_answers(
+            [q['question'].strip() for _, questions, _, _ in papers for q in questions]
+        )
+        
+        # Second pass: assign answers, learning objectives and IDs, preserving order
+        all_questions = []
+        seen_ids = set()
+        answer_index = 0
+        for file_path, questions, answer_key, learning_objectives in papers:
+            paper_answers = explanation_answers[answer_index:answer_index + len(questions)]
+            answer_index += len(questions)
+            all_questions.extend(QuestionParser.enrich_questions(
+                file_path, questions, answer_key, learning_objectives, paper_answers, seen_ids
+            ))
         
         return all_questions
 
 class QuestionExplanations:
     """Load and match pre-written explanations for questions"""
     
-    def __init__(self):
+    # Line types recognised by parse_explanations()
+    SEPARATOR_LINE = re.compile(r'^\s*(?:-{3,}|={3,})')
+    # "Question: ..." / "Q12: ..." or a "Question 12 [Learning Outcome 1.2]" header
+    QUESTION_LINE = re.compile(r'^\s*(?:(?:Question\s*\d*|Q\d*)\s*:\s*(?P<text>.*)'
+                               r'|(?P<header>Question\s+\d+)\b\s*(?P<outcome>\[.*\])?\s*(?P<rest>.*))$', re.IGNORECASE)
+    OPTION_LINE = re.compile(r'^\s*[A-E]\.\s', re.IGNORECASE)
+    ANSWER_LINE = re.compile(r'^\s*(?:Answer|A)\s*:\s*(.*)', re.IGNORECASE)
+    ANSWER_VALUE = re.compile(r'([A-E](?:,\s*[A-E])*)', re.IGNORECASE)
+    EXPLANATION_LINE = re.compile(r'^\s*(?:Explanation|E)\s*:\s*(.*)', re.IGNORECASE)
+    
+    def __init__(self, study_text_dir=STUDY_TEXT_DIR):
+        self.study_text_dir = study_text_dir
         self.explanations = {}  # Maps question text (normalized) to explanation
         self.load_explanations()
     
@@ -367,29 +884,33 @@ class QuestionExplanations:
         normalized = normalized.replace('‐', '-').replace('–', '-').replace('—', '-')
         return normalized
     
-    def load_explanations(self):
-        """Load explanations from text file in study_text directory"""
-        if not STUDY_TEXT_DIR.exists():
-            return
-        
+    @staticmethod
+    def explanation_files(study_text_dir):
+        """The explanations bank files in a study text directory"""
+        if not study_text_dir.exists():
+            return []
         # Look for explanation files (could be .txt, .md, etc.)
         explanation_files = []
-        for file_path in STUDY_TEXT_DIR.iterdir():
+        for file_path in sorted(study_text_dir.iterdir()):
             if file_path.suffix.lower() in ['.txt', '.md']:
                 # Check if filename suggests it's an explanations file
                 filename_lower = file_path.name.lower()
                 if 'explanation' in filename_lower or 'answer' in filename_lower or 'concept' in filename_lower:
                     explanation_files.append(file_path)
-        
-        for file_path in explanation_files:
+        return explanation_files
+    
+    @metrics.timed('load_explanations')
+    def load_explanations(self):
+        """Load explanations from text file in study_text directory"""
+        for file_path in self.explanation_files(self.study_text_dir):
             try:
-                text = file_path.read_text(encoding='utf-8')
-                self.parse_explanations(text)
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    self.parse_explanations(f)
             except Exception as e:
                 print(f"Error loading explanations from {file_path}: {e}")
     
-    def parse_explanations(self, text):
-        """Parse explanations from text file
+    def parse_explanations(self, lines):
+        """Parse explanations from the lines of a text file, one entry at a time
         
         Supports multiple formats:
         1. Question [number] [Learning Outcome X.X]
@@ -410,60 +931,92 @@ class QuestionExplanations:
         4. [question text]
            Answer: [answer]
            Explanation: [explanation]
-        """
-        # Split by question markers (Question X, QX, or separator lines)
-        # Look for patterns like "Question X" or "Q X" or separator lines
-        sections = re.split(r'\n-{3,}|\n={3,}|(?=\nQuestion\s+\d+)', text, flags=re.MULTILINE)
         
-        for section in sections:
-            if not section.strip():
+        An entry ends at a separator line (--- or ===) or at the next line starting
+        with "Question" or "Q[number]:". The question is the text before the first
+        option or answer line; the explanation runs to the end of the entry, so once
+        it has started every line belongs to it ("A: ..." included) except a
+        separator or a real header. Only the current entry is held in memory, so a
+        file object can be passed in.
+        """
+        entry = self.new_entry()
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if self.SEPARATOR_LINE.match(line):
+                self.add_entry(entry)
+                entry = self.new_entry()
                 continue
             
-            # Pattern 1: "Question X [Learning Outcome X.X]" format
-            question_header_match = re.search(r'Question\s+(\d+)\s*\[.*?\]\s*\n(.+?)(?=\nAnswer:|\n[A-D]\.|$)', section, re.DOTALL | re.IGNORECASE)
-            if question_header_match:
-                question_text = question_header_match.group(2).strip()
-                # Remove options (lines starting with A., B., C., D.)
-                question_text = re.sub(r'^\s*[A-D]\.\s*.+$', '', question_text, flags=re.MULTILINE)
-                question_text = re.sub(r'\s+', ' ', question_text).strip()
-            else:
-                # Pattern 2: "Question: ..." or just question text
-                question_match = re.search(r'(?:Question\s*\d*:|Q\d*:)\s*(.+?)(?:\n|Answer:|$)', section, re.DOTALL | re.IGNORECASE)
-                if not question_match:
-                    # Pattern 3: Question text at start (before options)
-                    # Find text before first option (A., B., C., D.)
-                    question_match = re.search(r'^(.+?)(?=\n\s*[A-D]\.|\n\s*Answer:)', section, re.DOTALL | re.IGNORECASE)
-                    if question_match:
-                        question_text = question_match.group(1).strip()
-                        # Remove "Question X" prefix if present
-                        question_text = re.sub(r'^Question\s+\d+.*?\n', '', question_text, flags=re.IGNORECASE)
-                        question_text = re.sub(r'\[.*?\]', '', question_text)  # Remove [Learning Outcome X.X]
-                        question_text = re.sub(r'\s+', ' ', question_text).strip()
-                    else:
-                        continue
-                else:
-                    question_text = question_match.group(1).strip()
-                    # Clean up question text
-                    question_text = re.sub(r'^\d+[\.\)]\s*', '', question_text)  # Remove leading numbers
-                    question_text = re.sub(r'\[.*?\]', '', question_text)  # Remove [Learning Outcome X.X]
-                    question_text = re.sub(r'\s+', ' ', question_text).strip()
+            question_match = self.QUESTION_LINE.match(line)
+            if question_match and (entry['explanation'] is None or self.is_header(question_match)):
+                self.add_entry(entry)
+                entry = self.new_entry()
+                # "Question 12 [Learning Outcome 1.2]" headers keep the question text as written
+                entry['numbered_header'] = question_match.group('header') is not None
+                line = question_match.group('text') or question_match.group('rest')
+                if not line:
+                    continue
             
-            # Extract answer
-            answer_match = re.search(r'Answer:\s*([A-E](?:,\s*[A-E])*)', section, re.IGNORECASE)
-            answer = answer_match.group(1).strip() if answer_match else ""
+            if entry['explanation'] is not None:
+                entry['explanation'].append(line)
+                continue
+            
+            explanation_match = self.EXPLANATION_LINE.match(line)
+            if explanation_match:
+                entry['in_question'] = False
+                entry['explanation'] = [explanation_match.group(1)]
+                continue
             
-            # Extract explanation
-            explanation_match = re.search(r'Explanation:\s*(.+?)(?=\n\s*(?:Question|Q\d*:|--|==|$|\Z))', section, re.DOTALL | re.IGNORECASE)
-            explanation = explanation_match.group(1).strip() if explanation_match else ""
+            answer_match = self.ANSWER_LINE.match(line)
+            if answer_match:
+                entry['in_question'] = False
+                if not entry['answer']:
+                    value = self.ANSWER_VALUE.match(answer_match.group(1))
+                    entry['answer'] = value.group(1).strip() if value else ''
+                continue
             
-            if question_text and explanation:
-                # Store by normalized question text
-                normalized_q = self.normalize_text(question_text)
-                self.explanations[normalized_q] = {
-                    'explanation': explanation,
-                    'answer': answer
-                }
+            if entry['in_question']:
+                if self.OPTION_LINE.match(line):
+                    entry['in_question'] = False
+                else:
+                    entry['question'].append(line)
+        self.add_entry(entry)
+    
+    @staticmethod
+    def is_header(question_match):
+        """Whether a QUESTION_LINE match inside an explanation starts the next entry
+        
+        "Question:" / "Q12:" labels and bare "Question 12 [Learning Outcome 1.2]"
+        headers do; a sentence that merely begins "Question 5 ..." does not.
+        """
+        return (question_match.group('header') is None or question_match.group('outcome') is not None
+                or not question_match.group('rest'))
+    
+    @staticmethod
+    def new_entry():
+        return {'question': [], 'answer': '', 'explanation': None, 'in_question': True, 'numbered_header': False}
+    
+    def add_entry(self, entry):
+        """Store a parsed entry if it has both a question and an explanation"""
+        question_text = ' '.join(entry['question'])
+        if not entry['numbered_header']:
+            question_text = re.sub(r'^\s*\d+[\.\)]\s*', '', question_text)  # Remove leading numbers
+            question_text = re.sub(r'\[.*?\]', '', question_text)  # Remove [Learning Outcome X.X]
+        question_text = re.sub(r'\s+', ' ', question_text).strip()
+        explanation = '\n'.join(entry['explanation'] or []).strip()
+        if not question_text or not explanation:
+            return
+        # Clean the explanation once here rather than on every feedback request
+        explanation = text_normalizer.normalize_line(explanation)
+        if not explanation.endswith(('.', '!', '?')):
+            explanation += '.'
+        # Store by normalized question text
+        self.explanations[self.normalize_text(question_text)] = {
+            'explanation': explanation,
+            'answer': entry['answer']
+        }
     
+    @metrics.timed('explanation_match')
     def get_explanation(self, question_text):
         """Get pre-written explanation for a question if available"""
         normalized_q = self.normalize_text(question_text)
@@ -510,6 +1063,72 @@ class QuestionExplanations:
         
         return best_match
     
+    @metrics.timed('explanation_match_batch')
+    def get_answers(self, question_texts, chunk_size=512):
+        """Batch version of get_answer(): same thresholds, same results, for many questions
+        
+        Builds binary term vectors for the questions and the stored explanation
+        questions and gets every word overlap from one matrix product per chunk
+        of questions. The substring check get_answer() applies first is only
+        run on pairs that already pass the overlap thresholds.
+        """
+        results = [None] * len(question_texts)
+        stored = list(self.explanations.items())
+        if not question_texts or not stored:
+            return results
+        
+        normalized = [self.normalize_text(text) for text in question_texts]
+        pending = []
+        for i, normalized_q in enumerate(normalized):
+            # Try exact match first
+            if normalized_q in self.explanations:
+                results[i] = self.explanations[normalized_q].get('answer', '').strip().upper()
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+        
+        # Term-incidence matrix for the stored questions (vocabulary = their words)
+        vocabulary = {}
+        stored_words = [set(stored_q.split()) for stored_q, _ in stored]
+        for words in stored_words:
+            for word in words:
+                vocabulary.setdefault(word, len(vocabulary))
+        stored_matrix = np.zeros((len(stored), len(vocabulary)), dtype=np.float32)
+        for row, words in enumerate(stored_words):
+            stored_matrix[row, [vocabulary[w] for w in words]] = 1.0
+        stored_sizes = np.array([len(words) for words in stored_words], dtype=np.float64)
+        
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            question_words = [set(normalized[i].split()) for i in chunk]
+            question_matrix = np.zeros((len(chunk), len(vocabulary)), dtype=np.float32)
+            for row, words in enumerate(question_words):
+                columns = [vocabulary[w] for w in words if w in vocabulary]
+                if columns:
+                    question_matrix[row, columns] = 1.0
+            question_sizes = np.array([len(words) for words in question_words], dtype=np.float64)
+            
+            # Counts are exact in float32; divide in float64 to match get_answer() exactly
+            overlap = (question_matrix @ stored_matrix.T).astype(np.float64)
+            similarity = overlap / np.maximum(np.maximum(stored_sizes[None, :], question_sizes[:, None]), 1)
+            eligible = (similarity >= 0.6) | (overlap >= 8)
+            
+            for row, i in enumerate(chunk):
+                columns = np.flatnonzero(eligible[row])
+                if not columns.size:
+                    continue
+                normalized_q = normalized[i]
+                key_phrase = ' '.join(normalized_q.split()[:20])
+                # Best similarity first; ties go to the earliest entry, as in get_answer()
+                for column in columns[np.lexsort((columns, -similarity[row, columns]))]:
+                    stored_q, data = stored[column]
+                    if key_phrase in stored_q or stored_q in normalized_q:
+                        results[i] = data.get('answer', '').strip().upper()
+                        break
+        return results
+    
+    @metrics.timed('explanation_match')
     def get_answer(self, question_text):
         """Get answer from explanations file for a question if available"""
         normalized_q = self.normalize_text(question_text)
@@ -539,116 +1158,370 @@ class QuestionExplanations:
         
         return best_match
 
+class StudyTextStore:
+    """Study text paragraphs in flat files, read through mmap
+    
+    Each paragraph retrieval could return is written once, as cleaned, to
+    <key>.text and lowercased (for keyword search) to <key>.lower, with a table
+    of paragraph byte offsets in <key>.offsets.npy. Paragraphs short enough to
+    be shown whole also get their sentences written to <key>.sentences, with
+    the flags feedback needs for each one (instructional, explanatory, word
+    count) in <key>.sentences.npy. Every worker maps the same files, so the
+    study text sits once in the OS page cache rather than as Python strings in
+    each process, and a lookup decodes only the paragraphs that contain one of
+    its keywords. The files are rebuilt when a study text file (or the OCR
+    corrections) change.
+    
+    A store is opened once and never changed afterwards: a reload opens a new
+    one and swaps it in, so a request that holds on to one store always reads
+    offsets and text from the same build.
+    """
+    
+    VERSION = 2
+    # Paragraph table columns (the sentence range and section flags are -1 if not prepared)
+    (FILE, TEXT_START, TEXT_END, LOWER_START, LOWER_END,
+     SENTENCE_FIRST, SENTENCE_END, INSTRUCTIONAL, EXPLANATORY_MATCHES) = range(9)
+    # Sentence table columns
+    SENTENCE_START, SENTENCE_STOP, SENTENCE_INSTRUCTIONAL, SENTENCE_EXPLANATORY, SENTENCE_WORDS = range(5)
+    
+    def __init__(self, study_text_dir, store_dir=STUDY_TEXT_STORE_DIR):
+        self.study_text_dir = study_text_dir
+        self.store_dir = store_dir
+        key = hashlib.sha1(str(study_text_dir.resolve()).encode('utf-8')).hexdigest()[:12]
+        self.text_path = store_dir / f"{key}.text"
+        self.lower_path = store_dir / f"{key}.lower"
+        self.offsets_path = store_dir / f"{key}.offsets.npy"
+        self.sentences_path = store_dir / f"{key}.sentences"
+        self.sentence_table_path = store_dir / f"{key}.sentences.npy"
+        self.meta_path = store_dir / f"{key}.json"
+        self.files = []  # Study text file names, in the order they were read
+        self.offsets = np.zeros((0, 9), dtype=np.int64)
+        self.sentence_table = np.zeros((0, 5), dtype=np.int64)
+        self.text = b''
+        self.lower = b''
+        self.sentences = b''
+    
+    def data_paths(self):
+        return (self.text_path, self.lower_path, self.offsets_path, self.sentences_path, self.sentence_table_path)
+    
+    def source_signature(self, file_paths):
+        signature = []
+        for file_path in file_paths + [OCR_CORRECTIONS_FILE]:
+            try:
+                stat = file_path.stat()
+            except OSError:
+                continue
+            signature.append([str(file_path), stat.st_size, stat.st_mtime_ns])
+        return {'version': self.VERSION, 'files': sorted(signature)}
+    
+    def is_current(self, signature):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return meta.get('signature') == signature and all(path.exists() for path in self.data_paths())
+    
+    def build(self, documents, signature, prepare):
+        """Write the paragraphs of (file name, paragraph iterator) pairs, one file at a time
+        
+        prepare(paragraph) returns StudyTextIndex.prepare_section() output for a
+        paragraph that can be shown whole, or None.
+        """
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.tmp"
+        files = []
+        offsets = []
+        sentence_rows = []
+        text_pos = lower_pos = sentence_pos = 0
+        with open(f"{self.text_path}{suffix}", 'wb') as text_file, \
+                open(f"{self.lower_path}{suffix}", 'wb') as lower_file, \
+                open(f"{self.sentences_path}{suffix}", 'wb') as sentence_file:
+            for file_name, paragraphs in documents:
+                files.append(file_name)
+                for paragraph in paragraphs:
+                    # A newline after every paragraph stops a keyword match running into the next one
+                    text = paragraph.encode('utf-8')
+                    lower = paragraph.lower().encode('utf-8')
+                    text_file.write(text + b'\n')
+                    lower_file.write(lower + b'\n')
+                    prepared = prepare(paragraph)
+                    if prepared is None:
+                        sentence_range = (-1, -1, -1, -1)
+                    else:
+                        instructional, explanatory_matches, sentences = prepared
+                        first = len(sentence_rows)
+                        for sentence, _, sentence_instructional, explanatory, word_count in sentences:
+                            data = sentence.encode('utf-8')
+                            sentence_file.write(data + b'\n')
+                            sentence_rows.append((sentence_pos, sentence_pos + len(data),
+                                                  sentence_instructional, explanatory, word_count))
+                            sentence_pos += len(data) + 1
+                        sentence_range = (first, len(sentence_rows), instructional, explanatory_matches)
+                    offsets.append((len(files) - 1, text_pos, text_pos + len(text),
+                                    lower_pos, lower_pos + len(lower)) + sentence_range)
+                    text_pos += len(text) + 1
+                    lower_pos += len(lower) + 1
+        with open(f"{self.offsets_path}{suffix}", 'wb') as f:
+            np.save(f, np.array(offsets, dtype=np.int64).reshape(-1, 9))
+        with open(f"{self.sentence_table_path}{suffix}", 'wb') as f:
+            np.save(f, np.array(sentence_rows, dtype=np.int64).reshape(-1, 5))
+        with open(f"{self.meta_path}{suffix}", 'w', encoding='utf-8') as f:
+            json.dump({'signature': signature, 'files': files, 'paragraphs': len(offsets),
+                       'sentences': len(sentence_rows)}, f)
+        # Data first and the metadata last, so a reader never sees new metadata over old data
+        for path in self.data_paths() + (self.meta_path,):
+            os.replace(f"{path}{suffix}", path)
+    
+    @staticmethod
+    def map_file(path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''  # mmap cannot map an empty file
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def open(self):
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            self.files = json.load(f)['files']
+        self.offsets = np.load(self.offsets_path, mmap_mode='r')
+        self.sentence_table = np.load(self.sentence_table_path, mmap_mode='r')
+        self.text = self.map_file(self.text_path)
+        self.lower = self.map_file(self.lower_path)
+        self.sentences = self.map_file(self.sentences_path)
+    
+    def keyword_paragraphs(self, keywords):
+        """For each keyword, the set of paragraph indices whose lowercased text contains it"""
+        found = {keyword: set() for keyword in keywords}
+        if not len(self.offsets):
+            return found
+        lower_starts = self.offsets[:, self.LOWER_START]
+        for keyword, indices in found.items():
+            needle = keyword.encode('utf-8')
+            pos = self.lower.find(needle)
+            while pos != -1:
+                index = int(np.searchsorted(lower_starts, pos, side='right')) - 1
+                indices.add(index)
+                # One match per paragraph is enough: carry on from the next paragraph
+                pos = self.lower.find(needle, int(self.offsets[index, self.LOWER_END]))
+        return found
+    
+    def paragraph(self, index):
+        """(file name, text, lowercased text) of one paragraph, decoded straight from the mapped files"""
+        row = self.offsets[index]
+        text = str(memoryview(self.text)[row[self.TEXT_START]:row[self.TEXT_END]], 'utf-8')
+        lower = str(memoryview(self.lower)[row[self.LOWER_START]:row[self.LOWER_END]], 'utf-8')
+        return self.files[row[self.FILE]], text, lower
+    
+    def prepared_section(self, index):
+        """The prepared sentences of a paragraph shown whole, as StudyTextIndex.prepare_section() returns them"""
+        row = self.offsets[index]
+        if row[self.SENTENCE_FIRST] < 0:
+            return None
+        view = memoryview(self.sentences)
+        sentences = []
+        for start, stop, instructional, explanatory, word_count in self.sentence_table[row[self.SENTENCE_FIRST]:row[self.SENTENCE_END]].tolist():
+            sentence = str(view[start:stop], 'utf-8')
+            sentences.append((sentence, sentence.lower(), bool(instructional), bool(explanatory), word_count))
+        return bool(row[self.INSTRUCTIONAL]), int(row[self.EXPLANATORY_MATCHES]), sentences
+    
+    def size(self):
+        return len(self.text) + len(self.lower) + len(self.sentences)
+    
+    def bytes_by_file(self):
+        """Mapped bytes of each study text file's paragraphs (original and lowercased text)"""
+        if not len(self.offsets):
+            return {}
+        sizes = ((self.offsets[:, self.TEXT_END] - self.offsets[:, self.TEXT_START]) +
+                 (self.offsets[:, self.LOWER_END] - self.offsets[:, self.LOWER_START]))
+        totals = np.bincount(self.offsets[:, self.FILE], weights=sizes, minlength=len(self.files))
+        return {name: int(total) for name, total in zip(self.files, totals)}
+
 class StudyTextIndex:
     """Index study text for concept lookup"""
     
-    # Common OCR error corrections
-    OCR_CORRECTIONS = {
-        'los': 'loss',
-        'ocurs': 'occurs',
-        'ocured': 'occurred',
-        'wil': 'will',
-        'prof': 'proof',
-        'diferent': 'different',
-        'alowed': 'allowed',
-        'seeking': 'seeking',
-        'sek': 'seek',
-        'comon': 'common',
-        'efect': 'effect',
-        'vesel': 'vessel',
-        'ben': 'been',
-        'gods': 'goods',
-        'aply': 'apply',
-        'acident': 'accident',
-        'shortfal': 'shortfall',
-        'clasification': 'classification',
-        'remedy': 'remedy',
-        'alowed': 'allowed',
-        'obstacle': 'obstacle',
-        'otherwise': 'otherwise',
-        'principle': 'principle',
-        'available': 'available',
-        'insurer': 'insurer',
-        'required': 'required',
-        'condition': 'condition',
-        'notice': 'notice',
-        'policy': 'policy',
-        'insured': 'insured',
-    }
+    # Sentences containing these are study guidance ("After you have...") rather than explanation
+    INSTRUCTIONAL_PHRASES = ('after you have', 'you may study', 'you should', 'you will learn',
+                             'this section', 'next section', 'previous section')
+    # Explanatory language (defines, means, refers to, etc.)
+    EXPLANATORY_WORDS = ('means', 'refers', 'defined', 'definition', 'is when', 'is that',
+                         'applies', 'applies when', 'occurs', 'requires', 'entitles', 'allows')
+    # Longer paragraphs are cut down around the keywords, so their sentences can't be prepared in advance
+    SECTION_MAX_WORDS = 50
     
-    def __init__(self):
-        self.full_texts = {}  # Store full text by file
-        self.question_explanations = QuestionExplanations()  # Load pre-written explanations
+    def __init__(self, study_text_dir=STUDY_TEXT_DIR):
+        self.study_text_dir = study_text_dir
+        self.store = StudyTextStore(study_text_dir)  # Retrievable paragraphs, memory-mapped; replaced whole on reload
+        self.question_explanations = None  # Pre-written explanations, loaded with the study text
+        self.signature = None  # Source files the loaded text was read from
+        self.generation = 0  # Incremented every time the study text is (re)loaded
+        self.lock = threading.Lock()
         self.load_study_text()
     
     @staticmethod
     def fix_ocr_errors(text):
-        """Fix common OCR errors in text"""
-        if not text:
-            return text
-        
-        # Fix common OCR errors
-        words = text.split()
-        corrected_words = []
-        
-        for word in words:
-            # Remove trailing punctuation temporarily
-            punct = ''
-            if word and word[-1] in '.,!?;:':
-                punct = word[-1]
-                word_clean = word[:-1]
-            else:
-                word_clean = word
-            
-            # Check for OCR errors (case-insensitive)
-            word_lower = word_clean.lower()
-            if word_lower in StudyTextIndex.OCR_CORRECTIONS:
-                # Preserve original capitalization
-                if word_clean[0].isupper():
-                    corrected = StudyTextIndex.OCR_CORRECTIONS[word_lower].capitalize()
-                else:
-                    corrected = StudyTextIndex.OCR_CORRECTIONS[word_lower]
-                corrected_words.append(corrected + punct)
-            else:
-                corrected_words.append(word)
-        
-        return ' '.join(corrected_words)
+        """Fix common OCR errors in text (study text is already corrected when it is loaded)"""
+        return text_normalizer.fix_ocr_errors(text)
     
+    def source_files(self):
+        if not self.study_text_dir.exists():
+            self.study_text_dir.mkdir(parents=True)
+        return [file_path for file_path in self.study_text_dir.iterdir()
+                if file_path.suffix.lower() in ('.pdf', '.docx', '.txt')]
+    
+    @metrics.timed('load_study_text')
     def load_study_text(self):
-        """Load study text from files"""
-        if not STUDY_TEXT_DIR.exists():
-            STUDY_TEXT_DIR.mkdir()
-            return
-        
-        for file_path in STUDY_TEXT_DIR.iterdir():
-            if file_path.suffix.lower() == '.pdf':
-                text = QuestionParser.extract_text_from_pdf(file_path)
-            elif file_path.suffix.lower() == '.docx':
-                text = QuestionParser.extract_text_from_docx(file_path)
-            elif file_path.suffix.lower() == '.txt':
-                text = file_path.read_text(encoding='utf-8')
-            else:
+        """Load study text from files (re-reading them only if one has changed since the store was built)"""
+        file_paths = self.source_files()
+        store = StudyTextStore(self.study_text_dir)
+        signature = store.source_signature(file_paths)
+        if not store.is_current(signature):
+            documents = ((file_path.name, self.retrievable_paragraphs(self.read_study_file(file_path)))
+                         for file_path in file_paths)
+            store.build(documents, signature, self.prepare_paragraph)
+        store.open()
+        # One assignment: requests already running keep reading the store they started with
+        self.store = store
+        self.question_explanations = QuestionExplanations(self.study_text_dir)
+        self.signature = signature
+        self.generation += 1
+    
+    def refresh(self):
+        """Reload the study text if a file has changed since it was loaded, returning True if so"""
+        signature = self.store.source_signature(self.source_files())
+        if signature == self.signature:
+            return False
+        with self.lock:
+            if signature == self.signature:
+                return False
+            self.load_study_text()
+            return True
+    
+    @staticmethod
+    def read_study_file(file_path):
+        if file_path.suffix.lower() == '.pdf':
+            text = QuestionParser.extract_text_from_pdf(file_path)
+        elif file_path.suffix.lower() == '.docx':
+            text = QuestionParser.extract_text_from_docx(file_path)
+        else:
+            text = file_path.read_text(encoding='utf-8')
+        # OCR fixes, artifact stripping and whitespace clean-up happen once, here
+        return text_normalizer.normalize(text)
+    
+    @staticmethod
+    def retrievable_paragraphs(full_text):
+        """The paragraphs find_relevant_text() can use, skipping ones it never would whatever the question"""
+        # Split into paragraphs (double newlines or sentence breaks)
+        for para in re.split(r'\n\s*\n|\.\s+(?=[A-Z])', full_text):
+            # Skip very short paragraphs
+            para_clean = para.strip()
+            if len(para_clean) < 30:
                 continue
             
-            self.full_texts[file_path.name] = text
+            # Skip paragraphs that are mostly reference lists
+            # Check for patterns like "Act 1906, 5C5" or lots of codes/references
+            code_patterns = len(re.findall(r'\d{4}[A-Z]?\d+[A-Z]?', para_clean))
+            reference_patterns = len(re.findall(r'[A-Z]\d+[A-Z]?\d*', para_clean))
+            
+            # If there are many codes/references relative to text length, skip it
+            words_in_para = len(para_clean.split())
+            if words_in_para > 0:
+                code_density = (code_patterns + reference_patterns) / words_in_para
+                if code_density > 0.15:  # More than 15% codes/references
+                    continue
+            
+            # Skip if it starts with a reference pattern
+            if re.match(r'^[A-Z][a-z]+\s+\d{4}', para_clean):
+                # Check if it's mostly a list (many commas, few sentences)
+                commas = para_clean.count(',')
+                periods = para_clean.count('.')
+                if commas > periods * 2 and commas > 5:
+                    continue
+            
+            # Skip table of contents style content
+            if re.match(r'^(Chapter|Section|Page|\d+\.)', para_clean, re.IGNORECASE):
+                continue
+            
+            # Skip paragraphs that are mostly numbers/codes
+            words = para_clean.split()
+            if len(words) > 0:
+                non_word_chars = sum(1 for w in words if not re.search(r'[a-zA-Z]{3,}', w))
+                if non_word_chars / len(words) > 0.4:  # More than 40% non-words
+                    continue
+            
+            yield para_clean
+    
+    @staticmethod
+    def clean_section(text):
+        """Collapse whitespace and drop a leading list marker, as a section is shown"""
+        text = re.sub(r'\s+', ' ', text).strip()
+        # Remove list markers at start of sentences
+        return re.sub(r'^\d+[\.\)]\s*', '', text).strip()
+    
+    @classmethod
+    def prepare_section(cls, section_text):
+        """Everything feedback needs to know about a section that doesn't depend on the question
+        
+        Returns (instructional, explanatory word matches, sentences), each sentence being
+        (text, lowercased text, instructional, explanatory, word count).
+        """
+        section_lower = section_text.lower()
+        instructional = any(phrase in section_lower for phrase in cls.INSTRUCTIONAL_PHRASES)
+        explanatory_matches = sum(1 for word in cls.EXPLANATORY_WORDS if word in section_lower)
+        sentences = []
+        for sentence in re.split(r'[.!?]\s+', section_text):
+            sentence_lower = sentence.lower()
+            # Prefer sentences that actually explain (contain "is", "means", "refers", etc.)
+            explanatory = any(word in sentence_lower for word in cls.EXPLANATORY_WORDS) or \
+                'is' in sentence_lower or 'are' in sentence_lower
+            sentences.append((sentence, sentence_lower,
+                              any(phrase in sentence_lower for phrase in cls.INSTRUCTIONAL_PHRASES),
+                              explanatory, len(sentence.split())))
+        return instructional, explanatory_matches, sentences
+    
+    @classmethod
+    def prepare_paragraph(cls, paragraph):
+        """prepare_section() for a paragraph short enough to be shown whole, else None"""
+        if len(paragraph.split()) > cls.SECTION_MAX_WORDS:
+            return None
+        return cls.prepare_section(cls.clean_section(paragraph))
     
+    def section_sentences(self, section, store):
+        """Prepared sentences for a section: from the store it was found in when it is a whole paragraph"""
+        if section.get('paragraph') is not None:
+            prepared = store.prepared_section(section['paragraph'])
+            if prepared is not None:
+                return prepared
+        return self.prepare_section(section['text'])
+    
+    @metrics.timed('generate_feedback')
     def generate_feedback_explanation(self, question_text, correct_answer_text, selected_answer_text, options_text=None, is_correct=False):
+        core_explanation = self.core_feedback_explanation(question_text, correct_answer_text, options_text)
+        return self.format_feedback(core_explanation, correct_answer_text, selected_answer_text, is_correct)
+    
+    @staticmethod
+    def format_feedback(core_explanation, correct_answer_text, selected_answer_text, is_correct):
+        """Wrap the core explanation in the correct/incorrect message shown to the candidate"""
+        if core_explanation is None:
+            # Fallback explanation if no study text found
+            if is_correct:
+                return f"Correct! {correct_answer_text} is the right answer."
+            else:
+                return f"The correct answer is {correct_answer_text}. You selected {selected_answer_text}."
+        if is_correct:
+            return f"Correct! {core_explanation}"
+        else:
+            return f"The correct answer is {correct_answer_text}. {core_explanation}"
+    
+    def core_feedback_explanation(self, question_text, correct_answer_text, options_text=None):
+        """The explanation for a question, independent of the answer the candidate picked
+        
+        Returns None when there is no pre-written explanation and no relevant study text.
+        """
         # First, try to get pre-written explanation
         pre_written = self.question_explanations.get_explanation(question_text)
         if pre_written:
-            # Clean up the pre-written explanation
-            explanation = pre_written.strip()
-            # Fix OCR errors
-            explanation = self.fix_ocr_errors(explanation)
-            # Ensure proper formatting
-            explanation = re.sub(r'\s+', ' ', explanation).strip()
-            if explanation and not explanation.endswith(('.', '!', '?')):
-                explanation += '.'
-            
-            if is_correct:
-                return f"Correct! {explanation}"
-            else:
-                return f"The correct answer is {correct_answer_text}. {explanation}"
+            # Already cleaned and punctuated when the explanations file was parsed
+            return pre_written
         
         # Fall back to study text search if no pre-written explanation found
         # Extract key concepts from question and answer
@@ -671,69 +1544,42 @@ class StudyTextIndex:
         # Remove duplicates
         important_terms = list(dict.fromkeys(important_terms))[:10]
         
-        # Find relevant study text sections with better matching
-        relevant_sections = self.find_relevant_text(question_text, options_text)
+        # Find relevant study text sections with better matching. Paragraph numbers only mean
+        # something in the store they came from, so one store is used throughout
+        store = self.store
+        relevant_sections = self.find_relevant_sections(question_text, options_text, store)
         
         if not relevant_sections:
-            # Fallback explanation if no study text found
-            if is_correct:
-                return f"Correct! {correct_answer_text} is the right answer."
-            else:
-                return f"The correct answer is {correct_answer_text}. You selected {selected_answer_text}."
+            return None
         
         # Look through all relevant sections to find the best explanatory content
         best_explanation = None
         best_score = 0
         
         for section in relevant_sections:
-            section_text = section['text']
-            section_lower = section_text.lower()
+            # Sentence splits and flags were worked out when the study text was indexed
+            instructional, explanatory_matches, sentences = self.section_sentences(section, store)
             
             # Skip instructional text (like "After you have learnt...", "you may study...")
-            instructional_patterns = [
-                r'after you have',
-                r'you may study',
-                r'you should',
-                r'you will learn',
-                r'this section',
-                r'next section',
-                r'previous section'
-            ]
-            if any(re.search(pattern, section_lower) for pattern in instructional_patterns):
+            if instructional:
                 continue
             
             # Score how well this section explains the concept
-            score = 0
-            
-            # Check for important terms
+            section_lower = section['text'].lower()
             term_matches = sum(1 for term in important_terms if term in section_lower)
-            score += term_matches * 3  # Higher weight for concept matches
-            
-            # Check for explanatory language (defines, means, refers to, etc.)
-            explanatory_words = ['means', 'refers', 'defined', 'definition', 'is when', 'is that', 
-                               'applies', 'applies when', 'occurs', 'requires', 'entitles', 'allows']
-            explanatory_matches = sum(1 for word in explanatory_words if word in section_lower)
+            score = term_matches * 3  # Higher weight for concept matches
             score += explanatory_matches * 2
             
-            # Prefer sentences that actually explain (contain "is", "means", "refers", etc.)
-            sentences = re.split(r'[.!?]\s+', section_text)
             explanatory_sentences = []
-            
-            for sentence in sentences:
-                sentence_lower = sentence.lower()
+            for sentence, sentence_lower, sentence_instructional, explanatory, word_count in sentences:
                 # Skip if it's instructional
-                if any(re.search(pattern, sentence_lower) for pattern in instructional_patterns):
+                if sentence_instructional:
                     continue
                 
-                # Check if sentence contains important terms
+                # Check if sentence contains important terms and is explanatory
                 term_count = sum(1 for term in important_terms if term in sentence_lower)
-                if term_count > 0:
-                    # Check if it's explanatory
-                    is_explanatory = any(word in sentence_lower for word in explanatory_words) or \
-                                   'is' in sentence_lower or 'are' in sentence_lower
-                    
-                    if is_explanatory and len(sentence.split()) > 8:
-                        explanatory_sentences.append((term_count, sentence.strip()))
+                if term_count > 0 and explanatory and word_count > 8:
+                    explanatory_sentences.append((term_count, sentence.strip()))
             
             if explanatory_sentences:
                 # Get best explanatory sentence
@@ -745,8 +1591,6 @@ class StudyTextIndex:
                 # Remove random letter/number prefixes (like "B Notice" or "1. ")
                 explanation = re.sub(r'^[A-Z]\s+', '', explanation)  # Remove single letter prefix
                 explanation = re.sub(r'^\d+[\.\)]\s*', '', explanation)  # Remove number prefix
-                # Fix OCR errors
-                explanation = self.fix_ocr_errors(explanation)
                 # Remove double periods and clean up
                 explanation = re.sub(r'\.{2,}', '.', explanation)
                 # Limit to 50 words
@@ -769,21 +1613,17 @@ class StudyTextIndex:
             core_explanation = best_explanation
         else:
             # Fallback: try to extract from best section, avoiding instructional text
-            best_section = relevant_sections[0]['text']
-            sentences = re.split(r'[.!?]\s+', best_section)
+            sentences = self.section_sentences(relevant_sections[0], store)[2]
             
             # Find first non-instructional sentence with important terms
-            for sentence in sentences:
-                sentence_lower = sentence.lower()
-                if any(re.search(pattern, sentence_lower) for pattern in instructional_patterns):
+            for sentence, sentence_lower, sentence_instructional, _, word_count in sentences:
+                if sentence_instructional:
                     continue
                 
                 term_count = sum(1 for term in important_terms if term in sentence_lower)
-                if term_count > 0 and len(sentence.split()) > 8:
+                if term_count > 0 and word_count > 8:
                     words = sentence.split()
                     core_explanation = ' '.join(words[:40])
-                    # Fix OCR errors
-                    core_explanation = self.fix_ocr_errors(core_explanation)
                     if not core_explanation.endswith(('.', '!', '?')):
                         core_explanation += '.'
                     break
@@ -791,13 +1631,9 @@ class StudyTextIndex:
                 # Last resort: simple explanation
                 core_explanation = f"This relates to {correct_answer_text.lower()}."
         
-        # Clean up formatting issues
-        # Remove bullet points and list markers (•, -, *, etc.)
-        core_explanation = re.sub(r'[•\-\*]\s*', '', core_explanation)
+        # Clean up formatting issues (bullets and OCR errors were handled when the text was loaded)
         # Remove numbered list markers at start of line
         core_explanation = re.sub(r'^\d+[\.\)]\s*', '', core_explanation, flags=re.MULTILINE)
-        # Remove any remaining list-style formatting
-        core_explanation = re.sub(r'^\s*[•\-\*]\s*', '', core_explanation, flags=re.MULTILINE)
         # Remove single letter prefixes (like "B Notice")
         core_explanation = re.sub(r'^[A-Z]\s+', '', core_explanation)
         # Remove instructional phrases that might have slipped through
@@ -810,9 +1646,6 @@ class StudyTextIndex:
         core_explanation = re.sub(r'^[,\s;:]+', '', core_explanation)
         core_explanation = re.sub(r'[,;:]+$', '', core_explanation)
         
-        # Fix OCR errors (spelling mistakes)
-        core_explanation = self.fix_ocr_errors(core_explanation)
-        
         # Ensure it starts with a capital letter
         if core_explanation and len(core_explanation) > 0:
             if core_explanation[0].islower():
@@ -823,15 +1656,27 @@ class StudyTextIndex:
             core_explanation += '.'
         # Final cleanup of any double spaces
         core_explanation = re.sub(r'\s+', ' ', core_explanation).strip()
-        
-        # Generate targeted feedback with proper formatting
-        if is_correct:
-            return f"Correct! {core_explanation}"
-        else:
-            return f"The correct answer is {correct_answer_text}. {core_explanation}"
+        return core_explanation
     
     def find_relevant_text(self, question_text, options_text=None):
         """Find relevant study text sections for a question - returns concise, relevant excerpts (max 50 words)"""
+        return [{key: section[key] for key in ('file', 'text', 'relevance_score')}
+                for section in self.find_relevant_sections(question_text, options_text)]
+    
+    @metrics.timed('find_relevant_text')
+    def find_relevant_sections(self, question_text, options_text=None, store=None):
+        """find_relevant_text() plus the store index of each section shown as a whole paragraph"""
+        return self.relevant_sections_for([(question_text, options_text)], store)[0]
+    
+    @metrics.timed('find_relevant_text_batch')
+    def find_relevant_text_batch(self, queries):
+        """find_relevant_text() for many (question text, options) pairs in one retrieval pass"""
+        return [[{key: section[key] for key in ('file', 'text', 'relevance_score')} for section in sections]
+                for sections in self.relevant_sections_for(queries)]
+    
+    @staticmethod
+    def query_keywords(question_text, options_text=None):
+        """The (up to 8) keywords a question's study text is retrieved by"""
         # Extract meaningful keywords from question
         # Focus on legal terms, concepts, and important nouns
         question_lower = question_text.lower()
@@ -855,135 +1700,111 @@ class StudyTextIndex:
                 keywords.extend([w for w in opt_words if w not in common_words and len(w) > 3])
         
         # Remove duplicates and keep top keywords
-        keywords = list(dict.fromkeys(keywords))[:8]  # Top 8 unique keywords
+        return list(dict.fromkeys(keywords))[:8]  # Top 8 unique keywords
+    
+    def relevant_sections_for(self, queries, store=None):
+        """Relevant sections for each (question text, options) pair
         
-        if not keywords:
-            return []
+        Every distinct keyword is searched for in the store once and every
+        matching paragraph decoded once, however many questions share them.
+        """
+        store = store or self.store
+        query_keywords = [self.query_keywords(question_text, options_text) for question_text, options_text in queries]
+        keyword_paragraphs = store.keyword_paragraphs({kw for keywords in query_keywords for kw in keywords})
+        paragraphs = {}  # Store index -> (file name, text, lowercased text)
+        results = []
+        for keywords in query_keywords:
+            if not keywords:
+                results.append([])
+                continue
+            scored_by_file = {}
+            # Only paragraphs containing a keyword can score, so only those are read from the store
+            for index in sorted(set().union(*(keyword_paragraphs[kw] for kw in keywords))):
+                if index not in paragraphs:
+                    paragraphs[index] = store.paragraph(index)
+                file_name, para_clean, para_lower = paragraphs[index]
+                section = self.score_paragraph(index, para_clean, para_lower, keywords)
+                if section is not None:
+                    scored_by_file.setdefault(file_name, []).append(section)
+            results.append(self.best_sections(scored_by_file, store.files))
+        return results
+    
+    def score_paragraph(self, index, para_clean, para_lower, keywords):
+        """A paragraph's score and excerpt for a question's keywords, or None if it is no use"""
+        # Score paragraph by keyword matches
+        score = 0
+        matched_keywords = []
+        for keyword in keywords:
+            if keyword in para_lower:
+                score += 2  # Higher weight for keyword matches
+                matched_keywords.append(keyword)
         
-        relevant_sections = []
+        # Bonus for multiple keyword matches
+        if len(matched_keywords) >= 2:
+            score += len(matched_keywords)
         
-        for file_name, full_text in self.full_texts.items():
-            # Split into paragraphs (double newlines or sentence breaks)
-            paragraphs = re.split(r'\n\s*\n|\.\s+(?=[A-Z])', full_text)
+        if score > 0:
+            # Limit paragraph to reasonable length and clean it
+            words = para_clean.split()
+            # Short paragraphs are shown whole, so their prepared sentences can be used
+            whole = len(words) <= self.SECTION_MAX_WORDS
+            if len(words) > 100:
+                # Take a relevant chunk (try to find where keywords appear)
+                best_start = 0
+                best_score = 0
+                for i in range(len(words) - 50):
+                    chunk = ' '.join(words[i:i+60])
+                    chunk_score = sum(1 for kw in keywords if kw in chunk.lower())
+                    if chunk_score > best_score:
+                        best_score = chunk_score
+                        best_start = i
+                para_clean = ' '.join(words[best_start:best_start+60])
             
-            scored_paragraphs = []
+            # Strictly limit to 50 words max
+            words = para_clean.split()
+            if len(words) > 50:
+                # Take first 50 words
+                para_clean = ' '.join(words[:50])
+                # Try to end at a sentence boundary if possible
+                last_period = para_clean.rfind('.')
+                last_excl = para_clean.rfind('!')
+                last_quest = para_clean.rfind('?')
+                last_punct = max(last_period, last_excl, last_quest)
+                # If we find punctuation in the last 40% of text, use it
+                if last_punct > len(para_clean) * 0.6:
+                    para_clean = para_clean[:last_punct+1].strip()
+                else:
+                    # Otherwise just ensure it doesn't end mid-word
+                    para_clean = para_clean.rstrip()
+                    if not para_clean.endswith(('.', '!', '?', ';', ':')):
+                        para_clean += '.'
             
-            for para in paragraphs:
-                # Skip very short paragraphs
-                para_clean = para.strip()
-                if len(para_clean) < 30:
-                    continue
-                
-                # Skip paragraphs that are mostly reference lists
-                # Check for patterns like "Act 1906, 5C5" or lots of codes/references
-                code_patterns = len(re.findall(r'\d{4}[A-Z]?\d+[A-Z]?', para_clean))
-                reference_patterns = len(re.findall(r'[A-Z]\d+[A-Z]?\d*', para_clean))
-                
-                # If there are many codes/references relative to text length, skip it
-                words_in_para = len(para_clean.split())
-                if words_in_para > 0:
-                    code_density = (code_patterns + reference_patterns) / words_in_para
-                    if code_density > 0.15:  # More than 15% codes/references
-                        continue
-                
-                # Skip if it starts with a reference pattern
-                if re.match(r'^[A-Z][a-z]+\s+\d{4}', para_clean):
-                    # Check if it's mostly a list (many commas, few sentences)
-                    commas = para_clean.count(',')
-                    periods = para_clean.count('.')
-                    if commas > periods * 2 and commas > 5:
-                        continue
-                
-                # Skip table of contents style content
-                if re.match(r'^(Chapter|Section|Page|\d+\.)', para_clean, re.IGNORECASE):
-                    continue
-                
-                # Skip paragraphs that are mostly numbers/codes
-                words = para_clean.split()
-                if len(words) > 0:
-                    non_word_chars = sum(1 for w in words if not re.search(r'[a-zA-Z]{3,}', w))
-                    if non_word_chars / len(words) > 0.4:  # More than 40% non-words
-                        continue
-                
-                para_lower = para_clean.lower()
-                
-                # Score paragraph by keyword matches
-                score = 0
-                matched_keywords = []
-                for keyword in keywords:
-                    if keyword in para_lower:
-                        score += 2  # Higher weight for keyword matches
-                        matched_keywords.append(keyword)
-                
-                # Bonus for multiple keyword matches
-                if len(matched_keywords) >= 2:
-                    score += len(matched_keywords)
-                
-                if score > 0:
-                    # Limit paragraph to reasonable length and clean it
-                    words = para_clean.split()
-                    if len(words) > 100:
-                        # Take a relevant chunk (try to find where keywords appear)
-                        best_start = 0
-                        best_score = 0
-                        for i in range(len(words) - 50):
-                            chunk = ' '.join(words[i:i+60])
-                            chunk_score = sum(1 for kw in keywords if kw in chunk.lower())
-                            if chunk_score > best_score:
-                                best_score = chunk_score
-                                best_start = i
-                        para_clean = ' '.join(words[best_start:best_start+60])
-                    
-                    # Strictly limit to 50 words max
-                    words = para_clean.split()
-                    if len(words) > 50:
-                        # Take first 50 words
-                        para_clean = ' '.join(words[:50])
-                        # Try to end at a sentence boundary if possible
-                        last_period = para_clean.rfind('.')
-                        last_excl = para_clean.rfind('!')
-                        last_quest = para_clean.rfind('?')
-                        last_punct = max(last_period, last_excl, last_quest)
-                        # If we find punctuation in the last 40% of text, use it
-                        if last_punct > len(para_clean) * 0.6:
-                            para_clean = para_clean[:last_punct+1].strip()
-                        else:
-                            # Otherwise just ensure it doesn't end mid-word
-                            para_clean = para_clean.rstrip()
-                            if not para_clean.endswith(('.', '!', '?', ';', ':')):
-                                para_clean += '.'
-                    
-                    # Clean up extra whitespace and formatting issues
-                    para_clean = re.sub(r'\s+', ' ', para_clean).strip()
-                    # Remove bullet points and list markers
-                    para_clean = re.sub(r'[•\-\*]\s*', '', para_clean)
-                    # Remove duplicate words/phrases (like "Chapter 1Chapter 1")
-                    para_clean = re.sub(r'(\w+)\1+', r'\1', para_clean)
-                    # Remove page numbers and formatting artifacts
-                    para_clean = re.sub(r'\d+/\d+', '', para_clean)  # Remove page numbers like "1/15"
-                    para_clean = re.sub(r'Chapter \d+Chapter \d+', 'Chapter', para_clean)
-                    # Remove list markers at start of sentences
-                    para_clean = re.sub(r'^\d+[\.\)]\s*', '', para_clean, flags=re.MULTILINE)
-                    # Fix OCR errors
-                    para_clean = StudyTextIndex.fix_ocr_errors(para_clean)
-                    para_clean = re.sub(r'\s+', ' ', para_clean).strip()
-                    
-                    # Final word count check
-                    words = para_clean.split()
-                    if len(words) > 50:
-                        para_clean = ' '.join(words[:50]).rstrip()
-                        if not para_clean.endswith(('.', '!', '?', ';', ':')):
-                            para_clean += '.'
-                    elif len(words) < 10:
-                        # Skip if too short after cleaning
-                        continue
-                    
-                    scored_paragraphs.append({
-                        'score': score,
-                        'text': para_clean.strip(),
-                        'matched_keywords': matched_keywords
-                    })
+            # Bullets, page numbers, duplicated headings and OCR errors were
+            # removed when the study text was loaded
+            para_clean = self.clean_section(para_clean)
+            
+            # Final word count check
+            words = para_clean.split()
+            if len(words) > 50:
+                para_clean = ' '.join(words[:50]).rstrip()
+                if not para_clean.endswith(('.', '!', '?', ';', ':')):
+                    para_clean += '.'
+            elif len(words) < 10:
+                # Skip if too short after cleaning
+                return None
             
+            return {
+                'score': score,
+                'text': para_clean.strip(),
+                'matched_keywords': matched_keywords,
+                'paragraph': index if whole else None
+            }
+    
+    def best_sections(self, scored_by_file, files):
+        """The two best scoring excerpts, from the scored paragraphs of each study text file (in store order)"""
+        relevant_sections = []
+        for file_name in files:
+            scored_paragraphs = scored_by_file.get(file_name, [])
             # Sort by score and get best match
             scored_paragraphs.sort(key=lambda x: x['score'], reverse=True)
             
@@ -993,7 +1814,8 @@ class StudyTextIndex:
                     relevant_sections.append({
                         'file': file_name,
                         'text': section['text'],
-                        'relevance_score': section['score']
+                        'relevance_score': section['score'],
+                        'paragraph': section['paragraph']
                     })
                     if len(relevant_sections) >= 2:  # Max 2 sections
                         break
@@ -1002,22 +1824,1954 @@ class StudyTextIndex:
         relevant_sections.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
         return relevant_sections[:2]  # Return top 2 most relevant
 
+class QuestionClusterer:
+    """Group near-duplicate questions across papers using MinHash signatures and LSH
+    
+    Each question's text and options are reduced to word-bigram shingles and a
+    MinHash signature (vectorised with NumPy). Signatures are cut into bands and
+    only questions sharing a band bucket are compared, so the work grows with
+    the number of questions rather than the number of pairs.
+    """
+    
+    NUM_PERMUTATIONS = 64
+    BANDS = 16  # 16 bands of 4 rows: pairs from roughly 0.5 Jaccard upwards become candidates
+    MAX_BUCKET_MEMBERS = 50  # Buckets with more members than this are compared against their first member only
+    PRIME = (1 << 61) - 1
+    
+    def __init__(self, threshold=DUPLICATE_THRESHOLD, seed=1):
+        self.threshold = threshold
+        rng = np.random.RandomState(seed)
+        # a < 2**31 and 32-bit shingle hashes keep a*h+b inside uint64
+        self.a = rng.randint(1, 1 << 31, size=self.NUM_PERMUTATIONS).astype(np.uint64)
+        self.b = rng.randint(0, 1 << 31, size=self.NUM_PERMUTATIONS).astype(np.uint64)
+        self.rows = self.NUM_PERMUTATIONS // self.BANDS
+    
+    @staticmethod
+    def shingles(question):
+        """Word bigrams of the question and its options"""
+        text = question['question'] + ' ' + ' '.join(opt['text'] for opt in question.get('options', []))
+        words = re.findall(r'[a-z0-9£]+', text.lower())
+        if len(words) < 2:
+            return set(words)
+        return {f'{first} {second}' for first, second in zip(words, words[1:])}
+    
+    def signature(self, shingles):
+        if not shingles:
+            return np.zeros(self.NUM_PERMUTATIONS, dtype=np.uint64)
+        # crc32 is stable across processes, unlike hash()
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(self.a, hashes) + self.b[:, None]) % np.uint64(self.PRIME)).min(axis=1)
+    
+    def cluster(self, questions):
+        """Set cluster_id and cluster_size on every question; returns clusters with 2+ members
+        
+        A cluster's ID is the ID of its first member in corpus order (the earliest paper).
+        """
+        if not questions:
+            return []
+        signatures = np.vstack([self.signature(self.shingles(q)) for q in questions])
+        
+        parent = list(range(len(questions)))
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        similarities = {}
+        for band in range(self.BANDS):
+            buckets = {}
+            band_rows = signatures[:, band * self.rows:(band + 1) * self.rows]
+            for index, row in enumerate(band_rows):
+                buckets.setdefault(row.tobytes(), []).append(index)
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                if len(members) > self.MAX_BUCKET_MEMBERS:
+                    pairs = ((members[0], other) for other in members[1:])
+                else:
+                    pairs = ((m, n) for i, m in enumerate(members) for n in members[i + 1:])
+                for first, second in pairs:
+                    if (first, second) in similarities:
+                        continue
+                    similarity = float(np.mean(signatures[first] == signatures[second]))
+                    similarities[(first, second)] = similarity
+                    if similarity >= self.threshold:
+                        root_first, root_second = find(first), find(second)
+                        if root_first != root_second:
+                            # Keep the earlier question as the root so it names the cluster
+                            parent[max(root_first, root_second)] = min(root_first, root_second)
+        
+        groups = {}
+        for index in range(len(questions)):
+            groups.setdefault(find(index), []).append(index)
+        
+        clusters = []
+        for root, members in groups.items():
+            cluster_id = questions[root]['id']
+            for index in members:
+                questions[index]['cluster_id'] = cluster_id
+                questions[index]['cluster_size'] = len(members)
+            if len(members) > 1:
+                clusters.append({
+                    'cluster_id': cluster_id,
+                    'size': len(members),
+                    'question_ids': [questions[i]['id'] for i in members],
+                })
+        clusters.sort(key=lambda c: c['size'], reverse=True)
+        return clusters
+
+def dedupe_by_cluster(questions):
+    """Keep only the first question from each near-duplicate cluster"""
+    seen = set()
+    unique = []
+    for q in questions:
+        cluster_id = q.get('cluster_id', q['id'])
+        if cluster_id not in seen:
+            seen.add(cluster_id)
+            unique.append(q)
+    return unique
+
+def cluster_mastery(corpus, entries, module_name):
+    """How well one candidate knows each near-duplicate cluster they have answered
+    
+    Answers to any paper's version of a question count towards its cluster, and
+    answers saved under an old question ID count towards its replacement. Least
+    mastered clusters come first.
+    """
+    corpus.get()
+    clusters = {}
+    for entry in entries:
+        if (entry.get('module') or DEFAULT_MODULE).upper() != module_name:
+            continue
+        for question, answer in zip(entry.get('questions') or [], entry.get('answers') or []):
+            if not isinstance(question, dict) or not isinstance(answer, dict) or not answer.get('answered'):
+                continue
+            try:
+                question_id = int(question.get('id'))
+            except (TypeError, ValueError):
+                continue
+            current = corpus.by_id.get(question_id) or corpus.by_id.get(corpus.aliases.get(question_id))
+            if current is None:
+                continue  # No longer in the bank
+            cluster_id = current.get('cluster_id', current['id'])
+            stats = clusters.setdefault(cluster_id, {
+                'cluster_id': cluster_id,
+                'cluster_size': current.get('cluster_size', 1),
+                'answers': 0,
+                'correct': 0,
+                'question_ids': set(),
+                'last_answered': None,
+                'last_correct': None,
+            })
+            stats['answers'] += 1
+            stats['correct'] += 1 if answer.get('correct') else 0
+            stats['question_ids'].add(current['id'])
+            timestamp = entry.get('timestamp') or ''
+            if stats['last_answered'] is None or timestamp >= stats['last_answered']:
+                stats['last_answered'] = timestamp
+                stats['last_correct'] = bool(answer.get('correct'))
+    
+    results = []
+    for stats in clusters.values():
+        stats['mastery'] = round(stats['correct'] / stats['answers'], 3)
+        stats['question_ids'] = sorted(stats['question_ids'])
+        results.append(stats)
+    results.sort(key=lambda c: (c['mastery'], -c['answers'], c['cluster_id']))
+    return results
+
+class FeedbackCache:
+    """LRU cache of generated feedback explanations, keyed by question and selected answers"""
+    
+    def __init__(self, max_entries=FEEDBACK_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (question_id, content_hash, selected) -> explanation
+        self.generation = 0  # Incremented whenever entries are cleared or invalidated
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            explanation = self.entries.get(key)
+            if explanation is not None:
+                self.entries.move_to_end(key)
+        metrics.inc('m05_cache_requests_total', {'cache': 'feedback', 'result': 'miss' if explanation is None else 'hit'})
+        return explanation
+    
+    def put(self, key, explanation, generation=None):
+        """Cache an explanation, unless it was started before the cache was last cleared or invalidated"""
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = explanation
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def invalidate(self, question_ids):
+        """Drop cached feedback for the given questions only"""
+        question_ids = set(question_ids)
+        if not question_ids:
+            return
+        with self.lock:
+            for key in [k for k in self.entries if k[0] in question_ids]:
+                del self.entries[key]
+            self.generation += 1
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+class Overloaded(Exception):
+    """Raised to turn a request away: 429 when its session is over its rate, 503 when the server is busy"""
+    
+    def __init__(self, status, retry_after, message):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.message = message
+
+class TokenBucket:
+    """Allow `rate` requests per second on average, and bursts of up to `burst`"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+    
+    def take(self):
+        """Spend a token; returns 0 if there was one, otherwise the seconds until there will be"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60
+
+class WorkQueue:
+    """A fixed number of slots for one class of expensive requests, plus a bounded queue for them
+    
+    Requests beyond the queue, or that wait longer than the timeout, are turned
+    away at once with a 503 rather than tying up a server thread.
+    """
+    
+    def __init__(self, name, slots, queue, timeout):
+        self.name = name
+        self.slots = max(slots, 1)
+        self.queue = max(queue, 0)
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.average_seconds = 0.5  # Moving average of how long a request holds a slot
+        self.condition = threading.Condition()
+    
+    def retry_after(self):
+        """Rough seconds until a slot frees up for a request joining the back of the queue"""
+        return max(1, math.ceil(self.average_seconds * (self.waiting + 1) / self.slots))
+    
+    def reject(self, reason):
+        metrics.inc('m05_admission_rejections_total', {'class': self.name, 'reason': reason})
+        raise Overloaded(503, self.retry_after(), f'The server is busy with other {self.name} requests, please try again shortly')
+    
+    def update_gauges(self):
+        metrics.set_gauge('m05_admission_in_progress', self.active, {'class': self.name})
+        metrics.set_gauge('m05_admission_queued', self.waiting, {'class': self.name})
+    
+    @contextmanager
+    def slot(self):
+        start = time.monotonic()
+        with self.condition:
+            if self.active >= self.slots:
+                if self.waiting >= self.queue:
+                    self.reject('queue_full')
+                self.waiting += 1
+                self.update_gauges()
+                try:
+                    deadline = start + self.timeout
+                    while self.active >= self.slots:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.reject('queue_timeout')
+                        self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.update_gauges()
+        admitted = time.monotonic()
+        metrics.observe('m05_admission_wait_seconds', admitted - start, {'class': self.name})
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.average_seconds = 0.8 * self.average_seconds + 0.2 * (time.monotonic() - admitted)
+                self.update_gauges()
+                self.condition.notify()
+    
+    def status(self):
+        with self.condition:
+            return {'slots': self.slots, 'queue': self.queue, 'active': self.active, 'waiting': self.waiting,
+                    'average_ms': round(self.average_seconds * 1000, 1)}
+
+class AdmissionControl:
+    """Per-class work queues and per-session token buckets for the expensive endpoints
+    
+    Cheap endpoints (cached question lists, bootstrap, search, grading from the
+    cache) are not limited, and since the expensive ones can only hold a few
+    threads between them, they keep answering quickly during a burst.
+    """
+    
+    MAX_BUCKETS = 10000  # Sessions remembered; the least recently seen are forgotten first
+    
+    def __init__(self, classes, enabled=True):
+        self.enabled = enabled
+        self.queues = {name: WorkQueue(name, limits['slots'], limits['queue'], limits['timeout'])
+                       for name, limits in classes.items()}
+        self.rates = {name: (limits['rate'], limits['burst']) for name, limits in classes.items()}
+        self.buckets = OrderedDict()  # (session key, class) -> TokenBucket
+        self.lock = threading.Lock()
+    
+    def check_rate(self, name, session_key):
+        rate, burst = self.rates[name]
+        with self.lock:
+            bucket = self.buckets.get((session_key, name))
+            if bucket is None:
+                bucket = self.buckets[(session_key, name)] = TokenBucket(rate, burst)
+            self.buckets.move_to_end((session_key, name))
+            while len(self.buckets) > self.MAX_BUCKETS:
+                self.buckets.popitem(last=False)
+            wait = bucket.take()
+        if wait:
+            metrics.inc('m05_admission_rejections_total', {'class': name, 'reason': 'rate_limited'})
+            raise Overloaded(429, max(1, math.ceil(wait)), 'Too many requests, please slow down')
+    
+    @contextmanager
+    def admit(self, name, session_key):
+        if not self.enabled:
+            yield
+            return
+        self.check_rate(name, session_key)
+        with self.queues[name].slot():
+            yield
+    
+    def status(self):
+        return {'enabled': self.enabled,
+                'classes': {name: dict(queue.status(), rate=self.rates[name][0], burst=self.rates[name][1])
+                            for name, queue in self.queues.items()}}
+
+class FeedbackJobs:
+    """Build feedback explanations on a background thread pool
+    
+    Grading answers straight away with a token; the explanation is collected
+    later from /api/feedback/<token>. Identical requests that arrive while a
+    job is running share it, and finished explanations go into the module's
+    feedback cache like synchronously built ones did. Jobs remember the
+    cache generation they started in, so an explanation built from study
+    text or questions that were replaced meanwhile is never cached.
+    
+    Every token belongs to the client that asked for it (requests joining a
+    shared job get a token of their own), and only that client can collect it.
+    """
+    
+    def __init__(self, workers=FEEDBACK_WORKERS, max_jobs=FEEDBACK_JOB_LIMIT, max_queued=FEEDBACK_QUEUE_LIMIT,
+                 max_waiters=FEEDBACK_MAX_WAITERS):
+        self.workers = max(1, workers)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='feedback')
+        self.max_jobs = max_jobs
+        self.max_queued = max_queued
+        self.max_waiters = max_waiters
+        self.waiting = 0  # Requests blocked in result() right now
+        self.jobs = OrderedDict()  # token -> (owner, future), oldest first
+        self.in_flight = {}  # (module name, cache generation, cache key) -> future of the running job
+        self.average_seconds = 0.5  # Moving average of how long an explanation takes
+        self.lock = threading.Lock()
+    
+    def submit(self, module, cache_key, build, owner):
+        """Start building an explanation (or join the identical running job) and return owner's token for it"""
+        generation = module.feedback_cache.generation
+        # Requests made after a reload never join a job still building from the old text
+        job_key = (module.name, generation, cache_key)
+        started = None
+        with self.lock:
+            future = self.in_flight.get(job_key)
+            if future is None:
+                # Every unfinished job is in in_flight: past the limit, new work is turned away
+                if len(self.in_flight) >= self.workers + self.max_queued:
+                    metrics.inc('m05_admission_rejections_total', {'class': 'feedback', 'reason': 'queue_full'})
+                    raise Overloaded(503, max(1, math.ceil(len(self.in_flight) / self.workers * self.average_seconds)),
+                                     'Too many explanations are being prepared, please try again shortly')
+                future = started = self.executor.submit(self.run, module, cache_key, generation, build)
+                self.in_flight[job_key] = future
+            token = secrets.token_urlsafe(16)
+            self.jobs[token] = (owner, future)
+            # Forget the oldest tokens; their explanations are still in the feedback cache
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+        if started is not None:
+            # Outside the lock: the callback runs immediately if the job has already finished
+            started.add_done_callback(lambda _: self.finished(job_key, started))
+        return token
+    
+    def run(self, module, cache_key, generation, build):
+        start = time.perf_counter()
+        explanation = build()
+        module.feedback_cache.put(cache_key, explanation, generation)
+        self.average_seconds = 0.8 * self.average_seconds + 0.2 * (time.perf_counter() - start)
+        return explanation
+    
+    def finished(self, job_key, future):
+        with self.lock:
+            if self.in_flight.get(job_key) is future:
+                del self.in_flight[job_key]
+    
+    def result(self, token, owner, timeout=0):
+        """The explanation, or None if it is not ready within timeout seconds
+        
+        Raises KeyError for unknown (or long forgotten) tokens and for tokens
+        another client owns, Overloaded if too many requests are already
+        waiting, and re-raises any error the job itself hit.
+        """
+        with self.lock:
+            job_owner, future = self.jobs[token]
+            if job_owner != owner:
+                raise KeyError(token)
+            if timeout <= 0 or future.done():
+                timeout = 0
+            elif self.waiting >= self.max_waiters:
+                metrics.inc('m05_admission_rejections_total', {'class': 'feedback', 'reason': 'waiters_full'})
+                raise Overloaded(503, max(1, math.ceil(self.average_seconds)),
+                                 'Too many requests are waiting for explanations, please try again shortly')
+            else:
+                self.waiting += 1
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            return None
+        finally:
+            if timeout:
+                with self.lock:
+                    self.waiting -= 1
+
+class QuestionCorpus:
+    """Cache the parsed question bank until its source files change
+    
+    Every rebuild is diffed against the previous corpus (or the last saved
+    questions.json after a restart) so that only feedback for questions that
+    actually changed is invalidated, and IDs of questions that were edited or
+    renumbered are recorded as aliases of their replacements.
+    """
+    
+    def __init__(self, module):
+        self.module = module
+        self.questions = None
+        self.by_id = {}
+        self.facets = None
+        self.bootstrap_json = None  # Serialised /api/bootstrap payload for this generation
+        self.clusters = []
+        self.clusterer = QuestionClusterer()
+        self.aliases = self.load_aliases()
+        self.last_changes = None
+        self.signature = None
+        self.generation = 0  # Incremented every time the corpus is rebuilt
+        self.lock = threading.Lock()
+    
+    def load_aliases(self):
+        aliases_file = self.module.aliases_file
+        if not aliases_file.exists():
+            return {}
+        try:
+            with open(aliases_file, 'r', encoding='utf-8') as f:
+                return {int(k): int(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            print(f"Error loading question aliases from {aliases_file}: {e}")
+            return {}
+    
+    def save_aliases(self):
+        with open(self.module.aliases_file, 'w', encoding='utf-8') as f:
+            json.dump({str(k): v for k, v in sorted(self.aliases.items())}, f, indent=2)
+    
+    def load_previous_questions(self):
+        """Questions saved by the previous run, used to diff the first build after a restart"""
+        if not self.module.questions_file.exists():
+            return []
+        try:
+            with open(self.module.questions_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+    
+    @staticmethod
+    def diff(old_questions, new_questions):
+        """Compare two corpora by question ID and content hash"""
+        old_by_id = {q.get('id'): q for q in old_questions}
+        new_by_id = {q['id']: q for q in new_questions}
+        return {
+            'added': [qid for qid in new_by_id if qid not in old_by_id],
+            'removed': [qid for qid in old_by_id if qid not in new_by_id],
+            'changed': [qid for qid, q in new_by_id.items()
+                        if qid in old_by_id and old_by_id[qid].get('content_hash') != q['content_hash']],
+        }
+    
+    def update_aliases(self, old_questions, new_questions, changes):
+        """Point IDs that disappeared at the question now in the same paper/number slot"""
+        new_by_slot = {(Path(q['source_file']).stem, q.get('question_number')): q['id'] for q in new_questions}
+        old_by_id = {q.get('id'): q for q in old_questions}
+        updated = False
+        for old_id in changes['removed']:
+            old = old_by_id[old_id]
+            new_id = new_by_slot.get((Path(old.get('source_file', '')).stem, old.get('question_number')))
+            if new_id is not None and isinstance(old_id, int):
+                self.aliases[old_id] = new_id
+                updated = True
+        if updated:
+            # Collapse chains so every alias points straight at a current ID
+            for old_id, target in self.aliases.items():
+                seen = set()
+                while target in self.aliases and target not in seen:
+                    seen.add(target)
+                    target = self.aliases[target]
+                self.aliases[old_id] = target
+            self.save_aliases()
+    
+    @staticmethod
+    def build_facets(questions):
+        """Years, learning objectives and multiple choice count for the selection page"""
+        years = set()
+        objectives = {}
+        multiple_choice_count = 0
+        for q in questions:
+            # Extract year from filename like "M05 Exam - 2024.pdf"
+            year_match = re.search(r'(\d{4})', q.get('source_file', ''))
+            if year_match:
+                years.add(year_match.group(1))
+            lo = q.get('learning_objective')
+            if lo:
+                objectives[lo] = objectives.get(lo, 0) + 1
+            if q.get('is_multiple_choice', False):
+                multiple_choice_count += 1
+        return {
+            'years': sorted(years, reverse=True),
+            # Sorted by objective number
+            'learning_objectives': sorted([{'number': k, 'count': v} for k, v in objectives.items()],
+                                          key=lambda x: float(x['number'])),
+            'multiple_choice_count': multiple_choice_count,
+        }
+    
+    def get_facets(self):
+        self.get()
+        return self.facets
+    
+    def get_bootstrap_json(self):
+        """The selection page payload, serialised once per corpus generation"""
+        self.get()
+        with self.lock:
+            if self.bootstrap_json is None or self.bootstrap_json[0] != self.generation:
+                payload = app.json.dumps(dict(self.facets, authenticated=True, module=self.module.name,
+                                              corpus_generation=self.generation))
+                # Content-based tag, so it stays valid across restarts (generations restart at 1)
+                etag = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+                self.bootstrap_json = (self.generation, payload, etag)
+            return self.bootstrap_json[1], self.bootstrap_json[2]
+    
+    def find(self, question_id):
+        """Look up a question by its current ID or any earlier ID it replaced"""
+        self.get()  # Picks up edited source files, as load_questions() does
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            return None
+        question = self.by_id.get(question_id)
+        if question is None and question_id in self.aliases:
+            question = self.by_id.get(self.aliases[question_id])
+        return question
+    
+    def find_many(self, question_ids):
+        """find() for a list of IDs (None for unknown ones), checking the source files only once"""
+        self.get()
+        found = []
+        for question_id in question_ids:
+            try:
+                question_id = int(question_id)
+            except (TypeError, ValueError):
+                found.append(None)
+                continue
+            question = self.by_id.get(question_id)
+            if question is None and question_id in self.aliases:
+                question = self.by_id.get(self.aliases[question_id])
+            found.append(question)
+        return found
+    
+    def source_signature(self):
+        """Name, size and modification time of every exam paper and explanations bank file
+        
+        Other study text files do not affect the questions; StudyTextIndex.refresh() watches those.
+        """
+        exam_papers_dir = self.module.exam_papers_dir
+        file_paths = sorted(exam_papers_dir.iterdir()) if exam_papers_dir.exists() else []
+        file_paths += QuestionExplanations.explanation_files(self.module.study_text_dir)
+        signature = []
+        for file_path in file_paths:
+            try:
+                stat = file_path.stat()
+            except OSError:
+                continue
+            signature.append((str(file_path), stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+    
+    def get(self):
+        """Return the current question list, re-parsing only if a source file changed"""
+        # Checking file stats on every call keeps Railway and local environments in sync
+        # without re-parsing every paper on every request
+        signature = self.source_signature()
+        with self.lock:
+            if self.questions is not None and signature == self.signature:
+                metrics.inc('m05_cache_requests_total', {'cache': 'corpus', 'result': 'hit'})
+                return self.questions
+            
+            metrics.inc('m05_cache_requests_total', {'cache': 'corpus', 'result': 'miss'})
+            with metrics.timer('load_questions'):
+                questions = QuestionParser.load_questions_from_files(self.module.exam_papers_dir,
+                                                                     self.module.study_text_dir)
+            with metrics.timer('cluster_questions'):
+                clusters = self.clusterer.cluster(questions)
+            
+            old_questions = self.questions if self.questions is not None else self.load_previous_questions()
+            changes = self.diff(old_questions, questions)
+            self.update_aliases(old_questions, questions, changes)
+            self.module.feedback_cache.invalidate(changes['removed'] + changes['changed'])
+            self.last_changes = {name: len(ids) for name, ids in changes.items()}
+            
+            save_questions(questions, self.module.questions_file)
+            self.questions = questions
+            self.by_id = {q['id']: q for q in questions}
+            self.facets = self.build_facets(questions)
+            self.clusters = clusters
+            self.signature = signature
+            self.generation += 1
+            metrics.set_gauge('m05_corpus_generation', self.generation, {'module': self.module.name})
+            metrics.set_gauge('m05_corpus_questions', len(questions), {'module': self.module.name})
+            return questions
+    
+    def invalidate(self):
+        """Force the next get() to re-parse the source files"""
+        with self.lock:
+            self.signature = None
+
+class OfflineBank:
+    """Versioned copy of the question bank for the offline quiz client
+    
+    Each entry carries everything needed to grade a question without the server:
+    the correct answer and its option text, plus the answer-independent part of the
+    feedback explanation. The version is a hash of the entries, so it stays the same
+    across restarts and changes only when a question or its explanation does. The
+    per-question hashes of recent versions are kept so a client can be sent just
+    the questions that changed or were removed since the version it holds.
+    """
+    
+    # Question fields the client needs to filter, display and grade questions
+    FIELDS = ('id', 'question', 'options', 'correct_answer', 'is_multiple_choice', 'source_file',
+              'question_number', 'learning_objective', 'original_order', 'content_hash',
+              'cluster_id', 'cluster_size')
+    
+    def __init__(self, module, history=OFFLINE_VERSION_HISTORY):
+        self.module = module
+        self.history = history
+        self.generation = None
+        self.version = None
+        self.entries = {}
+        self.versions = OrderedDict()  # version -> {question id: entry hash}
+        self.building = None  # Thread building the next version, while one runs
+        self.build_started = None
+        self.build_seconds = None  # How long the last build took, for Retry-After
+        self.epoch = 0  # Bumped by invalidate(), so a build already running is not taken as current
+        self.lock = threading.Lock()
+    
+    def build_entry(self, question, study_index):
+        entry = {field: question.get(field) for field in self.FIELDS}
+        correct_answers = [a.strip().upper() for a in question['correct_answer'].split(',')]
+        correct_texts = [opt['text'] for opt in question['options'] if opt['letter'] in correct_answers]
+        entry['correct_option_text'] = ', '.join(correct_texts)
+        entry['explanation_core'] = study_index.core_feedback_explanation(
+            question['question'],
+            entry['correct_option_text'],
+            [opt['text'] for opt in question['options']]
+        )
+        return entry
+    
+    @staticmethod
+    def entry_hash(entry):
+        return hashlib.sha1(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    
+    def refresh(self):
+        """Start rebuilding the entries in the background if the corpus has changed since they were built
+        
+        Every entry runs study text retrieval, which takes seconds on a large bank, so
+        the build gets its own thread instead of holding up a request (and the lock).
+        """
+        corpus = self.module.corpus
+        corpus.get()
+        with self.lock:
+            if self.generation == corpus.generation or self.building is not None:
+                return
+            self.build_started = time.monotonic()
+            self.building = threading.Thread(target=self.build, args=(self.epoch,),
+                                             name=f'offline-bank-{self.module.name}', daemon=True)
+            self.building.start()
+    
+    def build(self, epoch):
+        try:
+            corpus = self.module.corpus
+            corpus.get()
+            with corpus.lock:
+                questions, generation = corpus.questions, corpus.generation
+            study_index = self.module.study_index
+            start = time.perf_counter()
+            with metrics.timer('build_offline_bank'):
+                entries = {q['id']: self.build_entry(q, study_index) for q in questions}
+                hashes = {qid: self.entry_hash(entry) for qid, entry in entries.items()}
+                version = hashlib.sha1(
+                    ''.join(f'{qid}:{h};' for qid, h in sorted(hashes.items())).encode('utf-8')
+                ).hexdigest()[:16]
+            with self.lock:
+                self.entries = entries
+                self.version = version
+                self.versions.pop(version, None)
+                self.versions[version] = hashes
+                while len(self.versions) > self.history:
+                    self.versions.popitem(last=False)
+                # Invalidated while building (the study text changed): serve it, but build again next time
+                self.generation = generation if epoch == self.epoch else None
+                self.build_seconds = time.perf_counter() - start
+        except Exception as e:
+            print(f"Error building the offline bank for {self.module.name}: {e}")
+        finally:
+            with self.lock:
+                self.building = None
+    
+    def retry_after(self):
+        """Seconds until the running build should be done, going by the last one"""
+        if self.build_seconds is None or self.build_started is None:
+            return 5
+        return max(1, math.ceil(self.build_seconds - (time.monotonic() - self.build_started)))
+    
+    def changes_since(self, since):
+        """Questions added or changed, and IDs removed, since the client's version
+        
+        Unknown or missing versions get the whole bank with full=True, telling the
+        client to replace its copy rather than patch it. While a rebuild runs the
+        previous version is served; before the first build finishes this raises
+        Overloaded (503 with Retry-After).
+        """
+        self.refresh()
+        with self.lock:
+            if self.version is None:
+                raise Overloaded(503, self.retry_after(), 'The offline question bank is still being built')
+            current = self.versions[self.version]
+            previous = self.versions.get(since) if since else None
+            if previous is None:
+                return {'version': self.version, 'full': True,
+                        'questions': list(self.entries.values()), 'removed': []}
+            return {
+                'version': self.version,
+                'full': False,
+                'questions': [self.entries[qid] for qid, h in current.items() if previous.get(qid) != h],
+                'removed': [qid for qid in previous if qid not in current],
+            }
+    
+    def invalidate(self):
+        """Force the next refresh to rebuild (e.g. after the study text was reloaded)"""
+        with self.lock:
+            self.generation = None
+            self.epoch += 1
+
+class QuestionSearchIndex:
+    """Full-text search over question text, options and pre-written explanations
+    
+    An inverted index maps each token to the questions containing it (with a
+    field-weighted term frequency) and results are ranked with BM25. A sorted
+    vocabulary list answers prefix autocomplete with a binary search. Like the
+    offline bank, it rebuilds itself the first time it is used after the corpus
+    changes.
+    """
+    
+    TOKEN_PATTERN = re.compile(r"[a-z0-9£]+")
+    STOP_WORDS = frozenset({'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have',
+                            'in', 'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was',
+                            'which', 'with', 'would'})
+    # A word in the question counts for more than one in an option or explanation
+    FIELD_WEIGHTS = {'question': 3.0, 'options': 1.0, 'explanation': 1.0}
+    # BM25 parameters
+    K1 = 1.2
+    B = 0.75
+    
+    def __init__(self, module):
+        self.module = module
+        self.generation = None
+        self.questions = []
+        self.postings = {}  # token -> {question index: weighted term frequency}
+        self.doc_lengths = []
+        self.average_length = 0.0
+        self.terms = []  # Sorted vocabulary, for prefix lookups
+        self.lock = threading.Lock()
+    
+    @classmethod
+    def tokenize(cls, text):
+        # Single letters are mostly option labels and the "s" of possessives
+        return [t for t in cls.TOKEN_PATTERN.findall((text or '').lower())
+                if len(t) > 1 and t not in cls.STOP_WORDS]
+    
+    def refresh(self):
+        """Rebuild the index if the corpus has been rebuilt since the last call"""
+        corpus = self.module.corpus
+        questions = corpus.get()
+        explanations = self.module.study_index.question_explanations
+        with self.lock:
+            if self.generation == corpus.generation:
+                return
+            with metrics.timer('build_search_index'):
+                postings = {}
+                doc_lengths = []
+                for doc, question in enumerate(questions):
+                    fields = {
+                        'question': question['question'],
+                        'options': ' '.join(opt['text'] for opt in question['options']),
+                        'explanation': explanations.get_explanation(question['question']) or '',
+                    }
+                    length = 0.0
+                    for field, text in fields.items():
+                        weight = self.FIELD_WEIGHTS[field]
+                        for token in self.tokenize(text):
+                            doc_postings = postings.setdefault(token, {})
+                            doc_postings[doc] = doc_postings.get(doc, 0.0) + weight
+                            length += weight
+                    doc_lengths.append(length)
+            self.questions = questions
+            self.postings = postings
+            self.doc_lengths = doc_lengths
+            self.average_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+            self.terms = sorted(postings)
+            self.generation = corpus.generation
+    
+    def invalidate(self):
+        with self.lock:
+            self.generation = None
+    
+    @staticmethod
+    def matches_filters(question, year=None, learning_objective=None, multiple_choice_only=False):
+        """Same filters as /api/questions/filter"""
+        if year and str(year) not in question.get('source_file', ''):
+            return False
+        if learning_objective and question.get('learning_objective') != str(learning_objective):
+            return False
+        if multiple_choice_only and not question.get('is_multiple_choice', False):
+            return False
+        return True
+    
+    def search(self, query, year=None, learning_objective=None, multiple_choice_only=False, page=1, per_page=20):
+        """Ranked, paginated matches for every token in the query (any token if none match all)"""
+        self.refresh()
+        tokens = list(dict.fromkeys(self.tokenize(query)))
+        with self.lock:
+            questions = self.questions
+            doc_count = len(questions)
+            scores = {}
+            hits = {}
+            for token in tokens:
+                doc_postings = self.postings.get(token)
+                if not doc_postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(doc_postings) + 0.5) / (len(doc_postings) + 0.5))
+                for doc, tf in doc_postings.items():
+                    norm = self.K1 * (1 - self.B + self.B * self.doc_lengths[doc] / self.average_length)
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.K1 + 1) / (tf + norm)
+                    hits[doc] = hits.get(doc, 0) + 1
+        
+        # Prefer questions containing every query token; fall back to any of them
+        matched = [doc for doc in scores if hits[doc] == len(tokens)] or list(scores)
+        matched = [doc for doc in matched
+                   if self.matches_filters(questions[doc], year, learning_objective, multiple_choice_only)]
+        matched.sort(key=lambda doc: (-scores[doc], questions[doc].get('source_file', ''),
+                                      questions[doc].get('original_order', 0)))
+        
+        start = (page - 1) * per_page
+        results = []
+        for doc in matched[start:start + per_page]:
+            q = questions[doc]
+            results.append({
+                'id': q['id'],
+                'question': q['question'],
+                'source_file': q.get('source_file', ''),
+                'question_number': q.get('question_number', ''),
+                'learning_objective': q.get('learning_objective', ''),
+                'is_multiple_choice': q.get('is_multiple_choice', False),
+                'cluster_id': q.get('cluster_id'),
+                'score': round(scores[doc], 4),
+            })
+        return {'query': query, 'total': len(matched), 'page': page, 'per_page': per_page, 'results': results}
+    
+    def suggest(self, prefix, limit=10):
+        """Indexed words starting with the prefix, most widely used first"""
+        self.refresh()
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        with self.lock:
+            start = bisect.bisect_left(self.terms, prefix)
+            candidates = []
+            for term in self.terms[start:]:
+                if not term.startswith(prefix):
+                    break
+                candidates.append((len(self.postings[term]), term))
+        candidates.sort(key=lambda item: (-item[0], item[1]))
+        return [{'term': term, 'count': count} for count, term in candidates[:limit]]
+
+class QuestionModule:
+    """One question bank (M05, M92, W01, ...) and everything built from it
+    
+    The default module keeps using the top-level exam_papers/ and study_text/
+    directories; any other module lives in modules/<NAME>/. Nothing is read
+    until load() is called.
+    """
+    
+    def __init__(self, name, exam_papers_dir, study_text_dir, questions_file, aliases_file):
+        self.name = name
+        self.exam_papers_dir = exam_papers_dir
+        self.study_text_dir = study_text_dir
+        self.questions_file = questions_file
+        self.aliases_file = aliases_file
+        self.feedback_cache = FeedbackCache()
+        self.corpus = QuestionCorpus(self)
+        self.offline_bank = OfflineBank(self)
+        self.search_index = QuestionSearchIndex(self)
+        self.study_index = None
+        self.last_used = None
+        self.lock = threading.Lock()
+    
+    @property
+    def loaded(self):
+        return self.study_index is not None and self.corpus.questions is not None
+    
+    def load(self, phase=None):
+        """Build the study text index and question corpus (only the first call does any work)"""
+        phase = phase or (lambda name: nullcontext())
+        with self.lock:
+            if self.loaded:
+                return
+            with phase('study_index'):
+                self.study_index = StudyTextIndex(self.study_text_dir)
+            with phase('question_corpus'):
+                self.corpus.get()
+    
+    def refresh_study_text(self):
+        """Pick up edited study text, dropping everything built from the old text"""
+        if not self.study_index.refresh():
+            return False
+        self.feedback_cache.clear()
+        self.offline_bank.invalidate()
+        self.search_index.invalidate()
+        return True
+    
+    def memory_bytes(self):
+        """Memory held by the module's Python objects, measured as /api/admin/memory reports it
+        
+        The study text itself is memory-mapped and shared, so it does not count.
+        """
+        if not self.loaded:
+            return 0
+        return MemoryReport.total_bytes(MemoryReport.module_structures(self))
+
+class UnknownModule(Exception):
+    """Raised when a request names a module that has no directory"""
+
+class ModuleRegistry:
+    """Load modules on first use and unload the least recently used past the memory budget"""
+    
+    NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+    
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.modules = OrderedDict()  # Name -> QuestionModule, least recently used first
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def module_dirs():
+        """Module name -> directory for everything under MODULES_DIR"""
+        if not MODULES_DIR.exists():
+            return {}
+        return {path.name.upper(): path for path in sorted(MODULES_DIR.iterdir())
+                if path.is_dir() and ModuleRegistry.NAME_PATTERN.match(path.name)}
+    
+    def available(self):
+        return sorted({DEFAULT_MODULE} | set(self.module_dirs()))
+    
+    def create(self, name):
+        if name == DEFAULT_MODULE:
+            return QuestionModule(name, EXAM_PAPERS_DIR, STUDY_TEXT_DIR, QUESTIONS_FILE, QUESTION_ALIASES_FILE)
+        directory = self.module_dirs().get(name)
+        if directory is None:
+            raise UnknownModule(name)
+        return QuestionModule(name, directory / 'exam_papers', directory / 'study_text',
+                              directory / 'questions.json', directory / 'question_aliases.json')
+    
+    def get(self, name=None, phase=None):
+        """Return the named module (default if None), loading it first if necessary"""
+        name = (name or DEFAULT_MODULE).strip().upper()
+        if not self.NAME_PATTERN.match(name):
+            raise UnknownModule(name)
+        with self.lock:
+            module = self.modules.get(name)
+            if module is None:
+                module = self.create(name)
+                self.modules[name] = module
+            self.modules.move_to_end(name)
+            module.last_used = time.time()
+        if not module.loaded:
+            start = time.perf_counter()
+            module.load(phase)
+            print(f"Module {name}: loaded in {time.perf_counter() - start:.2f}s, {MemoryReport.summary_line(module)}")
+            self.evict(keep=name)
+        return module
+    
+    def evict(self, keep):
+        """Unload least recently used modules until the loaded ones fit the budget"""
+        with self.lock:
+            sizes = {name: module.memory_bytes() for name, module in self.modules.items()}
+            total = sum(sizes.values())
+            for name in list(self.modules):
+                if total <= self.budget_bytes:
+                    break
+                if name == keep:
+                    continue
+                # Requests already holding the module finish with it; the next one reloads it
+                del self.modules[name]
+                total -= sizes[name]
+                metrics.inc('m05_module_evictions_total', {'module': name})
+                print(f"Module {name}: unloaded to stay within the memory budget")
+    
+    def status(self):
+        with self.lock:
+            loaded = [{
+                'module': name,
+                'loaded': module.loaded,
+                'memory_mb': round(module.memory_bytes() / (1024 * 1024), 2),
+                'questions': len(module.corpus.questions or []),
+                'last_used': module.last_used,
+            } for name, module in reversed(self.modules.items())]
+        return {
+            'default': DEFAULT_MODULE,
+            'available': self.available(),
+            'loaded': loaded,
+            'budget_mb': round(self.budget_bytes / (1024 * 1024), 2),
+        }
+
+class ResultsStore:
+    """Saved quiz results, partitioned per user
+    
+    Each user has a folder under RESULTS_DIR holding:
+    
+    - attempts.ndjson: append-only log, one attempt (with its questions and answers) per line
+    - summary.json: index of that log - each attempt's scores without the questions
+      and answers, where it sits in the log, and how much of the log is indexed
+    
+    Saving appends one line and rewrites only that user's index, under that user's
+    own lock, so candidates never wait on each other and viewing a history reads
+    one small file. The log is the source of truth: an index left behind (a crash
+    between the two writes) is caught up from it, and a half-written last line is
+    ignored and then cut off by the next save.
+    """
+    
+    LOG_NAME = 'attempts.ndjson'
+    INDEX_NAME = 'summary.json'
+    INDEX_VERSION = 1
+    SUMMARY_FIELDS = ('id', 'timestamp', 'total', 'correct', 'incorrect', 'percentage', 'mode', 'module',
+                      'learning_objective_breakdown')
+    
+    def __init__(self, results_dir, legacy_file=None):
+        self.results_dir = results_dir
+        self.legacy_file = legacy_file
+        self.locks = {}  # Partition -> lock held while saving or indexing
+        self.indexes = {}  # Partition -> summary index
+        self.locks_lock = threading.Lock()
+        self.migrate_lock = threading.Lock()
+        self.migrated = False
+    
+    @staticmethod
+    def partition_name(username):
+        """Folder for a user: readable, safe on any filesystem and distinct for every username"""
+        username = username or DEFAULT_USERNAME
+        slug = re.sub(r'[^A-Za-z0-9_-]', '_', username)[:40]
+        return f"{slug}-{hashlib.sha1(username.encode('utf-8')).hexdigest()[:8]}"
+    
+    def lock_for(self, partition):
+        with self.locks_lock:
+            return self.locks.setdefault(partition, threading.Lock())
+    
+    def log_path(self, partition):
+        return self.results_dir / partition / self.LOG_NAME
+    
+    def index_path(self, partition):
+        return self.results_dir / partition / self.INDEX_NAME
+    
+    def partitions(self):
+        """Every partition that has saved results"""
+        self.migrate_legacy()
+        try:
+            return sorted(path.name for path in self.results_dir.iterdir() if (path / self.LOG_NAME).is_file())
+        except OSError:
+            return []
+    
+    def log_sizes(self):
+        sizes = {}
+        for partition in self.partitions():
+            try:
+                sizes[partition] = self.log_path(partition).stat().st_size
+            except OSError:
+                continue
+        return sizes
+    
+    def read_log(self, partition, start=0):
+        """Yield (entry, end offset) for each complete line of a log from byte offset start
+        
+        Unreadable lines give None as the entry, so callers can still move past them.
+        """
+        try:
+            f = open(self.log_path(partition), 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Still being written, or left by a save that never finished
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError as e:
+                    print(f"Skipping unreadable line in {self.log_path(partition)} before byte {offset}: {e}")
+                    entry = None
+                yield (entry if isinstance(entry, dict) else None), offset
+    
+    def summary(self, entry):
+        return {field: entry.get(field) for field in self.SUMMARY_FIELDS}
+    
+    def new_index(self):
+        return {'version': self.INDEX_VERSION, 'log_size': 0, 'next_id': 1, 'attempts': []}
+    
+    def write_index(self, partition, index):
+        path = self.index_path(partition)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    
+    def load_index(self, partition):
+        """A partition's summary index, caught up with its log (call with the partition's lock held)"""
+        index = self.indexes.get(partition)
+        if index is None:
+            try:
+                with open(self.index_path(partition), 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get('version') != self.INDEX_VERSION:
+                    index = None
+            except (OSError, ValueError):
+                index = None
+            index = index or self.new_index()
+        try:
+            size = self.log_path(partition).stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if size < index['log_size']:
+            # The log was replaced or cut short: index it again from the start
+            index = self.new_index()
+        if size > index['log_size']:
+            indexed = index['log_size']
+            for entry, end in self.read_log(partition, indexed):
+                if entry is not None:
+                    index['attempts'].append(dict(self.summary(entry), offset=index['log_size'],
+                                                  length=end - index['log_size']))
+                    if isinstance(entry.get('id'), int):
+                        index['next_id'] = max(index['next_id'], entry['id'] + 1)
+                index['log_size'] = end
+            if index['log_size'] != indexed:
+                self.write_index(partition, index)
+        self.indexes[partition] = index
+        return index
+    
+    def append(self, username, entry):
+        """Save one attempt for a user and return it, numbered within that user's history"""
+        self.migrate_legacy()
+        partition = self.partition_name(username)
+        with self.lock_for(partition):
+            (self.results_dir / partition).mkdir(parents=True, exist_ok=True)
+            index = self.load_index(partition)
+            entry = {'id': index['next_id'], **entry}
+            line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+            with open(self.log_path(partition), 'ab') as f:
+                if f.tell() != index['log_size']:
+                    f.truncate(index['log_size'])  # Drop a half-written line from an earlier crash
+                f.write(line)
+            index['attempts'].append(dict(self.summary(entry), offset=index['log_size'], length=len(line)))
+            index['log_size'] += len(line)
+            index['next_id'] += 1
+            self.write_index(partition, index)
+        return entry
+    
+    def history(self, username):
+        """A user's attempts without their questions and answers, read from the summary index only"""
+        self.migrate_legacy()
+        partition = self.partition_name(username)
+        if not (self.results_dir / partition).is_dir():
+            return []
+        with self.lock_for(partition):
+            index = self.load_index(partition)
+            return [{key: value for key, value in attempt.items() if key not in ('offset', 'length')}
+                    for attempt in index['attempts']]
+    
+    def entries(self, username):
+        """A user's full attempts, streamed from the log (saves made meanwhile may or may not appear)"""
+        self.migrate_legacy()
+        for entry, _ in self.read_log(self.partition_name(username)):
+            if entry is not None:
+                yield entry
+    
+    def migrate_legacy(self):
+        """Move the single-file history from before partitioning into the default user's partition
+        
+        The app has only ever had one login, so every old result belongs to it.
+        """
+        if self.migrated:
+            return
+        with self.migrate_lock:
+            if self.migrated:
+                return
+            if self.legacy_file is not None and self.legacy_file.exists():
+                partition = self.partition_name(DEFAULT_USERNAME)
+                log_path = self.log_path(partition)
+                tmp_path = f"{log_path}.{os.getpid()}.tmp"
+                try:
+                    log_path.parent.mkdir(parents=True, exist_ok=True)
+                    count = 0
+                    with open(tmp_path, 'wb') as f:
+                        for entry in ResultsExport.iter_entries(self.legacy_file):
+                            f.write((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+                            count += 1
+                    os.replace(tmp_path, log_path)
+                    self.legacy_file.rename(self.legacy_file.with_name(self.legacy_file.name + '.migrated'))
+                    print(f"Moved {count} saved results from {self.legacy_file} to {log_path.parent}")
+                except (OSError, ValueError) as e:
+                    print(f"Error moving {self.legacy_file} into {log_path.parent}: {e}")
+            self.migrated = True
+
+class ItemAnalysis:
+    """Per-question statistics from the saved quiz results
+    
+    The results history is flattened into one row per answered question and held
+    as NumPy columns (attempt, module, question ID, selected options as a bitmask,
+    correct). Every statistic is then a vectorised group-by over those columns:
+    
+    - difficulty: share of answers that were correct
+    - discrimination: correct rate among the top 27% of attempts minus the bottom
+      27%, ranking attempts by their score on the other questions in the quiz
+    - option rates: share of answers selecting each option, so distractors that
+      draw too many (or no) candidates stand out
+    
+    The statistics are about questions, so they use every user's results. Attempts
+    saved since the columns were built are read from the end of each user's log
+    and appended; a module's report is recomputed only when the columns or that
+    module's corpus change.
+    """
+    
+    LETTERS = 'ABCDEFGH'
+    GROUP_FRACTION = 0.27
+    # Fewer answers than this and the upper and lower groups say nothing useful
+    MIN_DISCRIMINATION_ANSWERS = 10
+    
+    def __init__(self, store):
+        self.store = store
+        self.columns = None  # (signature, columns dict)
+        self.reports = {}  # Module name -> (signature, corpus generation, report)
+        self.lock = threading.Lock()
+    
+    def flatten(self, entries, first_attempt, module_codes):
+        """NumPy columns for the answered questions in some results entries"""
+        attempts, module_ids, question_ids, selections, corrects = [], [], [], [], []
+        letter_bits = {letter: 1 << i for i, letter in enumerate(self.LETTERS)}
+        for attempt, entry in enumerate(entries, start=first_attempt):
+            module_code = module_codes.setdefault((entry.get('module') or DEFAULT_MODULE).upper(), len(module_codes))
+            for question, answer in zip(entry.get('questions') or [], entry.get('answers') or []):
+                if not isinstance(question, dict) or not isinstance(answer, dict) or not answer.get('answered'):
+                    continue
+                try:
+                    question_id = int(question.get('id'))
+                except (TypeError, ValueError):
+                    continue
+                mask = 0
+                for letter in str(answer.get('selected') or '').split(','):
+                    mask |= letter_bits.get(letter.strip().upper(), 0)
+                attempts.append(attempt)
+                module_ids.append(module_code)
+                question_ids.append(question_id)
+                selections.append(mask)
+                corrects.append(bool(answer.get('correct')))
+        return {
+            'attempt': np.array(attempts, dtype=np.int64),
+            'module': np.array(module_ids, dtype=np.int32),
+            'question_id': np.array(question_ids, dtype=np.int64),
+            'selected': np.array(selections, dtype=np.uint8),
+            'correct': np.array(corrects, dtype=bool),
+        }
+    
+    def empty_columns(self):
+        columns = self.flatten([], 0, {})
+        # covered: partition -> log bytes parsed; sizes: partition -> log size when last checked. They
+        # differ while a log ends in a half-written line or is empty, so only sizes says nothing changed
+        columns.update(modules={}, next_attempt=0, covered={}, sizes={})
+        return columns
+    
+    def load_columns(self, columns, sizes):
+        """Add the attempts appended to each log since the columns were built"""
+        if any(sizes.get(partition, 0) < covered for partition, covered in columns['covered'].items()):
+            columns = self.empty_columns()  # A log was replaced or cut short: read everything again
+        covered = dict(columns['covered'])
+        entries = []
+        for partition, size in sizes.items():
+            if size == covered.get(partition, 0):
+                continue
+            try:
+                for entry, end in self.store.read_log(partition, covered.get(partition, 0)):
+                    if entry is not None:
+                        entries.append(entry)
+                    covered[partition] = end
+            except OSError as e:
+                print(f"Error loading results for item analysis: {e}")
+        module_codes = dict(columns['modules'])
+        added = self.flatten(entries, columns['next_attempt'], module_codes)
+        updated = {key: np.concatenate((columns[key], values)) for key, values in added.items()}
+        updated.update(modules=module_codes, next_attempt=columns['next_attempt'] + len(entries), covered=covered,
+                       sizes=dict(sizes))
+        return updated
+    
+    def get_columns(self):
+        sizes = self.store.log_sizes()
+        if self.columns is None or self.columns[1]['sizes'] != sizes:
+            start = time.perf_counter()
+            columns = self.load_columns(self.columns[1] if self.columns else self.empty_columns(), sizes)
+            self.columns = (tuple(sorted(columns['covered'].items())), columns)
+            metrics.observe('m05_stage_duration_seconds', time.perf_counter() - start, {'stage': 'item_analysis_load'})
+        return self.columns
+    
+    def compute(self, columns, module_name, aliases):
+        """Difficulty, discrimination and option rates for every question answered in a module"""
+        module_code = columns['modules'].get(module_name)
+        rows = columns['module'] == module_code if module_code is not None else np.zeros(0, dtype=bool)
+        attempt = columns['attempt'][rows]
+        question_ids = columns['question_id'][rows]
+        selected = columns['selected'][rows]
+        correct = columns['correct'][rows].astype(np.float64)
+        
+        # Answers given under an old question ID count towards its replacement
+        unique_ids, inverse = np.unique(question_ids, return_inverse=True)
+        current_ids = np.array([aliases.get(int(qid), int(qid)) for qid in unique_ids], dtype=np.int64)
+        ids, remap = np.unique(current_ids, return_inverse=True)
+        q = remap[inverse]
+        count = len(ids)
+        answers = np.bincount(q, minlength=count)
+        difficulty = np.bincount(q, weights=correct, minlength=count) / np.maximum(answers, 1)
+        
+        # Option selection rates: one column per letter
+        bits = (selected[:, None] >> np.arange(len(self.LETTERS), dtype=np.uint8)) & 1
+        option_counts = np.stack([np.bincount(q, weights=bits[:, i], minlength=count)
+                                  for i in range(len(self.LETTERS))], axis=1)
+        option_rates = option_counts / np.maximum(answers, 1)[:, None]
+        
+        # Rank each answer's attempt by its score on the other questions (so the item
+        # does not count towards its own ranking), within each question
+        attempt_answers = np.bincount(attempt)
+        attempt_correct = np.bincount(attempt, weights=correct)
+        other_answers = attempt_answers[attempt] - 1
+        ranked = other_answers > 0
+        rest_score = (attempt_correct[attempt][ranked] - correct[ranked]) / other_answers[ranked]
+        rq = q[ranked]
+        # Scores lie in [0, 1], so one argsort on q * 2 + score groups by question, then score
+        order = np.argsort(rq * 2 + rest_score)
+        rq = rq[order]
+        rc = correct[ranked][order]
+        ranked_answers = np.bincount(rq, minlength=count)
+        starts = np.cumsum(ranked_answers) - ranked_answers
+        rank = np.arange(len(rq)) - starts[rq]
+        group = np.ceil(self.GROUP_FRACTION * ranked_answers).astype(np.int64)
+        lower = rank < group[rq]
+        upper = rank >= (ranked_answers - group)[rq]
+        group_size = np.maximum(group, 1)
+        p_lower = np.bincount(rq[lower], weights=rc[lower], minlength=count) / group_size
+        p_upper = np.bincount(rq[upper], weights=rc[upper], minlength=count) / group_size
+        discrimination = p_upper - p_lower
+        
+        return {
+            'ids': ids,
+            'answers': answers,
+            'difficulty': difficulty,
+            'discrimination': discrimination,
+            'ranked_answers': ranked_answers,
+            'option_rates': option_rates,
+            'attempts': int(np.count_nonzero(attempt_answers)),
+        }
+    
+    def report(self, module):
+        """The module's item statistics, recomputed only when the results or questions change"""
+        with self.lock:
+            signature, columns = self.get_columns()
+            corpus = module.corpus
+            questions = corpus.get()
+            cached = self.reports.get(module.name)
+            if cached is not None and cached[0] == signature and cached[1] == corpus.generation:
+                return cached[2]
+            
+            start = time.perf_counter()
+            stats = self.compute(columns, module.name, corpus.aliases)
+            items = []
+            for i, question_id in enumerate(stats['ids'].tolist()):
+                question = corpus.by_id.get(question_id)
+                letters = [opt['letter'] for opt in question['options']] if question else []
+                correct_answers = [a.strip().upper() for a in question['correct_answer'].split(',')] if question else []
+                rates = {letter: round(float(stats['option_rates'][i, j]), 3)
+                         for j, letter in enumerate(self.LETTERS)
+                         if letter in letters or stats['option_rates'][i, j] > 0}
+                distractors = {letter: rate for letter, rate in rates.items() if letter not in correct_answers}
+                top_distractor = max(distractors, key=distractors.get) if distractors and question else None
+                items.append({
+                    'id': question_id,
+                    'in_corpus': question is not None,
+                    'question': question['question'] if question else None,
+                    'source_file': question.get('source_file', '') if question else '',
+                    'question_number': question.get('question_number', '') if question else '',
+                    'learning_objective': question.get('learning_objective', '') if question else '',
+                    'correct_answer': question['correct_answer'] if question else None,
+                    'answers': int(stats['answers'][i]),
+                    'difficulty': round(float(stats['difficulty'][i]), 3),
+                    'discrimination': (round(float(stats['discrimination'][i]), 3)
+                                       if stats['ranked_answers'][i] >= self.MIN_DISCRIMINATION_ANSWERS else None),
+                    'option_rates': rates,
+                    'top_distractor': ({'letter': top_distractor, 'rate': distractors[top_distractor]}
+                                       if top_distractor else None),
+                })
+            elapsed = time.perf_counter() - start
+            metrics.observe('m05_stage_duration_seconds', elapsed, {'stage': 'item_analysis'})
+            report = {
+                'module': module.name,
+                'attempts': stats['attempts'],
+                'answers': int(stats['answers'].sum()),
+                'questions_in_corpus': len(questions),
+                'computed_in_ms': round(elapsed * 1000, 1),
+                'items': items,
+            }
+            self.reports[module.name] = (signature, corpus.generation, report)
+            return report
+
+class ResultsExport:
+    """Stream results out as CSV or NDJSON with flat memory
+    
+    Attempts come in one at a time (from a user's log, or from a single-file
+    JSON array history, which is read in chunks and decoded an entry at a
+    time), so memory is bounded by the largest single attempt rather than the
+    whole history. Rows are written in batches as they are produced.
+    """
+    
+    CHUNK_SIZE = 64 * 1024
+    ROWS_PER_CHUNK = 200
+    ATTEMPT_COLUMNS = ['id', 'timestamp', 'module', 'mode', 'total', 'correct', 'incorrect', 'percentage']
+    ANSWER_COLUMNS = ['attempt_id', 'timestamp', 'module', 'mode', 'position', 'question_id',
+                      'source_file', 'question_number', 'learning_objective', 'selected', 'correct_answer', 'correct']
+    
+    @staticmethod
+    def iter_entries(results_file, chunk_size=CHUNK_SIZE):
+        """Yield the entries of a JSON array history file one by one"""
+        if not results_file.exists():
+            return
+        decoder = json.JSONDecoder()
+        with open(results_file, 'r', encoding='utf-8') as f:
+            buffer = ''
+            pos = 0
+            eof = False
+            started = False
+            while True:
+                # Skip whitespace, the opening bracket and separators between entries
+                while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ',' or
+                                             (buffer[pos] == '[' and not started)):
+                    started = started or buffer[pos] == '['
+                    pos += 1
+                if pos < len(buffer) and buffer[pos] == ']':
+                    return
+                if pos < len(buffer):
+                    if not started:
+                        raise ValueError('Results history is not a JSON array')
+                    try:
+                        entry, end = decoder.raw_decode(buffer, pos)
+                    except json.JSONDecodeError:
+                        end = None
+                    # An entry running to the end of the buffer may be cut short: read on to be sure
+                    if end is not None and (end < len(buffer) or eof):
+                        yield entry
+                        pos = end
+                        continue
+                    if eof:
+                        raise ValueError(f'Results history is truncated or corrupt near entry starting "{buffer[pos:pos + 40]}"')
+                elif eof:
+                    if started:
+                        raise ValueError('Results history is missing its closing bracket')
+                    return
+                # Read at least as much again as is buffered, so a huge entry is decoded only a few times
+                chunk = f.read(max(chunk_size, len(buffer) - pos))
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+    
+    @staticmethod
+    def parse_bound(value, name):
+        """Check a from/to bound is an ISO date or date-time (timestamps are compared as ISO strings)"""
+        if not value:
+            return None
+        try:
+            datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f'{name} must be an ISO date such as 2025-01-31')
+        return value
+    
+    @staticmethod
+    def matches(entry, date_from=None, date_to=None, mode=None, module=None):
+        if not isinstance(entry, dict):
+            return False
+        timestamp = str(entry.get('timestamp') or '')
+        if date_from and (not timestamp or timestamp < date_from):
+            return False
+        # "to" is inclusive: 2025-01-31 keeps every attempt made that day
+        if date_to and (not timestamp or timestamp[:len(date_to)] > date_to):
+            return False
+        if mode and str(entry.get('mode') or '').lower() != mode.lower():
+            return False
+        if module and (entry.get('module') or DEFAULT_MODULE).upper() != module.upper():
+            return False
+        return True
+    
+    @staticmethod
+    def answer_rows(entry):
+        """One row per answered question of an attempt"""
+        for position, (question, answer) in enumerate(zip(entry.get('questions') or [], entry.get('answers') or []), start=1):
+            if not isinstance(question, dict) or not isinstance(answer, dict) or not answer.get('answered'):
+                continue
+            yield {
+                'attempt_id': entry.get('id'),
+                'timestamp': entry.get('timestamp', ''),
+                'module': entry.get('module') or DEFAULT_MODULE,
+                'mode': entry.get('mode', ''),
+                'position': position,
+                'question_id': question.get('id'),
+                'source_file': question.get('source_file', ''),
+                'question_number': question.get('question_number', ''),
+                'learning_objective': question.get('learning_objective', ''),
+                'selected': answer.get('selected', ''),
+                'correct_answer': question.get('correct_answer', ''),
+                'correct': bool(answer.get('correct')),
+            }
+    
+    @staticmethod
+    def csv_lines(entries, rows):
+        """CSV text in batches: one row per attempt (rows='attempts') or per answered question"""
+        columns = ResultsExport.ATTEMPT_COLUMNS if rows == 'attempts' else ResultsExport.ANSWER_COLUMNS
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        pending = 0
+        for entry in entries:
+            if rows == 'attempts':
+                writer.writerow({column: entry.get(column, '') for column in columns})
+                pending += 1
+            else:
+                for row in ResultsExport.answer_rows(entry):
+                    writer.writerow(row)
+                    pending += 1
+            if pending >= ResultsExport.ROWS_PER_CHUNK:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        yield buffer.getvalue()
+    
+    @staticmethod
+    def ndjson_lines(entries, rows):
+        """Whole attempts (rows='attempts') or answered questions, one JSON object per line"""
+        batch = []
+        for entry in entries:
+            items = [entry] if rows == 'attempts' else ResultsExport.answer_rows(entry)
+            batch.extend(json.dumps(item, ensure_ascii=False) + '\n' for item in items)
+            if len(batch) >= ResultsExport.ROWS_PER_CHUNK:
+                yield ''.join(batch)
+                batch = []
+        yield ''.join(batch)
+
+class MemoryReport:
+    """Approximate memory use of the in-memory structures, and tracemalloc snapshot diffs
+    
+    Sizes come from walking each structure with sys.getsizeof, counting every
+    object once per module (questions shared with the search index or offline
+    bank count towards the questions). They cover Python objects only: the study
+    text is memory-mapped, so it is reported separately as mapped bytes that
+    the OS page cache shares between worker processes.
+    
+    Snapshots are opt-in. tracemalloc is started by the first snapshot (or from
+    startup with TRACEMALLOC_FRAMES) and slows allocation-heavy code noticeably,
+    so stop it again once done.
+    """
+    
+    MAX_SNAPSHOTS = 10
+    SNAPSHOT_FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    )
+    CONTAINERS = (dict, list, tuple, set, frozenset)
+    
+    def __init__(self):
+        self.snapshots = OrderedDict()  # Label -> (time taken, snapshot)
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def deep_size(obj, seen):
+        """Bytes held by obj and the containers, strings and numbers it references (objects in seen are skipped)"""
+        size = 0
+        stack = [obj]
+        while stack:
+            item = stack.pop()
+            if id(item) in seen:
+                continue
+            seen.add(id(item))
+            # Arrays count their own data (memory-mapped ones only their header)
+            size += sys.getsizeof(item)
+            if isinstance(item, dict):
+                stack.extend(item.keys())
+                stack.extend(item.values())
+            elif isinstance(item, MemoryReport.CONTAINERS):
+                stack.extend(item)
+        return size
+    
+    @staticmethod
+    def module_structures(module):
+        """Bytes per structure of one loaded module, with questions by source file"""
+        seen = set()
+        questions = module.corpus.questions or []
+        by_file = OrderedDict()
+        for question in questions:
+            source_file = question.get('source_file', '')
+            by_file[source_file] = by_file.get(source_file, 0) + MemoryReport.deep_size(question, seen)
+        question_bytes = (sum(by_file.values()) + MemoryReport.deep_size(questions, seen) +
+                          MemoryReport.deep_size(module.corpus.by_id, seen))
+        explanations = module.study_index.question_explanations.explanations
+        with module.feedback_cache.lock:
+            feedback_entries = list(module.feedback_cache.entries.items())
+        structures = OrderedDict([
+            ('questions', {'bytes': question_bytes, 'count': len(questions), 'by_file': dict(by_file)}),
+            ('explanations', {'bytes': MemoryReport.deep_size(explanations, seen), 'count': len(explanations)}),
+            ('search_index', {'bytes': MemoryReport.deep_size(
+                [module.search_index.postings, module.search_index.doc_lengths, module.search_index.questions], seen)}),
+            ('offline_bank', {'bytes': MemoryReport.deep_size(
+                [module.offline_bank.entries, module.offline_bank.versions], seen)}),
+            ('question_clusters', {'bytes': MemoryReport.deep_size(module.corpus.clusters, seen)}),
+            ('bootstrap_json', {'bytes': MemoryReport.deep_size(module.corpus.bootstrap_json, seen)}),
+            ('feedback_cache', {'bytes': MemoryReport.deep_size(feedback_entries, seen), 'entries': len(feedback_entries)}),
+        ])
+        return structures
+    
+    @staticmethod
+    def total_bytes(structures):
+        return sum(structure['bytes'] for structure in structures.values())
+    
+    @staticmethod
+    def module_report(module):
+        """Bytes per structure of one loaded module, with questions and study text by source file"""
+        structures = MemoryReport.module_structures(module)
+        store = module.study_index.store
+        return {
+            'structures': structures,
+            'total_bytes': MemoryReport.total_bytes(structures),  # What the module memory budget goes by
+            'study_text_mapped': {'bytes': store.size(), 'by_file': store.bytes_by_file()},
+        }
+    
+    @staticmethod
+    def summary_line(module):
+        """One line for the logs: the module's total and its biggest structures"""
+        report = MemoryReport.module_report(module)
+        parts = ', '.join(f"{name.replace('_', ' ')} {structure['bytes'] / 1e6:.1f}MB"
+                          for name, structure in report['structures'].items() if structure['bytes'] >= 100_000)
+        return (f"about {report['total_bytes'] / 1e6:.1f}MB in memory ({parts or 'all structures under 0.1MB'}), "
+                f"{report['study_text_mapped']['bytes'] / 1e6:.1f}MB of study text mapped")
+    
+    @staticmethod
+    def process_memory():
+        """Resident and peak resident set size in bytes, where /proc is available"""
+        memory = {'rss_bytes': None, 'peak_rss_bytes': None}
+        try:
+            with open('/proc/self/status', 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        memory['rss_bytes'] = int(line.split()[1]) * 1024
+                    elif line.startswith('VmHWM:'):
+                        memory['peak_rss_bytes'] = int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return memory
+    
+    def report(self):
+        start = time.perf_counter()
+        with modules.lock:
+            loaded = [(name, module) for name, module in modules.modules.items() if module.loaded]
+        shared_seen = set()
+        item_columns = item_analysis.columns[1] if item_analysis.columns else None
+        with results_store.locks_lock:
+            partitions = list(results_store.indexes.values())
+        with feedback_jobs.lock:
+            jobs = len(feedback_jobs.jobs)
+        report = {
+            'process': self.process_memory(),
+            'modules': {name: self.module_report(module) for name, module in loaded},
+            'shared': {
+                'item_analysis': {'bytes': self.deep_size(item_columns, shared_seen) if item_columns else 0},
+                'results_indexes': {'bytes': self.deep_size(partitions, shared_seen), 'users': len(partitions)},
+                'feedback_jobs': {'jobs': jobs},
+            },
+            'tracemalloc': self.tracing_status(),
+        }
+        report['computed_in_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return report
+    
+    def tracing_status(self):
+        status = {'tracing': tracemalloc.is_tracing(), 'frames': tracemalloc.get_traceback_limit()}
+        if status['tracing']:
+            status['traced_bytes'], status['peak_traced_bytes'] = tracemalloc.get_traced_memory()
+        with self.lock:
+            status['snapshots'] = [{'label': label, 'taken_at': taken_at} for label, (taken_at, _) in self.snapshots.items()]
+        return status
+    
+    def take_snapshot(self, label, frames=None):
+        """Snapshot the traced allocations under a label, starting tracemalloc if needed"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(int(frames or TRACEMALLOC_FRAMES or 1), 1))
+        snapshot = tracemalloc.take_snapshot().filter_traces(self.SNAPSHOT_FILTERS)
+        with self.lock:
+            self.snapshots.pop(label, None)
+            self.snapshots[label] = (time.time(), snapshot)
+            while len(self.snapshots) > self.MAX_SNAPSHOTS:
+                self.snapshots.popitem(last=False)
+        return self.tracing_status()
+    
+    def diff(self, before, after=None, group_by='lineno', limit=20):
+        """Biggest allocation changes between two snapshots (after=None compares with now)
+        
+        Raises KeyError for an unknown label.
+        """
+        with self.lock:
+            older = self.snapshots[before][1]
+            newer = self.snapshots[after][1] if after else None
+        if newer is None:
+            if not tracemalloc.is_tracing():
+                raise KeyError(before)
+            newer = tracemalloc.take_snapshot().filter_traces(self.SNAPSHOT_FILTERS)
+        stats = newer.compare_to(older, group_by)
+        return {
+            'before': before,
+            'after': after or 'now',
+            'group_by': group_by,
+            'size_diff_bytes': sum(stat.size_diff for stat in stats),
+            'count_diff': sum(stat.count_diff for stat in stats),
+            'top': [{
+                'location': stat.traceback.format() if group_by == 'traceback' else str(stat.traceback[0]),
+                'size_diff_bytes': stat.size_diff,
+                'size_bytes': stat.size,
+                'count_diff': stat.count_diff,
+                'count': stat.count,
+            } for stat in stats[:limit]],
+        }
+    
+    def stop(self):
+        """Drop every snapshot and stop tracing"""
+        with self.lock:
+            self.snapshots.clear()
+        tracemalloc.stop()
+
+class WarmingUp(Exception):
+    """Raised when a request needs data the startup warm-up hasn't built yet"""
+
+class Startup:
+    """Build the default module's study text index and question corpus, timing each phase
+    
+    In background mode this runs on a thread so the server can bind its port
+    straight away; requests that need the index wait up to WARMUP_WAIT_SECONDS
+    for it and then get a 503 "warming up" response. If the build fails, a later
+    request (no more than every STARTUP_RETRY_SECONDS) or a reload retries it, and
+    /healthz reports 503 until one succeeds.
+    """
+    
+    def __init__(self):
+        self.ready = threading.Event()
+        self.error = None
+        self.failed_at = None
+        self.retry_lock = threading.Lock()
+        self.phases = {}  # Phase name -> seconds
+    
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = round(elapsed, 3)
+            metrics.observe('m05_stage_duration_seconds', elapsed, {'stage': f'startup_{name}'})
+            print(f"Startup: {name} took {elapsed:.2f}s")
+    
+    def build_default(self):
+        with self.phase('password_hash'):
+            default_password_hash()
+        # The default module's study_index and question_corpus phases
+        modules.get(DEFAULT_MODULE, phase=self.phase)
+    
+    def build(self):
+        start = time.perf_counter()
+        try:
+            self.build_default()
+        except Exception as e:
+            self.error = e
+            self.failed_at = time.monotonic()
+            print(f"Startup failed: {e}")
+        finally:
+            self.ready.set()
+            rss = MemoryReport.process_memory()['rss_bytes']
+            print(f"Startup: ready after {time.perf_counter() - start:.2f}s ({STARTUP_MODE} mode)" +
+                  (f", {rss / 1e6:.0f}MB resident" if rss else ''))
+    
+    def start(self):
+        if STARTUP_MODE == 'eager':
+            self.build()
+        else:
+            threading.Thread(target=self.build, name='startup-warmup', daemon=True).start()
+    
+    def retry(self, force=False):
+        """Re-run a failed build, raising RuntimeError if it fails again
+        
+        Without force, a retry runs only once STARTUP_RETRY_SECONDS have passed since
+        the last failure, so a broken deploy is not rebuilt on every request.
+        """
+        with self.retry_lock:
+            if self.error is None:
+                return
+            if not force and time.monotonic() - self.failed_at < STARTUP_RETRY_SECONDS:
+                raise RuntimeError(f"Startup failed: {self.error}") from self.error
+            try:
+                self.build_default()
+            except Exception as e:
+                self.error = e
+                self.failed_at = time.monotonic()
+                print(f"Startup retry failed: {e}")
+                raise RuntimeError(f"Startup failed: {e}") from e
+            self.error = None
+            print("Startup: retry succeeded")
+    
+    def wait(self, timeout=None):
+        """Block until the warm-up has finished, raising WarmingUp after the timeout"""
+        if not self.ready.wait(WARMUP_WAIT_SECONDS if timeout is None else timeout):
+            raise WarmingUp()
+        if self.error is not None:
+            self.retry()
+    
+    def status(self):
+        if not self.ready.is_set():
+            return 'warming_up'
+        return 'error' if self.error is not None else 'ready'
+
 # Initialize
-study_index = StudyTextIndex()
+modules = ModuleRegistry(MODULE_MEMORY_BUDGET_MB * 1024 * 1024)
+results_store = ResultsStore(RESULTS_DIR, legacy_file=RESULTS_HISTORY_FILE)
+item_analysis = ItemAnalysis(results_store)
+feedback_jobs = FeedbackJobs()
+admission_control = AdmissionControl({
+    # Study text retrieval: single questions, batches and answers that may wait for their explanation
+    'retrieval': {'slots': RETRIEVAL_CONCURRENCY, 'queue': RETRIEVAL_QUEUE, 'timeout': ADMISSION_QUEUE_TIMEOUT,
+                  'rate': RETRIEVAL_RATE, 'burst': RETRIEVAL_BURST},
+    # Full re-parse of a module: one at a time, and nobody waits behind it
+    'reload': {'slots': 1, 'queue': 0, 'timeout': 0, 'rate': RELOAD_RATE, 'burst': RELOAD_BURST},
+    # Question streams re-parse every paper: a few at a time, so they never hold up a reload or each other for long
+    'stream': {'slots': STREAM_CONCURRENCY, 'queue': STREAM_QUEUE, 'timeout': ADMISSION_QUEUE_TIMEOUT,
+               'rate': STREAM_RATE, 'burst': STREAM_BURST},
+}, enabled=ADMISSION_ENABLED)
+memory_report = MemoryReport()
+startup = Startup()
+
+def current_module():
+    """The module named by ?module= (or "module" in a JSON body), loaded and ready
+    
+    Defaults to DEFAULT_MODULE, and to it alone outside a request.
+    """
+    startup.wait()
+    if not has_request_context():
+        module = modules.get(DEFAULT_MODULE)
+        module.refresh_study_text()
+        return module
+    if 'module' not in g:
+        name = request.args.get('module')
+        if not name and request.is_json:
+            body = request.get_json(silent=True)
+            name = body.get('module') if isinstance(body, dict) else None
+        g.module = modules.get(name)
+        g.module.refresh_study_text()  # Checking file stats once per request, as the corpus does
+    return g.module
+
+def get_study_index():
+    """Return the study text index, waiting for the startup build if necessary"""
+    return current_module().study_index
 
 def load_questions():
-    """Load questions from file or parse from papers"""
-    # Always regenerate from source files to ensure we have the latest data
-    # This ensures Railway and local environments stay in sync
-    questions = QuestionParser.load_questions_from_files()
-    save_questions(questions)
-    return questions
-
-def save_questions(questions):
+    """Load questions, re-parsing the papers only when they have changed"""
+    # Return a copy so callers can shuffle/sort without touching the cached list
+    return list(current_module().corpus.get())
+
+def save_questions(questions, questions_file=QUESTIONS_FILE):
     """Save questions to file"""
-    with open(QUESTIONS_FILE, 'w', encoding='utf-8') as f:
+    with open(questions_file, 'w', encoding='utf-8') as f:
         json.dump(questions, f, indent=2, ensure_ascii=False)
 
+# Build the index (on a background thread unless STARTUP_MODE=eager)
+startup.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profiler, g.profile_sampled = request_profiler.start()
+
+@app.teardown_request
+def finish_request_profile(exc):
+    """Stop the request profiler (runs even if the view raised)"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        elapsed = time.perf_counter() - g.request_start
+        request_profiler.finish(profiler, g.get('profile_sampled', False), request.endpoint, elapsed)
+
+@app.after_request
+def record_request_metrics(response):
+    """Record latency and status for every request"""
+    start = getattr(g, 'request_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        metrics.observe('m05_request_duration_seconds', time.perf_counter() - start,
+                        {'endpoint': endpoint, 'method': request.method})
+        metrics.inc('m05_requests_total',
+                    {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)})
+    return response
+
 def login_required(f):
     """Decorator to require login for routes"""
     @wraps(f)
@@ -1027,6 +3781,36 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def client_key():
+    """Who is asking: rate limits and explanation tokens belong to this key
+    
+    The key is set by login(), so it is the same on every request made with that
+    session cookie; sessions from before it fall back to user and address.
+    """
+    return session.get('client_key') or f"{current_username()}@{request.remote_addr}"
+
+def admission(work_class):
+    """Decorator to run a route under admission control for its class of work"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            with ExitStack() as stack:
+                stack.enter_context(admission_control.admit(work_class, client_key()))
+                g.admission_slot = stack
+                response = make_response(f(*args, **kwargs))
+                if response.is_streamed:
+                    # A streamed body does its work after the view returns: keep the slot until it is sent
+                    response.call_on_close(stack.pop_all().close)
+                return response
+        return decorated_function
+    return decorator
+
+def release_admission_slot():
+    """Give the request's admission slot back early, before it blocks on work done elsewhere"""
+    slot = g.pop('admission_slot', None)
+    if slot is not None:
+        slot.close()
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """Login page"""
@@ -1035,9 +3819,10 @@ def login():
         password = request.form.get('password')
         
         # Check credentials
-        if username == DEFAULT_USERNAME and check_password_hash(DEFAULT_PASSWORD_HASH, password):
+        if username == DEFAULT_USERNAME and check_password_hash(default_password_hash(), password):
             session['logged_in'] = True
             session['username'] = username
+            session['client_key'] = secrets.token_urlsafe(12)  # Keys this login's admission rate limits
             return redirect(url_for('index'))
         else:
             return render_template('login.html', error='Invalid username or password')
@@ -1071,6 +3856,69 @@ def results():
 def history():
     return render_template('history.html')
 
+@app.errorhandler(WarmingUp)
+def handle_warming_up(e):
+    """Tell clients to retry while the index is still being built"""
+    response = jsonify({'error': 'The server is warming up, please try again in a few seconds', 'warming_up': True})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+@app.errorhandler(Overloaded)
+def handle_overloaded(e):
+    """Turn the request away straight away, telling the client when to try again"""
+    response = jsonify({'error': e.message, 'retry_after': e.retry_after, 'overloaded': True})
+    response.status_code = e.status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.route('/sw.js')
+def service_worker():
+    """Serve the service worker from the site root so it can control every page"""
+    response = send_from_directory(app.static_folder, 'sw.js', mimetype='application/javascript')
+    # Browsers must always check for a new worker, or fixes would never reach installed clients
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    """Serve a fingerprinted static file, precompressed when the browser accepts it
+    
+    The name changes whenever the content does, so browsers may keep these forever.
+    """
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and (ASSET_DIST_DIR / f'{filename}{suffix}').is_file():
+            response = send_from_directory(ASSET_DIST_DIR, f'{filename}{suffix}', mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(ASSET_DIST_DIR, filename, mimetype=mimetype)
+    response.headers['Vary'] = 'Accept-Encoding'
+    if filename == ASSET_MANIFEST_FILE.name:
+        # Not fingerprinted itself (the service worker reads it to precache the current build)
+        response.headers['Cache-Control'] = 'no-cache'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.errorhandler(UnknownModule)
+def handle_unknown_module(e):
+    return jsonify({'error': f'Unknown module: {e}', 'modules': modules.available()}), 404
+
+@app.route('/healthz')
+def healthz():
+    """Health check that answers immediately, even while warming up
+    
+    A failed warm-up answers 503 so the platform can restart the instance.
+    """
+    status = startup.status()
+    body = {'status': status, 'startup_phases': startup.phases}
+    if status == 'error':
+        body['error'] = str(startup.error)
+        return jsonify(body), 503
+    return jsonify(body)
+
 @app.route('/api/check-auth')
 def check_auth():
     """Check if user is authenticated"""
@@ -1083,6 +3931,39 @@ def get_questions():
     questions = load_questions()
     return jsonify(questions)
 
+@app.route('/api/questions/stream')
+@login_required
+@admission('stream')
+def stream_questions():
+    """All questions as newline-delimited JSON, one per line, sent as each paper is parsed
+    
+    Runs the parser pipeline directly instead of building the full list first,
+    so the first questions arrive straight away and memory stays flat however
+    large the bank is. If parsing fails part-way, the last line is {"error": ...}.
+    
+    Clustering needs the whole bank, so cluster_id and cluster_size are copied
+    from the cached corpus, as /api/questions returns them; a question that is
+    not in it yet (its paper changed mid-stream) is its own cluster of one.
+    Re-parsing every paper costs about as much as a reload, so this runs under
+    its own admission class, holding its slot until the last line is sent.
+    """
+    module = current_module()
+    corpus = module.corpus
+    corpus.get()
+    
+    def generate():
+        try:
+            for question in QuestionParser.iter_questions(module.exam_papers_dir, module.study_text_dir):
+                cached = corpus.by_id.get(question['id'])
+                question['cluster_id'] = cached['cluster_id'] if cached else question['id']
+                question['cluster_size'] = cached['cluster_size'] if cached else 1
+                yield json.dumps(question, ensure_ascii=False) + '\n'
+        except Exception as e:
+            print(f"Error streaming questions: {e}")
+            yield json.dumps({'error': str(e)}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/questions/filter', methods=['POST'])
 @login_required
 def get_filtered_questions():
@@ -1101,6 +3982,8 @@ def get_filtered_questions():
         # Shuffle for variety
         import random
         random.shuffle(filtered)
+        # Don't serve the same question twice from different years
+        filtered = dedupe_by_cluster(filtered)
         # Limit by count if specified
         if count:
             filtered = filtered[:int(count)]
@@ -1110,6 +3993,7 @@ def get_filtered_questions():
         # Shuffle for variety
         import random
         random.shuffle(filtered)
+        filtered = dedupe_by_cluster(filtered)
         # Limit to 20 or all if less than 20
         if len(filtered) > 20:
             filtered = filtered[:20]
@@ -1133,6 +4017,7 @@ def get_filtered_questions():
         if count:
             import random
             random.shuffle(filtered)
+            filtered = dedupe_by_cluster(filtered)
     
     # Limit by count if specified (only for count-based selections, not learning objective)
     if count and not year and not learning_objective:
@@ -1140,113 +4025,283 @@ def get_filtered_questions():
     
     return jsonify(filtered)
 
+@app.route('/api/bootstrap')
+def bootstrap():
+    """Everything the selection page needs in one response
+    
+    Returns auth state, available years, learning objectives with counts and the
+    multiple choice count. The payload is built once per corpus generation and
+    carries an ETag, so repeat visits can be answered with 304 Not Modified.
+    """
+    if not session.get('logged_in', False):
+        return jsonify({'authenticated': False})
+    
+    payload, etag = current_module().corpus.get_bootstrap_json()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload, mimetype='application/json')
+    response.set_etag(etag)
+    # Varies per user session, so only the browser may cache it (and must revalidate)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/api/offline/sync')
+@login_required
+def offline_sync():
+    """Question bank for the offline client, incremental from the version it already holds
+    
+    GET /api/offline/sync?since=<version>
+    Returns {"version", "full", "questions", "removed"}; full=true means replace the local copy.
+    """
+    return jsonify(current_module().offline_bank.changes_since(request.args.get('since')))
+
+@app.route('/api/search')
+@login_required
+def search_questions():
+    """Search question text, options and explanations
+    
+    GET /api/search?q=subrogation&year=2024&learning_objective=3&multiple_choice_only=true&page=1&per_page=20
+    """
+    query = request.args.get('q', '').strip()
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(100, max(1, int(request.args.get('per_page', 20))))
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be numbers'}), 400
+    if not query:
+        return jsonify({'error': 'Missing search query (q)'}), 400
+    
+    return jsonify(current_module().search_index.search(
+        query,
+        year=request.args.get('year'),
+        learning_objective=request.args.get('learning_objective'),
+        multiple_choice_only=request.args.get('multiple_choice_only', '').lower() in ('1', 'true', 'yes'),
+        page=page,
+        per_page=per_page
+    ))
+
+@app.route('/api/search/suggest')
+@login_required
+def suggest_search_terms():
+    """Autocomplete: indexed words starting with ?prefix= (most common first)"""
+    try:
+        limit = min(50, max(1, int(request.args.get('limit', 10))))
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    return jsonify(current_module().search_index.suggest(request.args.get('prefix', ''), limit=limit))
+
 @app.route('/api/years')
 @login_required
 def get_available_years():
     """Get list of available exam years"""
-    questions = load_questions()
-    years = set()
-    for q in questions:
-        source = q.get('source_file', '')
-        # Extract year from filename like "M05 Exam - 2024.pdf"
-        year_match = re.search(r'(\d{4})', source)
-        if year_match:
-            years.add(year_match.group(1))
-    return jsonify(sorted(list(years), reverse=True))
+    return jsonify(current_module().corpus.get_facets()['years'])
 
 @app.route('/api/learning-objectives')
 @login_required
 def get_learning_objectives():
     """Get list of available learning objectives with question counts"""
-    questions = load_questions()
-    objectives = {}
-    for q in questions:
-        lo = q.get('learning_objective')
-        if lo:
-            if lo not in objectives:
-                objectives[lo] = 0
-            objectives[lo] += 1
-    # Return sorted by objective number
-    return jsonify(sorted([{'number': k, 'count': v} for k, v in objectives.items()], 
-                          key=lambda x: float(x['number'])))
+    return jsonify(current_module().corpus.get_facets()['learning_objectives'])
 
 @app.route('/api/multiple-choice-count')
 @login_required
 def get_multiple_choice_count():
     """Get count of multiple choice questions available"""
-    questions = load_questions()
-    multiple_choice_count = sum(1 for q in questions if q.get('is_multiple_choice', False))
-    return jsonify({'count': multiple_choice_count})
+    return jsonify({'count': current_module().corpus.get_facets()['multiple_choice_count']})
+
+def current_username():
+    return session.get('username') or DEFAULT_USERNAME
 
 @app.route('/api/results', methods=['POST'])
 @login_required
 def save_results():
-    """Save quiz results to history"""
+    """Save quiz results to the user's history"""
     data = request.json
-    results_file = Path("results_history.json")
-    
-    # Load existing results
-    if results_file.exists():
-        with open(results_file, 'r', encoding='utf-8') as f:
-            results_history = json.load(f)
-    else:
-        results_history = []
-    
-    # Add timestamp and save
     result_entry = {
-        'id': len(results_history) + 1,
         'timestamp': data.get('timestamp', ''),
         'total': data.get('total', 0),
         'correct': data.get('correct', 0),
         'incorrect': data.get('incorrect', 0),
         'percentage': data.get('percentage', 0),
         'mode': data.get('mode', ''),
+        'module': (data.get('module') or request.args.get('module') or DEFAULT_MODULE).upper(),
         'learning_objective_breakdown': data.get('learning_objective_breakdown', {}),
         'questions': data.get('questions', []),
         'answers': data.get('answers', [])
     }
-    
-    results_history.append(result_entry)
-    
-    with open(results_file, 'w', encoding='utf-8') as f:
-        json.dump(results_history, f, indent=2, ensure_ascii=False)
+    results_store.append(current_username(), result_entry)
     
     return jsonify({'success': True, 'message': 'Results saved'})
 
 @app.route('/api/results/history')
 @login_required
 def get_results_history():
-    """Get all quiz results history"""
-    results_file = Path("results_history.json")
-    if results_file.exists():
-        with open(results_file, 'r', encoding='utf-8') as f:
-            return jsonify(json.load(f))
-    return jsonify([])
+    """The user's quiz results (scores and breakdowns; questions and answers are in the export)"""
+    return jsonify(results_store.history(current_username()))
+
+@app.route('/api/results/export')
+@login_required
+def export_results():
+    """Stream the user's results history for analysis outside the app
+    
+    ?format=csv (default) or ndjson; ?rows=attempts (default) or answers (one row
+    per answered question); ?from= / ?to= ISO dates (inclusive), ?mode= and ?module=
+    narrow it down. Sent with chunked transfer, so memory stays flat however long
+    the history is. If reading fails part-way, NDJSON ends with an {"error": ...}
+    line and CSV simply stops.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    rows = request.args.get('rows', 'attempts').lower()
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    if rows not in ('attempts', 'answers'):
+        return jsonify({'error': 'rows must be attempts or answers'}), 400
+    try:
+        date_from = ResultsExport.parse_bound(request.args.get('from'), 'from')
+        date_to = ResultsExport.parse_bound(request.args.get('to'), 'to')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    mode = request.args.get('mode')
+    module = request.args.get('module')
+    username = current_username()
+    
+    def entries():
+        for entry in results_store.entries(username):
+            if ResultsExport.matches(entry, date_from, date_to, mode, module):
+                yield entry
+    
+    def generate():
+        lines = ResultsExport.csv_lines if export_format == 'csv' else ResultsExport.ndjson_lines
+        try:
+            for chunk in lines(entries(), rows):
+                if chunk:
+                    yield chunk
+        except (OSError, ValueError) as e:
+            print(f"Error exporting results history: {e}")
+            if export_format == 'ndjson':
+                yield json.dumps({'error': str(e)}) + '\n'
+    
+    if export_format == 'csv':
+        mimetype, extension = 'text/csv; charset=utf-8', 'csv'
+    else:
+        mimetype, extension = 'application/x-ndjson', 'ndjson'
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="m05-results-{rows}.{extension}"'
+    return response
+
+@app.route('/api/analytics/items')
+@login_required
+def get_item_analysis():
+    """Difficulty, discrimination and option selection rates per question
+    
+    ?sort=difficulty (hardest first, the default), discrimination (weakest first)
+    or answers (most answered first); ?min_answers= hides rarely answered questions.
+    """
+    module = current_module()
+    report = item_analysis.report(module)
+    min_answers = request.args.get('min_answers', default=1, type=int)
+    items = [item for item in report['items'] if item['answers'] >= min_answers]
+    sort = request.args.get('sort', 'difficulty')
+    if sort == 'discrimination':
+        items.sort(key=lambda item: (item['discrimination'] is None, item['discrimination'] or 0))
+    elif sort == 'answers':
+        items.sort(key=lambda item: -item['answers'])
+    else:
+        items.sort(key=lambda item: item['difficulty'])
+    return jsonify({**report, 'items': items})
+
+@app.route('/api/question-clusters')
+@login_required
+def get_question_clusters():
+    """Groups of near-duplicate questions repeated across papers (largest first)"""
+    corpus = current_module().corpus
+    corpus.get()  # Make sure the corpus (and its clusters) is current
+    clusters = []
+    for cluster in corpus.clusters:
+        members = [corpus.by_id[qid] for qid in cluster['question_ids'] if qid in corpus.by_id]
+        clusters.append({
+            'cluster_id': cluster['cluster_id'],
+            'size': cluster['size'],
+            'questions': [{
+                'id': q['id'],
+                'source_file': q.get('source_file', ''),
+                'question_number': q.get('question_number', ''),
+                'question': q['question'],
+            } for q in members],
+        })
+    return jsonify(clusters)
+
+@app.route('/api/question-clusters/mastery')
+@login_required
+def get_cluster_mastery():
+    """The user's answers grouped by near-duplicate cluster, least mastered first"""
+    module = current_module()
+    return jsonify(cluster_mastery(module.corpus, results_store.entries(current_username()), module.name))
 
 @app.route('/api/question/<int:question_id>')
 @login_required
+@admission('retrieval')
 def get_question(question_id):
     """Get a specific question with study text references"""
-    questions = load_questions()
-    question = next((q for q in questions if q['id'] == question_id), None)
+    question = current_module().corpus.find(question_id)
     
     if question:
+        # Copy so the cached corpus entry is not modified
+        question = dict(question)
         # Find relevant study text
-        relevant_text = study_index.find_relevant_text(question['question'])
+        relevant_text = get_study_index().find_relevant_text(question['question'])
         question['study_text'] = relevant_text
     
     return jsonify(question)
 
+@app.route('/api/questions/batch', methods=['POST'])
+@login_required
+@admission('retrieval')
+def get_questions_batch():
+    """Several questions by ID in one request, for example to review a past attempt
+    
+    Body: {"ids": [...], "include_study_text": true}. Questions come back in the
+    order asked for, each once (old IDs of edited questions resolve to their
+    replacements); unknown IDs are listed under "missing". Study text for all of
+    them is found in one shared retrieval pass.
+    """
+    data = request.get_json(silent=True) or {}
+    question_ids = data.get('ids')
+    if not isinstance(question_ids, list):
+        return jsonify({'error': 'ids must be a list of question IDs'}), 400
+    if len(question_ids) > MAX_BATCH_QUESTIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_QUESTIONS} questions per request'}), 400
+    
+    module = current_module()
+    questions = []
+    missing = []
+    seen = set()
+    for question_id, question in zip(question_ids, module.corpus.find_many(question_ids)):
+        if question is None:
+            missing.append(question_id)
+        elif question['id'] not in seen:
+            seen.add(question['id'])
+            # Copy so the cached corpus entry is not modified
+            questions.append(dict(question))
+    
+    if data.get('include_study_text'):
+        study_texts = module.study_index.find_relevant_text_batch([(q['question'], None) for q in questions])
+        for question, study_text in zip(questions, study_texts):
+            question['study_text'] = study_text
+    
+    return jsonify({'questions': questions, 'missing': missing})
+
 @app.route('/api/submit-answer', methods=['POST'])
 @login_required
+@admission('retrieval')
 def submit_answer():
     """Submit an answer and get feedback"""
     data = request.json
     question_id = data.get('question_id')
     selected_answer = data.get('answer')
     
-    questions = load_questions()
-    question = next((q for q in questions if q['id'] == question_id), None)
+    module = current_module()
+    question = module.corpus.find(question_id)
     
     if not question:
         return jsonify({'error': 'Question not found'}), 404
@@ -1274,15 +4329,37 @@ def submit_answer():
     selected_option = selected_options[0] if len(selected_options) == 1 else None
     selected_option_text = selected_option['text'] if selected_option else ', '.join([opt['text'] for opt in selected_options])
     
-    # Generate concise feedback explanation from study text
-    options_text = [opt['text'] for opt in question['options']]
-    feedback_explanation = study_index.generate_feedback_explanation(
-        question['question'],
-        correct_option_text,
-        selected_option_text,
-        options_text,
-        is_correct
-    )
+    # The explanation comes from study text retrieval, which is far slower than grading: serve it
+    # from the cache if possible, otherwise build it in the background and hand back a token
+    cache_key = (question['id'], question['content_hash'], tuple(sorted(set(selected_answers))))
+    feedback_explanation = module.feedback_cache.get(cache_key)
+    explanation_token = None
+    explanation_busy = None
+    if feedback_explanation is None:
+        options_text = [opt['text'] for opt in question['options']]
+        try:
+            explanation_token = feedback_jobs.submit(module, cache_key, lambda: module.study_index.generate_feedback_explanation(
+                question['question'],
+                correct_option_text,
+                selected_option_text,
+                options_text,
+                is_correct
+            ), client_key())
+        except Overloaded as e:
+            # The verdict is cheap, so still give it; the explanation can be asked for again later
+            explanation_busy = e
+        if explanation_token and data.get('wait_for_explanation'):
+            # Older clients expect the explanation in this response. Waiting does no retrieval
+            # work itself, so the slot goes back first and the job's worker does the limiting
+            release_admission_slot()
+            try:
+                feedback_explanation = feedback_jobs.result(explanation_token, client_key(), timeout=FEEDBACK_MAX_WAIT_SECONDS)
+            except Overloaded:
+                pass  # Too many waiters already: the explanation stays pending under its token
+            except Exception as e:
+                print(f"Error generating feedback explanation: {e}")
+            if feedback_explanation is not None:
+                explanation_token = None
     
     feedback = {
         'is_correct': is_correct,
@@ -1291,20 +4368,146 @@ def submit_answer():
         'is_multiple_choice': question.get('is_multiple_choice', False),
         'selected_option_text': selected_option_text,
         'explanation': feedback_explanation,
+        'explanation_status': 'pending' if explanation_token else 'busy' if explanation_busy else 'ready',
         'learning_objective': question.get('learning_objective', ''),
         'feedback_points': []
     }
+    if explanation_token:
+        feedback['explanation_token'] = explanation_token
+    if explanation_busy:
+        feedback['retry_after'] = explanation_busy.retry_after
     
     return jsonify(feedback)
 
+@app.route('/api/feedback/<token>')
+@login_required
+def get_feedback_explanation(token):
+    """Collect an explanation started by /api/submit-answer
+    
+    ?wait=N long-polls for up to N seconds (capped) before answering 202;
+    when too many requests are already waiting it answers 503 instead. A token
+    handed to another login answers 404, as an unknown one does.
+    """
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), FEEDBACK_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    try:
+        explanation = feedback_jobs.result(token, client_key(), timeout=wait)
+    except KeyError:
+        return jsonify({'error': 'Unknown or expired explanation token', 'status': 'unknown'}), 404
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"Error generating feedback explanation: {e}")
+        return jsonify({'error': 'Could not generate an explanation', 'status': 'error'}), 500
+    if explanation is None:
+        return jsonify({'status': 'pending'}), 202
+    return jsonify({'status': 'ready', 'explanation': explanation})
+
 @app.route('/api/reload-questions', methods=['POST'])
 @login_required
+@admission('reload')
 def reload_questions():
     """Reload questions from exam papers"""
-    questions = QuestionParser.load_questions_from_files()
-    save_questions(questions)
-    study_index.load_study_text()  # Reload study text too
-    return jsonify({'message': f'Loaded {len(questions)} questions', 'count': len(questions)})
+    if startup.ready.is_set():
+        startup.retry(force=True)  # A failed warm-up is retried straight away rather than throttled
+    module = current_module()
+    module.corpus.invalidate()
+    questions = module.corpus.get()  # Drops cached feedback only for questions that changed
+    module.refresh_study_text()  # Drops all of it if the study text changed
+    module.search_index.refresh()  # Rebuild now rather than on the next search
+    module.offline_bank.refresh()  # Starts rebuilding in the background
+    return jsonify({'message': f'Loaded {len(questions)} questions', 'module': module.name,
+                    'count': len(questions), 'changes': module.corpus.last_changes})
+
+@app.route('/api/modules')
+@login_required
+def list_modules():
+    """Available modules, and which are loaded (most recently used first)"""
+    return jsonify(modules.status())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose request, stage and cache metrics in Prometheus text format"""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+@login_required
+def profiling_settings():
+    """View or change request profiling settings at runtime
+    
+    POST JSON: {"sample_rate": 0.05, "slow_ms": 500, "max_files": 50}
+    (set sample_rate and slow_ms to 0 to turn profiling off)
+    """
+    if request.method == 'POST':
+        data = request.json or {}
+        try:
+            request_profiler.configure(
+                sample_rate=data.get('sample_rate'),
+                slow_ms=data.get('slow_ms'),
+                max_files=data.get('max_files')
+            )
+        except (TypeError, ValueError):
+            return jsonify({'error': 'sample_rate, slow_ms and max_files must be numbers'}), 400
+    return jsonify(request_profiler.settings())
+
+@app.route('/api/admin/admission')
+@login_required
+def admission_status():
+    """Slots, queue lengths and rate limits of each admission class, and the explanation queue"""
+    status = admission_control.status()
+    with feedback_jobs.lock:
+        status['feedback'] = {'workers': feedback_jobs.workers, 'queue': feedback_jobs.max_queued,
+                              'in_flight': len(feedback_jobs.in_flight),
+                              'waiting': feedback_jobs.waiting, 'max_waiters': feedback_jobs.max_waiters,
+                              'average_ms': round(feedback_jobs.average_seconds * 1000, 1)}
+    return jsonify(status)
+
+@app.route('/api/admin/memory')
+@login_required
+def memory_usage():
+    """Approximate bytes held by each in-memory structure, per loaded module and source file"""
+    return jsonify(memory_report.report())
+
+@app.route('/api/admin/memory/snapshots', methods=['POST', 'DELETE'])
+@login_required
+def memory_snapshots():
+    """Take a tracemalloc snapshot (POST {"label": "before", "frames": 1}), or DELETE to stop tracing
+    
+    Tracing starts with the first snapshot, so allocations made earlier are not
+    seen unless TRACEMALLOC_FRAMES was set at startup.
+    """
+    if request.method == 'DELETE':
+        memory_report.stop()
+        return jsonify(memory_report.tracing_status())
+    data = request.get_json(silent=True) or {}
+    label = str(data.get('label') or time.strftime('%Y%m%d-%H%M%S'))
+    try:
+        return jsonify(memory_report.take_snapshot(label, data.get('frames')))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'frames must be a whole number'}), 400
+
+@app.route('/api/admin/memory/diff')
+@login_required
+def memory_diff():
+    """Allocation changes between snapshots: ?before=label&after=label (default now)
+    
+    ?group_by=lineno (default), filename or traceback; ?limit= entries (default 20).
+    """
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': 'group_by must be lineno, filename or traceback'}), 400
+    before = request.args.get('before')
+    if not before:
+        return jsonify({'error': 'before must name a snapshot'}), 400
+    limit = min(max(request.args.get('limit', default=20, type=int), 1), 500)
+    try:
+        return jsonify(memory_report.diff(before, request.args.get('after'), group_by, limit))
+    except KeyError as e:
+        return jsonify({'error': f'No snapshot named {e}', 'tracemalloc': memory_report.tracing_status()}), 404
 
 @app.route('/api/submit-results', methods=['POST'])
 @login_required
@@ -0,0 +1,295 @@
+"""Build fingerprinted static assets for the M05 practice app
+
+Minifies the page scripts and stylesheet, writes each one to static/dist/ under a
+content-hashed name (quiz.js -> quiz.3f2a1b4c5d.js) with precompressed .gz (and
+.br, if the brotli package is installed) variants, and records the mapping in
+static/dist/manifest.json. app.py reads the manifest to point templates at the
+fingerprinted files, which are served with long-lived immutable caching.
+
+Usage:
+    python3 build_assets.py            # build static/dist/
+    python3 build_assets.py --check    # list what would be built, write nothing
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import shutil
+import sys
+from pathlib import Path
+
+STATIC_DIR = Path("static")
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_FILE = DIST_DIR / "manifest.json"
+
+# Files referenced from the templates (sw.js is not listed: it must keep a fixed URL)
+ASSETS = ['app.js', 'history.js', 'offline.js', 'quiz.js', 'results.js', 'selection.js', 'style.css']
+
+# Keywords after which a "/" starts a regular expression rather than a division
+REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw'}
+# Punctuators that end an operand, so a "/" after them is a division ("i++ / 2", "f(x) / 2")
+OPERAND_END_PUNCTUATORS = {')', ']', '++', '--'}
+# Stands in for the previous token after a string, template or regex literal
+LITERAL = object()
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch in '_$'
+
+
+class JSMinifier:
+    """Conservative JavaScript minifier
+
+    Strips comments and indentation and collapses whitespace, copying string,
+    template and regular expression literals verbatim. Line breaks are kept
+    (except after characters that cannot end a statement) so automatic
+    semicolon insertion behaves exactly as in the source. Whether a "/" starts
+    a regular expression is decided by the previous token, not character.
+    """
+
+    def __init__(self, source):
+        self.src = source
+        self.out = []
+        self.last_token = None  # Previous token: a word, a punctuator or LITERAL
+
+    def minify(self):
+        end = self._code(0, stop_at_brace=False)
+        if end != len(self.src):
+            raise ValueError(f"Unbalanced '}}' at offset {end}")
+        return ''.join(self.out).strip() + '\n'
+
+    def _last(self):
+        return self.out[-1][-1] if self.out else ''
+
+    def _regex_allowed(self):
+        token = self.last_token
+        if token is None:
+            return True
+        if token is LITERAL or token in OPERAND_END_PUNCTUATORS:
+            return False
+        if _is_word_char(token[0]):
+            # Identifiers, numbers, this, etc. end an operand; a few keywords expect one
+            return token in REGEX_KEYWORDS
+        return True
+
+    def _code(self, i, stop_at_brace):
+        """Minify code from offset i; inside a template ${...} stop at the matching brace"""
+        src = self.src
+        n = len(src)
+        depth = 0
+        while i < n:
+            ch = src[i]
+            if ch in ' \t\r\n':
+                j = i
+                while j < n and src[j] in ' \t\r\n':
+                    j += 1
+                self._whitespace('\n' in src[i:j], src[j] if j < n else '')
+                i = j
+            elif src.startswith('//', i):
+                while i < n and src[i] != '\n':
+                    i += 1
+            elif src.startswith('/*', i):
+                end = src.find('*/', i + 2)
+                if end == -1:
+                    raise ValueError(f"Unterminated comment at offset {i}")
+                i = end + 2
+                # A comment separates tokens just like a space does
+                self._whitespace(False, src[i] if i < n else '')
+            elif ch in '"\'':
+                i = self._string(i, ch)
+                self.last_token = LITERAL
+            elif ch == '`':
+                i = self._template(i)
+                self.last_token = LITERAL
+            elif ch == '/' and self._regex_allowed():
+                i = self._regex(i)
+                self.last_token = LITERAL
+            elif ch == '{':
+                depth += 1
+                self._token(ch)
+                i += 1
+            elif ch == '}':
+                if stop_at_brace and depth == 0:
+                    return i
+                depth -= 1
+                self._token(ch)
+                i += 1
+            elif _is_word_char(ch):
+                j = i
+                while j < n and _is_word_char(src[j]):
+                    j += 1
+                self._token(src[i:j])
+                i = j
+            elif src.startswith(('++', '--'), i):
+                self._token(src[i:i + 2])
+                i += 2
+            else:
+                self._token(ch)
+                i += 1
+        return i
+
+    def _token(self, text):
+        self.out.append(text)
+        self.last_token = text
+
+    def _whitespace(self, has_newline, next_ch):
+        last = self._last()
+        if not last or last in ' \n':
+            return
+        if has_newline:
+            # Joining lines after these can never change where statements end
+            if last not in '{;,([':
+                self.out.append('\n')
+        elif (_is_word_char(last) and _is_word_char(next_ch)) or (last == next_ch and last in '+-'):
+            self.out.append(' ')
+
+    def _string(self, i, quote):
+        j = i + 1
+        n = len(self.src)
+        while j < n and self.src[j] != quote:
+            if self.src[j] == '\\':
+                j += 1
+            elif self.src[j] == '\n':
+                raise ValueError(f"Unterminated string at offset {i}")
+            j += 1
+        self.out.append(self.src[i:j + 1])
+        return j + 1
+
+    def _template(self, i):
+        src = self.src
+        n = len(src)
+        j = i + 1
+        start = i
+        while j < n:
+            if src[j] == '\\':
+                j += 2
+            elif src[j] == '`':
+                self.out.append(src[start:j + 1])
+                return j + 1
+            elif src.startswith('${', j):
+                self.out.append(src[start:j + 2])
+                j = self._code(j + 2, stop_at_brace=True)
+                start = j  # The closing brace is copied with the next literal chunk
+                j += 1
+            else:
+                j += 1
+        raise ValueError(f"Unterminated template literal at offset {i}")
+
+    def _regex(self, i):
+        src = self.src
+        n = len(src)
+        j = i + 1
+        in_class = False
+        while j < n:
+            ch = src[j]
+            if ch == '\\':
+                j += 2
+                continue
+            if ch == '\n':
+                raise ValueError(f"Unterminated regular expression at offset {i}")
+            if ch == '[':
+                in_class = True
+            elif ch == ']':
+                in_class = False
+            elif ch == '/' and not in_class:
+                break
+            j += 1
+        j += 1
+        while j < n and src[j].isalpha():  # Flags
+            j += 1
+        self.out.append(src[i:j])
+        return j
+
+
+def minify_css(source):
+    """Strip comments and collapse whitespace, leaving quoted strings untouched"""
+    parts = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', source)
+    for index in range(0, len(parts), 2):
+        text = re.sub(r'/\*.*?\*/', '', parts[index], flags=re.DOTALL)
+        text = re.sub(r'\s+', ' ', text)
+        # Spaces before ":" are kept, as they matter in selectors ("a :hover")
+        text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+        text = re.sub(r':\s+', ':', text)
+        text = text.replace(';}', '}')
+        parts[index] = text
+    return ''.join(parts).strip() + '\n'
+
+
+def minify(name, source):
+    if name.endswith('.js'):
+        return JSMinifier(source).minify()
+    if name.endswith('.css'):
+        return minify_css(source)
+    return source
+
+
+def fingerprint(name, content):
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:10]
+    stem, ext = name.rsplit('.', 1)
+    return f"{stem}.{digest}.{ext}"
+
+
+def write_compressed(path, data):
+    """Write .gz (always) and .br (when brotli is installed) next to the file"""
+    # mtime=0 keeps the output byte-identical between builds
+    with open(f"{path}.gz", 'wb') as f:
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+    try:
+        import brotli
+    except ImportError:
+        return
+    Path(f"{path}.br").write_bytes(brotli.compress(data, quality=11))
+
+
+def build(check=False):
+    manifest = {}
+    report = []
+    outputs = {}
+    for name in ASSETS:
+        source_path = STATIC_DIR / name
+        if not source_path.exists():
+            print(f"Skipping {name}: not found")
+            continue
+        source = source_path.read_text(encoding='utf-8')
+        try:
+            content = minify(name, source)
+        except ValueError as e:
+            # Never ship a file the minifier could not read with certainty
+            print(f"Could not minify {name} ({e}), copying it unchanged")
+            content = source
+        hashed_name = fingerprint(name, content)
+        manifest[name] = hashed_name
+        outputs[hashed_name] = content.encode('utf-8')
+        report.append((name, hashed_name, len(source.encode('utf-8')), len(outputs[hashed_name])))
+
+    for name, hashed_name, before, after in report:
+        print(f"{name:<14} -> {hashed_name:<28} {before:>7} -> {after:>7} bytes")
+    if check:
+        return manifest
+
+    # Start from a clean directory so stale fingerprints never linger
+    if DIST_DIR.exists():
+        shutil.rmtree(DIST_DIR)
+    DIST_DIR.mkdir(parents=True)
+    for hashed_name, data in outputs.items():
+        path = DIST_DIR / hashed_name
+        path.write_bytes(data)
+        write_compressed(path, data)
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"Wrote {len(manifest)} assets and {MANIFEST_FILE}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Minify and fingerprint the static assets')
+    parser.add_argument('--check', action='store_true', help='Show what would be built without writing anything')
+    args = parser.parse_args()
+    build(check=args.check)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""Load test harness for the M05 practice app
+
+Replays realistic quiz sessions (login, selection page bootstrap, question fetch,
+one answer submission and explanation fetch per question, results save) at a configurable
+concurrency and reports per-endpoint latency percentiles, throughput and
+error counts.
+
+Usage:
+    python3 load_test.py                         # drive app.py in-process
+    python3 load_test.py --url http://localhost:5001 --users 20 --sessions 100
+    python3 load_test.py --json before.json      # save a report for comparison
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+class InProcessClient:
+    """Send requests to the Flask app through its test client (one cookie jar per user)"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, json_body=None, form=None):
+        response = self.client.open(path, method=method, json=json_body, data=form)
+        body = response.get_data()
+        return response.status_code, body
+
+    def has_cookie(self, name):
+        return self.client.get_cookie(name) is not None
+
+
+class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Hand redirects back to the caller so a login bounce is not mistaken for a page"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpClient:
+    """Send requests to a running server over HTTP (one cookie jar per user)"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies),
+            NoRedirectHandler()
+        )
+
+    def request(self, method, path, json_body=None, form=None):
+        data = None
+        headers = {}
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def has_cookie(self, name):
+        return any(cookie.name == name for cookie in self.cookies)
+
+
+class LatencyRecorder:
+    """Collect latency samples and error counts per endpoint (thread-safe)"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, elapsed, ok):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(elapsed)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def record_error(self, endpoint):
+        with self.lock:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    @staticmethod
+    def percentile(sorted_values, pct):
+        """Nearest-rank percentile of an already sorted list"""
+        if not sorted_values:
+            return 0.0
+        rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+        return sorted_values[rank]
+
+    def summary(self, wall_time):
+        """Build the report: one row per endpoint plus an overall total"""
+        rows = []
+        all_samples = []
+        total_errors = 0
+        for endpoint in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples.get(endpoint, []))
+            all_samples.extend(values)
+            errors = self.errors.get(endpoint, 0)
+            total_errors += errors
+            rows.append(self._row(endpoint, values, errors, wall_time))
+        rows.append(self._row('TOTAL', sorted(all_samples), total_errors, wall_time))
+        return rows
+
+    def _row(self, endpoint, values, errors, wall_time):
+        return {
+            'endpoint': endpoint,
+            'requests': len(values),
+            'errors': errors,
+            'throughput_rps': round(len(values) / wall_time, 2) if wall_time > 0 else 0.0,
+            'p50_ms': round(self.percentile(values, 50) * 1000, 2),
+            'p95_ms': round(self.percentile(values, 95) * 1000, 2),
+            'p99_ms': round(self.percentile(values, 99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+        }
+
+
+def timed_request(client, recorder, endpoint, method, path, json_body=None, form=None, check=None):
+    """Issue one request, record its latency under `endpoint` and return (status, body)
+
+    A request counts as an error unless it is 2xx, or `check(status)` accepts it when given.
+    """
+    start = time.perf_counter()
+    try:
+        status, body = client.request(method, path, json_body=json_body, form=form)
+    except Exception as e:
+        recorder.record(endpoint, time.perf_counter() - start, False)
+        print(f"Request {endpoint} failed: {e}", file=sys.stderr)
+        return None, b''
+    # A 3xx on an API call is the login_required bounce, so only 2xx counts by default
+    ok = check(status) if check else 200 <= status < 300
+    recorder.record(endpoint, time.perf_counter() - start, ok)
+    return status, body
+
+
+def pick_quiz_options(rng, years, objectives, question_count):
+    """Choose a quiz mode the way candidates spread across the selection page"""
+    roll = rng.random()
+    if roll < 0.5 or (not years and not objectives):
+        return {'count': question_count}
+    if roll < 0.75 and years:
+        return {'year': int(rng.choice(years))}
+    if objectives:
+        return {'learning_objective': rng.choice(objectives)['number']}
+    return {'count': question_count}
+
+
+def run_session(client, recorder, rng, args):
+    """Replay one full quiz session for a single candidate"""
+    # A failed login re-renders the form with 200, so success means a redirect plus a session cookie
+    def logged_in(status):
+        return 300 <= status < 400 and client.has_cookie(args.session_cookie)
+
+    status, _ = timed_request(client, recorder, 'POST /login', 'POST', '/login',
+                              form={'username': args.username, 'password': args.password},
+                              check=logged_in)
+    if status is None or not logged_in(status):
+        return
+
+    # Selection page data (one bootstrap call)
+    _, body = timed_request(client, recorder, 'GET /api/bootstrap', 'GET', '/api/bootstrap')
+    bootstrap_data = _parse_json(body, {})
+    years = bootstrap_data.get('years', []) if isinstance(bootstrap_data, dict) else []
+    objectives = bootstrap_data.get('learning_objectives', []) if isinstance(bootstrap_data, dict) else []
+
+    quiz_options = pick_quiz_options(rng, years, objectives, args.questions)
+    _, body = timed_request(client, recorder, 'POST /api/questions/filter', 'POST', '/api/questions/filter',
+                            json_body=quiz_options)
+    questions = _parse_json(body, [])
+    if not isinstance(questions, list):
+        recorder.record_error('POST /api/questions/filter')
+        return
+    questions = questions[:args.questions]
+
+    answers = []
+    correct = 0
+    for question in questions:
+        if args.think_time:
+            time.sleep(rng.uniform(0, args.think_time))
+        letters = [opt['letter'] for opt in question.get('options', [])]
+        if not letters:
+            continue
+        if question.get('is_multiple_choice'):
+            selected = ','.join(sorted(rng.sample(letters, rng.randint(1, len(letters)))))
+        else:
+            selected = rng.choice(letters)
+        _, body = timed_request(client, recorder, 'POST /api/submit-answer', 'POST', '/api/submit-answer',
+                                json_body={'question_id': question['id'], 'answer': selected})
+        feedback = _parse_json(body, {})
+        is_correct = bool(feedback.get('is_correct')) if isinstance(feedback, dict) else False
+        # The explanation is built in the background; collect it as quiz.js does
+        token = feedback.get('explanation_token') if isinstance(feedback, dict) else None
+        if token:
+            timed_request(client, recorder, 'GET /api/feedback', 'GET', f'/api/feedback/{token}?wait=25')
+        correct += 1 if is_correct else 0
+        answers.append({'answered': True, 'selected': selected, 'correct': is_correct})
+
+    total = len(answers)
+    timed_request(client, recorder, 'POST /api/results', 'POST', '/api/results', json_body={
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'total': total,
+        'correct': correct,
+        'incorrect': total - correct,
+        'percentage': round(correct / total * 100) if total else 0,
+        'mode': 'Load test',
+        'learning_objective_breakdown': {},
+        'questions': [{'id': q['id']} for q in questions],
+        'answers': answers,
+    })
+
+
+def _parse_json(body, default):
+    try:
+        return json.loads(body)
+    except (ValueError, TypeError):
+        return default
+
+
+def print_report(rows, config):
+    print()
+    print(f"Mode: {config['mode']}  users: {config['users']}  sessions: {config['sessions']}  "
+          f"questions/session: {config['questions']}  wall time: {config['wall_time_s']}s")
+    header = f"{'endpoint':<36} {'reqs':>6} {'errs':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['endpoint']:<36} {row['requests']:>6} {row['errors']:>5} {row['throughput_rps']:>8} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate concurrent quiz sessions against the M05 app')
+    parser.add_argument('--url', help='Base URL of a running server (default: drive app.py in-process)')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual candidates (default: 10)')
+    parser.add_argument('--sessions', type=int, default=50, help='Total quiz sessions to replay (default: 50)')
+    parser.add_argument('--questions', type=int, default=10, help='Questions answered per session (default: 10)')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='Max random pause in seconds before each answer (default: 0)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for reproducible runs (default: 1)')
+    parser.add_argument('--username', default=os.environ.get('APP_USERNAME', 'aaron'))
+    parser.add_argument('--password', default=os.environ.get('APP_PASSWORD', 'm05pass2025'))
+    parser.add_argument('--session-cookie', default='session',
+                        help='Name of the session cookie set by a successful login (default: session)')
+    parser.add_argument('--json', dest='json_path', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+        mode = f'http {args.url}'
+    else:
+        # Import here so HTTP mode does not parse the question bank locally
+        from app import app as flask_app
+        def make_client():
+            return InProcessClient(flask_app)
+        mode = 'in-process'
+
+    recorder = LatencyRecorder()
+
+    def worker(session_index):
+        # Each session gets its own client (cookie jar) and RNG so runs are repeatable
+        rng = random.Random(args.seed * 100003 + session_index)
+        run_session(make_client(), recorder, rng, args)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        list(pool.map(worker, range(args.sessions)))
+    wall_time = time.perf_counter() - start
+
+    config = {
+        'mode': mode,
+        'users': args.users,
+        'sessions': args.sessions,
+        'questions': args.questions,
+        'think_time': args.think_time,
+        'seed': args.seed,
+        'wall_time_s': round(wall_time, 2),
+    }
+    rows = recorder.summary(wall_time)
+    print_report(rows, config)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'endpoints': rows}, f, indent=2)
+        print(f"\nReport written to {args.json_path}")
+
+    total_errors = rows[-1]['errors']
+    sys.exit(1 if total_errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -209,6 +209,11 @@ async function reloadQuestions() {
             method: 'POST'
         });
         const result = await response.json();
+        if (!response.ok) {
+            // 429/503: another reload is running or one was done moments ago
+            showError(result.error || 'Failed to reload questions.');
+            return;
+        }
         
         // Reload questions
         await loadQuestions();
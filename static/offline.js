@@ -0,0 +1,307 @@
+// Offline support: service worker registration, a local copy of the question bank
+// in IndexedDB, local grading and a queue of results waiting to be posted
+const M05Offline = (() => {
+    const DB_NAME = 'm05-offline';
+    const DB_VERSION = 1;
+    let dbPromise = null;
+
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const request = indexedDB.open(DB_NAME, DB_VERSION);
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    db.createObjectStore('questions', { keyPath: 'id' });
+                    db.createObjectStore('meta', { keyPath: 'key' });
+                    db.createObjectStore('pendingResults', { keyPath: 'queueId', autoIncrement: true });
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            });
+        }
+        return dbPromise;
+    }
+
+    // Run fn(store, ...) inside one transaction and resolve once it has committed
+    async function withStores(names, mode, fn) {
+        const db = await openDb();
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(names, mode);
+            let result;
+            Promise.resolve(fn(...names.map(name => tx.objectStore(name))))
+                .then(value => { result = value; })
+                .catch(reject);
+            tx.oncomplete = () => resolve(result);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    function requestResult(request) {
+        return new Promise((resolve, reject) => {
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async function getVersion() {
+        const meta = await withStores(['meta'], 'readonly', store => requestResult(store.get('version')));
+        return meta ? meta.value : null;
+    }
+
+    // Fetch only what changed since the version we hold (or the whole bank the first time)
+    async function sync() {
+        const since = await getVersion();
+        const url = '/api/offline/sync' + (since ? `?since=${encodeURIComponent(since)}` : '');
+        let response;
+        // 503 while the server is still building its first copy of the bank - wait and retry
+        for (let attempt = 0; attempt < 5; attempt++) {
+            response = await fetch(url);
+            if (response.status !== 503) break;
+            const retryAfter = Math.min(parseInt(response.headers.get('Retry-After') || '5'), 30);
+            await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+        }
+        if (!response.ok || response.redirected) {
+            throw new Error(`Sync failed with status ${response.status}`);
+        }
+        const data = await response.json();
+        if (data.version === since) {
+            return { version: since, updated: 0, removed: 0 };
+        }
+        await withStores(['questions', 'meta'], 'readwrite', (questionStore, metaStore) => {
+            if (data.full) {
+                questionStore.clear();
+            }
+            data.questions.forEach(question => questionStore.put(question));
+            data.removed.forEach(id => questionStore.delete(id));
+            metaStore.put({ key: 'version', value: data.version });
+            metaStore.put({ key: 'syncedAt', value: new Date().toISOString() });
+        });
+        return { version: data.version, updated: data.questions.length, removed: data.removed.length };
+    }
+
+    async function getAllQuestions() {
+        return withStores(['questions'], 'readonly', store => requestResult(store.getAll()));
+    }
+
+    async function getQuestion(id) {
+        return withStores(['questions'], 'readonly', store => requestResult(store.get(id)));
+    }
+
+    async function hasQuestions() {
+        try {
+            const count = await withStores(['questions'], 'readonly', store => requestResult(store.count()));
+            return count > 0;
+        } catch (error) {
+            return false;
+        }
+    }
+
+    function shuffle(list) {
+        for (let i = list.length - 1; i > 0; i--) {
+            const j = Math.floor(Math.random() * (i + 1));
+            [list[i], list[j]] = [list[j], list[i]];
+        }
+        return list;
+    }
+
+    // Keep the first question of each near-duplicate cluster (same as the server)
+    function dedupeByCluster(list) {
+        const seen = new Set();
+        return list.filter(q => {
+            const cluster = q.cluster_id !== undefined && q.cluster_id !== null ? q.cluster_id : q.id;
+            if (seen.has(cluster)) return false;
+            seen.add(cluster);
+            return true;
+        });
+    }
+
+    // Mirror of /api/questions/filter for the local copy of the bank
+    async function filterQuestions(options) {
+        const all = await getAllQuestions();
+        const count = options.count ? parseInt(options.count) : null;
+        let filtered;
+        if (options.multiple_choice_only) {
+            filtered = dedupeByCluster(shuffle(all.filter(q => q.is_multiple_choice)));
+            if (count) filtered = filtered.slice(0, count);
+        } else if (options.learning_objective) {
+            filtered = all.filter(q => q.learning_objective === String(options.learning_objective));
+            filtered = dedupeByCluster(shuffle(filtered)).slice(0, 20);
+        } else if (options.year) {
+            filtered = all.filter(q => (q.source_file || '').includes(String(options.year)));
+            // Exact paper order
+            const sortKey = q => /^\d+$/.test(q.question_number || '') ? parseInt(q.question_number) : 999999;
+            filtered.sort((a, b) => sortKey(a) - sortKey(b));
+        } else {
+            // IndexedDB returns questions by ID, so put them back in paper order first
+            filtered = all.sort((a, b) => (a.source_file || '').localeCompare(b.source_file || '') ||
+                                          a.original_order - b.original_order);
+            if (count) filtered = dedupeByCluster(shuffle(filtered)).slice(0, count);
+        }
+        return filtered;
+    }
+
+    // Years, learning objectives and multiple choice count, as /api/bootstrap returns them
+    async function facets() {
+        const all = await getAllQuestions();
+        const years = new Set();
+        const objectives = {};
+        let multipleChoiceCount = 0;
+        all.forEach(q => {
+            const yearMatch = (q.source_file || '').match(/(\d{4})/);
+            if (yearMatch) years.add(yearMatch[1]);
+            if (q.learning_objective) {
+                objectives[q.learning_objective] = (objectives[q.learning_objective] || 0) + 1;
+            }
+            if (q.is_multiple_choice) multipleChoiceCount++;
+        });
+        return {
+            authenticated: true,
+            offline: true,
+            years: [...years].sort().reverse(),
+            learning_objectives: Object.entries(objectives)
+                .map(([number, count]) => ({ number, count }))
+                .sort((a, b) => parseFloat(a.number) - parseFloat(b.number)),
+            multiple_choice_count: multipleChoiceCount
+        };
+    }
+
+    // Same verdict and wording as /api/submit-answer, from the local copy
+    async function grade(questionId, answer) {
+        const question = await getQuestion(questionId);
+        if (!question) {
+            throw new Error(`Question ${questionId} is not available offline`);
+        }
+        const correctAnswers = question.correct_answer.split(',').map(a => a.trim().toUpperCase());
+        const selectedAnswers = answer.split(',').map(a => a.trim().toUpperCase());
+        const isCorrect = selectedAnswers.length === correctAnswers.length &&
+            new Set(selectedAnswers).size === new Set(correctAnswers).size &&
+            selectedAnswers.every(a => correctAnswers.includes(a));
+        const selectedOptionText = question.options
+            .filter(opt => selectedAnswers.includes(opt.letter))
+            .map(opt => opt.text)
+            .join(', ');
+
+        let explanation;
+        if (question.explanation_core === null) {
+            explanation = isCorrect
+                ? `Correct! ${question.correct_option_text} is the right answer.`
+                : `The correct answer is ${question.correct_option_text}. You selected ${selectedOptionText}.`;
+        } else {
+            explanation = isCorrect
+                ? `Correct! ${question.explanation_core}`
+                : `The correct answer is ${question.correct_option_text}. ${question.explanation_core}`;
+        }
+
+        return {
+            is_correct: isCorrect,
+            correct_answer: question.correct_answer,
+            correct_option_text: question.correct_option_text,
+            is_multiple_choice: question.is_multiple_choice,
+            selected_option_text: selectedOptionText,
+            explanation: explanation,
+            learning_objective: question.learning_objective || '',
+            feedback_points: [],
+            offline: true
+        };
+    }
+
+    // Authenticated, or unreachable (carry on with the local copy); false only if the server says no
+    async function checkAuth() {
+        try {
+            const response = await fetch('/api/check-auth');
+            const data = await response.json();
+            return data.authenticated;
+        } catch (error) {
+            console.warn('Auth check failed, continuing offline:', error);
+            return hasQuestions();
+        }
+    }
+
+    async function queueResult(results) {
+        await withStores(['pendingResults'], 'readwrite', store => store.add({ results: results }));
+    }
+
+    // Post queued results in order, stopping at the first failure so none are lost
+    async function flushResults() {
+        const pending = await withStores(['pendingResults'], 'readonly', store => requestResult(store.getAll()));
+        let posted = 0;
+        for (const item of pending) {
+            let response;
+            try {
+                response = await fetch('/api/results', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify(item.results)
+                });
+            } catch (error) {
+                break;
+            }
+            if (!response.ok || response.redirected) break;
+            await withStores(['pendingResults'], 'readwrite', store => store.delete(item.queueId));
+            posted++;
+        }
+        return posted;
+    }
+
+    // Post results now, or queue them until the connection returns
+    async function saveResults(results) {
+        try {
+            const response = await fetch('/api/results', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(results)
+            });
+            if (response.ok && !response.redirected) return true;
+        } catch (error) {
+            console.warn('Could not save results, queued for later:', error);
+        }
+        await queueResult(results);
+        return false;
+    }
+
+    // Logging out leaves nothing behind: post any queued results while the session
+    // is still valid, then drop the local bank and the queue
+    async function clearLocalData() {
+        try {
+            await flushResults();
+        } catch (error) {
+            console.warn('Could not post queued results before logging out:', error);
+        }
+        await withStores(['questions', 'meta', 'pendingResults'], 'readwrite', (questionStore, metaStore, pendingStore) => {
+            questionStore.clear();
+            metaStore.clear();
+            pendingStore.clear();
+        });
+    }
+
+    if ('serviceWorker' in navigator) {
+        window.addEventListener('load', () => {
+            navigator.serviceWorker.register('/sw.js').catch(error => {
+                console.error('Service worker registration failed:', error);
+            });
+        });
+    }
+
+    if ('indexedDB' in window) {
+        document.addEventListener('click', event => {
+            const link = event.target.closest('a[href="/logout"]');
+            if (!link) return;
+            event.preventDefault();
+            clearLocalData()
+                .catch(error => console.error('Error clearing offline data:', error))
+                .finally(() => { window.location.href = link.href; });
+        });
+        window.addEventListener('online', () => {
+            flushResults().catch(error => console.error('Error posting queued results:', error));
+        });
+        window.addEventListener('load', () => {
+            if (navigator.onLine) {
+                flushResults().catch(error => console.error('Error posting queued results:', error));
+            }
+        });
+    }
+
+    return { sync, getVersion, getAllQuestions, getQuestion, hasQuestions, filterQuestions,
+             facets, grade, checkAuth, queueResult, flushResults, saveResults, clearLocalData };
+})();
@@ -7,16 +7,8 @@ let score = 0;
 
 // Check authentication on page load
 document.addEventListener('DOMContentLoaded', async () => {
-    // Check if user is authenticated
-    try {
-        const authResponse = await fetch('/api/check-auth');
-        const authData = await authResponse.json();
-        if (!authData.authenticated) {
-            window.location.href = '/login';
-            return;
-        }
-    } catch (error) {
-        console.error('Auth check failed:', error);
+    // Check if user is authenticated (offline, carry on with the local question bank)
+    if (!(await M05Offline.checkAuth())) {
         window.location.href = '/login';
         return;
     }
@@ -57,16 +49,20 @@ async function loadQuestions() {
         // Get quiz options from sessionStorage
         const quizOptions = JSON.parse(sessionStorage.getItem('quizOptions') || '{}');
         
-        // Fetch filtered questions
-        const response = await fetch('/api/questions/filter', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(quizOptions)
-        });
-        
-        questions = await response.json();
+        // Fetch filtered questions (from the local copy when the server can't be reached)
+        try {
+            const response = await fetch('/api/questions/filter', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(quizOptions)
+            });
+            questions = await response.json();
+        } catch (error) {
+            console.warn('Loading questions from the offline copy:', error);
+            questions = await M05Offline.filterQuestions(quizOptions);
+        }
         
         // Initialize answers array if not restored
         if (answers.length === 0) {
@@ -303,18 +299,7 @@ async function submitAnswer() {
     });
     
     try {
-        const response = await fetch('/api/submit-answer', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                question_id: question.id,
-                answer: selectedAnswer
-            })
-        });
-        
-        const feedback = await response.json();
+        const feedback = await fetchFeedback(question.id, selectedAnswer);
         
         // Store answer
         // Check if this question was already answered
@@ -348,6 +333,9 @@ async function submitAnswer() {
         
         displayFeedback(feedback, question);
         updateScore();
+        if (feedback.explanation_token || feedback.explanation_status === 'busy') {
+            loadExplanation(feedback, currentQuestionIndex, question.id, selectedAnswer);
+        }
         
         // Update option styling
         const correctAnswers = feedback.correct_answer ? feedback.correct_answer.split(',').map(a => a.trim().toUpperCase()) : [];
@@ -393,10 +381,88 @@ async function submitAnswer() {
     }
 }
 
+async function fetchFeedback(questionId, answer) {
+    try {
+        // A busy server (503) or too many answers too fast (429) says when to try again
+        for (let attempt = 0; attempt < 3; attempt++) {
+            const response = await fetch('/api/submit-answer', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    question_id: questionId,
+                    answer: answer
+                })
+            });
+            if (response.status !== 429 && response.status !== 503) {
+                return await response.json();
+            }
+            const retryAfter = Math.min(parseInt(response.headers.get('Retry-After') || '2'), 10);
+            await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+        }
+        throw new Error('Server is busy');
+    } catch (error) {
+        // No connection (or still busy) - grade against the offline copy instead
+        console.warn('Grading offline:', error);
+        return await M05Offline.grade(questionId, answer);
+    }
+}
+
+// Explanation tokens being collected (kept out of feedback, which is saved with the progress)
+const explanationsLoading = new Set();
+
+// The verdict comes back at once; the explanation is built on the server and collected here
+async function loadExplanation(feedback, questionIndex, questionId, answer) {
+    // Without a token the server was too busy to start the explanation: go straight to the fallback
+    const token = feedback.explanation_token || `busy-${questionIndex}-${answer}`;
+    if (explanationsLoading.has(token)) return;
+    explanationsLoading.add(token);
+    let explanation = null;
+    try {
+        for (let attempt = 0; feedback.explanation_token && attempt < 10 && explanation === null; attempt++) {
+            const response = await fetch(`/api/feedback/${encodeURIComponent(token)}?wait=20`);
+            if (response.status === 202) continue;
+            if (response.status === 503) {
+                // Too many candidates waiting at once: come back when the server suggests
+                const retryAfter = Math.min(parseInt(response.headers.get('Retry-After') || '2'), 10);
+                await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+                continue;
+            }
+            if (!response.ok || response.redirected) break;
+            explanation = (await response.json()).explanation;
+        }
+    } catch (error) {
+        console.warn('Could not load explanation:', error);
+    }
+    if (explanation === null) {
+        // Token expired or the connection dropped - use the offline copy's explanation if there is one
+        try {
+            explanation = (await M05Offline.grade(questionId, answer)).explanation;
+        } catch (error) {
+            explanation = '';
+        }
+    }
+    explanationsLoading.delete(token);
+    delete feedback.explanation_token;
+    feedback.explanation = explanation;
+    feedback.explanation_status = 'ready';
+    saveProgress();
+    // Only redraw if the candidate is still looking at this answer
+    const current = answers[questionIndex];
+    if (questionIndex === currentQuestionIndex && current && current.feedback === feedback) {
+        displayFeedback(feedback, questions[questionIndex]);
+    }
+}
+
 function showFeedbackForAnswered() {
     const answer = answers[currentQuestionIndex];
     if (answer.feedback) {
         displayFeedback(answer.feedback, questions[currentQuestionIndex]);
+        // Restored progress may still be waiting on an explanation
+        if (answer.feedback.explanation_token || answer.feedback.explanation_status === 'busy') {
+            loadExplanation(answer.feedback, currentQuestionIndex, questions[currentQuestionIndex].id, answer.selected);
+        }
     }
 }
 
@@ -438,6 +504,13 @@ function displayFeedback(feedback, question) {
                 <p>${feedback.explanation}</p>
             </div>
         `;
+    } else if (feedback.explanation_token) {
+        html += `
+            <div class="feedback-explanation loading">
+                <h4>Explanation:</h4>
+                <p>Finding the explanation in the study text…</p>
+            </div>
+        `;
     }
     
     feedbackContent.innerHTML = html;
@@ -561,20 +634,14 @@ function finishQuiz() {
         console.error('Error saving to sessionStorage:', e);
     }
     
-    // Save to server
-    fetch('/api/results', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(results)
-    }).catch(err => console.error('Error saving results:', err));
-    
-    // Clear progress
-    localStorage.removeItem('quizProgress');
-    
-    // Small delay to ensure sessionStorage is saved
-    setTimeout(() => {
-        window.location.href = '/results';
-    }, 100);
+    // Save to server (queued in IndexedDB and posted later if we're offline)
+    M05Offline.saveResults(results)
+        .catch(err => console.error('Error saving results:', err))
+        .finally(() => {
+            // Clear progress
+            localStorage.removeItem('quizProgress');
+            window.location.href = '/results';
+        });
 }
 
 function getModeDescription() {
@@ -1,15 +1,7 @@
 // Results page logic
 document.addEventListener('DOMContentLoaded', async () => {
-    // Check if user is authenticated
-    try {
-        const authResponse = await fetch('/api/check-auth');
-        const authData = await authResponse.json();
-        if (!authData.authenticated) {
-            window.location.href = '/login';
-            return;
-        }
-    } catch (error) {
-        console.error('Auth check failed:', error);
+    // Check if user is authenticated (offline, carry on with the local question bank)
+    if (!(await M05Offline.checkAuth())) {
         window.location.href = '/login';
         return;
     }
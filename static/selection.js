@@ -2,23 +2,32 @@
 let selectedOptions = null;
 
 document.addEventListener('DOMContentLoaded', async () => {
-    // Check if user is authenticated
+    // One request for auth state, years, learning objectives and multiple choice count
+    let bootstrapData;
     try {
-        const authResponse = await fetch('/api/check-auth');
-        const authData = await authResponse.json();
-        if (!authData.authenticated) {
+        bootstrapData = await fetchBootstrap();
+        if (!bootstrapData.authenticated) {
             window.location.href = '/login';
             return;
         }
     } catch (error) {
-        console.error('Auth check failed:', error);
-        window.location.href = '/login';
-        return;
+        // Server unreachable - build the page from the offline copy if we have one
+        console.warn('Bootstrap failed:', error);
+        if (!(await M05Offline.hasQuestions())) {
+            window.location.href = '/login';
+            return;
+        }
+        bootstrapData = await M05Offline.facets();
     }
     
-    loadAvailableYears();
-    loadLearningObjectives();
-    loadMultipleChoiceCount();
+    // Bring the offline copy of the question bank up to date in the background
+    if (!bootstrapData.offline) {
+        M05Offline.sync().catch(error => console.warn('Offline sync failed:', error));
+    }
+    
+    renderAvailableYears(bootstrapData.years || []);
+    renderLearningObjectives(bootstrapData.learning_objectives || []);
+    renderMultipleChoiceCount(bootstrapData.multiple_choice_count || 0);
     
     // Handle count buttons
     document.querySelectorAll('.quiz-btn[data-mode="count"]').forEach(btn => {
@@ -53,11 +62,21 @@ document.addEventListener('DOMContentLoaded', async () => {
     });
 });
 
-async function loadAvailableYears() {
+async function fetchBootstrap() {
+    // The server answers 503 while it is still warming up - wait and retry
+    for (let attempt = 0; attempt < 10; attempt++) {
+        const response = await fetch('/api/bootstrap');
+        if (response.status !== 503) {
+            return await response.json();
+        }
+        const retryAfter = parseInt(response.headers.get('Retry-After') || '2');
+        await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+    }
+    throw new Error('Server is still warming up');
+}
+
+function renderAvailableYears(years) {
     try {
-        const response = await fetch('/api/years');
-        const years = await response.json();
-        
         const yearButtons = document.getElementById('yearButtons');
         yearButtons.innerHTML = '';
         
@@ -189,11 +208,8 @@ function startQuiz(options) {
     window.location.href = '/quiz';
 }
 
-async function loadLearningObjectives() {
+function renderLearningObjectives(objectives) {
     try {
-        const response = await fetch('/api/learning-objectives');
-        const objectives = await response.json();
-        
         const loButtons = document.getElementById('learningObjectiveButtons');
         loButtons.innerHTML = '';
         
@@ -219,12 +235,8 @@ async function loadLearningObjectives() {
     }
 }
 
-async function loadMultipleChoiceCount() {
+function renderMultipleChoiceCount(count) {
     try {
-        const response = await fetch('/api/multiple-choice-count');
-        const data = await response.json();
-        const count = data.count;
-        
         // Update button labels to show count
         document.querySelectorAll('.quiz-btn[data-mode="multiple"]').forEach(btn => {
             const value = btn.dataset.value;
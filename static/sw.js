@@ -0,0 +1,99 @@
+// Service worker: keeps the pages and static assets available offline.
+// The question bank itself lives in IndexedDB (see offline.js), not in this cache.
+const CACHE_NAME = 'm05-shell-v2';
+
+const PAGES = ['/', '/quiz', '/results', '/history', '/login'];
+// Unbuilt fallbacks; with a build, the fingerprinted files listed in the manifest are cached instead
+const ASSETS = [
+    '/static/style.css',
+    '/static/offline.js',
+    '/static/selection.js',
+    '/static/quiz.js',
+    '/static/results.js',
+    '/static/history.js'
+];
+
+// Only keep real pages - a logged-out visit to / redirects to the login form
+async function cacheResponse(cache, request, response) {
+    if (response.ok && !response.redirected) {
+        await cache.put(request, response.clone());
+    }
+    return response;
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const cache = await caches.open(CACHE_NAME);
+        let assets = ASSETS;
+        try {
+            const response = await fetch('/assets/manifest.json');
+            if (response.ok) {
+                assets = Object.values(await response.json()).map(name => `/assets/${name}`);
+            }
+        } catch (error) {
+            console.warn('No asset manifest, caching unbuilt files');
+        }
+        // One by one, so a single failure does not stop the worker installing
+        for (const url of [...assets, ...PAGES]) {
+            try {
+                await cacheResponse(cache, url, await fetch(url, { credentials: 'same-origin' }));
+            } catch (error) {
+                console.warn('Could not precache', url, error);
+            }
+        }
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names.filter(name => name !== CACHE_NAME).map(name => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin) {
+        return;
+    }
+
+    // Pages: network first so they stay current, cached copy when offline
+    if (request.mode === 'navigate') {
+        event.respondWith((async () => {
+            const cache = await caches.open(CACHE_NAME);
+            try {
+                return await cacheResponse(cache, url.pathname, await fetch(request));
+            } catch (error) {
+                return (await cache.match(url.pathname)) || (await cache.match('/')) || Response.error();
+            }
+        })());
+        return;
+    }
+
+    // Fingerprinted assets never change, so the cached copy is always right
+    if (url.pathname.startsWith('/assets/') && url.pathname !== '/assets/manifest.json') {
+        event.respondWith((async () => {
+            const cache = await caches.open(CACHE_NAME);
+            return (await cache.match(request)) || cacheResponse(cache, request, await fetch(request));
+        })());
+        return;
+    }
+
+    // Unbuilt static files: serve from cache and refresh in the background
+    if (url.pathname.startsWith('/static/')) {
+        event.respondWith((async () => {
+            const cache = await caches.open(CACHE_NAME);
+            const cached = await cache.match(request);
+            const network = fetch(request).then(response => cacheResponse(cache, request, response));
+            if (cached) {
+                network.catch(() => {});
+                return cached;
+            }
+            return network;
+        })());
+    }
+    // API calls go straight to the network; the pages fall back to IndexedDB themselves
+});
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# app.py and build_assets.py live at the repository root and use paths relative to it
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+# Importing app starts its warm-up: keep saved results and the study text store out of the working tree
+_scratch = tempfile.mkdtemp(prefix='m05-tests-')
+os.environ.setdefault('RESULTS_DIR', os.path.join(_scratch, 'results'))
+os.environ.setdefault('STUDY_TEXT_STORE_DIR', os.path.join(_scratch, 'study_text_store'))
+
+LOGIN = {'username': 'aaron', 'password': 'm05pass2025'}
+
+
+@pytest.fixture
+def app_module():
+    """The app module, once its warm-up has finished"""
+    import app
+    assert app.startup.ready.wait(60)
+    return app
+
+
+@pytest.fixture
+def login(app_module):
+    """Make a test client and log it in: every call is a separate login with its own session"""
+    def new_client():
+        client = app_module.app.test_client()
+        response = client.post('/login', data=LOGIN)
+        assert response.status_code == 302
+        return client
+    return new_client
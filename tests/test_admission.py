@@ -0,0 +1,98 @@
+"""Admission control through the routes: 429 for a login over its rate, 503 when busy, slots held by streams"""
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def limits(app_module, monkeypatch):
+    """Swap in admission control with small limits: make(retrieval=..., stream=...) overrides a class"""
+    def make(**classes):
+        defaults = {'slots': 1, 'queue': 0, 'timeout': 0, 'rate': 100.0, 'burst': 100}
+        control = app_module.AdmissionControl({name: dict(defaults, **classes.get(name, {}))
+                                               for name in ('retrieval', 'reload', 'stream')})
+        monkeypatch.setattr(app_module, 'admission_control', control)
+        return control
+    return make
+
+
+def question_url(app_module):
+    question = app_module.modules.get(app_module.DEFAULT_MODULE).corpus.get()[0]
+    return f"/api/question/{question['id']}"
+
+
+def test_rate_limit_is_429_per_login(app_module, login, limits):
+    limits(retrieval={'rate': 0.01, 'burst': 3})
+    url = question_url(app_module)
+    client = login()
+    assert [client.get(url).status_code for _ in range(4)] == [200, 200, 200, 429]
+    response = client.get(url)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['overloaded'] is True
+
+    # Another login has an allowance of its own
+    assert login().get(url).status_code == 200
+
+
+def test_replayed_cookie_shares_one_bucket(app_module, login, limits):
+    control = limits(retrieval={'rate': 0.01, 'burst': 3})
+    url = question_url(app_module)
+    cookie = login().get_cookie('session').value
+    codes = []
+    for _ in range(5):
+        # A fresh client every time, sending the cookie from the login and never storing a new one
+        client = app_module.app.test_client()
+        client.set_cookie('session', cookie)
+        codes.append(client.get(url).status_code)
+    assert codes == [200, 200, 200, 429, 429]
+    assert len(control.buckets) == 1
+
+
+def test_busy_is_503(app_module, login, limits):
+    control = limits()
+    url = question_url(app_module)
+    client = login()
+    with control.admit('retrieval', 'someone else'):
+        response = client.get(url)
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+    assert client.get(url).status_code == 200
+
+
+def test_queue_timeout_is_503(app_module, login, limits):
+    control = limits(retrieval={'queue': 1, 'timeout': 0.2})
+    url = question_url(app_module)
+    client = login()
+    with control.admit('retrieval', 'someone else'):
+        start = time.monotonic()
+        response = client.get(url)
+        assert response.status_code == 503
+        assert time.monotonic() - start >= 0.2
+    assert control.status()['classes']['retrieval']['waiting'] == 0
+
+
+def test_queued_request_runs_when_the_slot_frees(app_module, login, limits):
+    control = limits(retrieval={'queue': 1, 'timeout': 5})
+    url = question_url(app_module)
+    client = login()
+    slot = control.admit('retrieval', 'someone else')
+    slot.__enter__()
+    threading.Timer(0.2, slot.__exit__, (None, None, None)).start()
+    assert client.get(url).status_code == 200
+
+
+def test_stream_holds_its_slot_until_closed(login, limits):
+    control = limits()
+    client = login()
+    response = client.get('/api/questions/stream', buffered=False)
+    assert response.status_code == 200
+    assert control.status()['classes']['stream']['active'] == 1
+    first = next(iter(response.response))
+    assert first.strip()
+    # Still sending, so the next stream is turned away
+    assert login().get('/api/questions/stream').status_code == 503
+    response.close()
+    assert control.status()['classes']['stream']['active'] == 0
+    assert login().get('/api/questions/stream').status_code == 200
@@ -0,0 +1,133 @@
+"""The minifier must keep every token of the source, and only drop whitespace and comments"""
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from build_assets import STATIC_DIR, JSMinifier
+
+# Longest first, so "===" is not read as "==" then "="
+PUNCTUATORS = sorted([
+    '>>>=', '...', '===', '!==', '**=', '<<=', '>>=', '>>>', '&&=', '||=', '??=',
+    '=>', '==', '!=', '<=', '>=', '&&', '||', '??', '?.', '++', '--', '+=', '-=', '*=', '/=', '%=',
+    '&=', '|=', '^=', '**', '<<', '>>',
+] + list('{}()[];,<>+-*/%&|^!~?:=.@#'), key=len, reverse=True)
+WORD = re.compile(r'[A-Za-z0-9_$]+')
+REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw'}
+
+
+def tokenize(src, i=0, in_template=False):
+    """JavaScript tokens of src (comments and whitespace dropped), written independently of the minifier
+
+    Inside a template substitution, stops at its closing brace and returns (tokens, offset).
+    """
+    tokens = []
+    depth = 0
+    n = len(src)
+    while i < n:
+        ch = src[i]
+        if ch.isspace():
+            i += 1
+        elif src.startswith('//', i):
+            i = src.find('\n', i) if '\n' in src[i:] else n
+        elif src.startswith('/*', i):
+            i = src.index('*/', i) + 2
+        elif ch in '"\'':
+            j = i + 1
+            while src[j] != ch:
+                j += 2 if src[j] == '\\' else 1
+            tokens.append(src[i:j + 1])
+            i = j + 1
+        elif ch == '`':
+            j = i + 1
+            start = i
+            while src[j] != '`':
+                if src[j] == '\\':
+                    j += 2
+                elif src.startswith('${', j):
+                    tokens.append(src[start:j + 2])
+                    inner, j = tokenize(src, j + 2, in_template=True)
+                    tokens.extend(inner)
+                    start = j
+                    j += 1
+                else:
+                    j += 1
+            tokens.append(src[start:j + 1])
+            i = j + 1
+        elif ch == '/' and regex_allowed(tokens[-1] if tokens else None):
+            j = i + 1
+            in_class = False
+            while in_class or src[j] != '/':
+                if src[j] == '\\':
+                    j += 1
+                elif src[j] == '[':
+                    in_class = True
+                elif src[j] == ']':
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and src[j].isalpha():
+                j += 1
+            tokens.append(src[i:j])
+            i = j
+        elif WORD.match(src, i):
+            word = WORD.match(src, i).group()
+            tokens.append(word)
+            i += len(word)
+        else:
+            punctuator = next(p for p in PUNCTUATORS if src.startswith(p, i))
+            if punctuator == '{':
+                depth += 1
+            elif punctuator == '}':
+                if in_template and depth == 0:
+                    return tokens, i
+                depth -= 1
+            tokens.append(punctuator)
+            i += len(punctuator)
+    return tokens
+
+
+def regex_allowed(previous):
+    if previous is None:
+        return True
+    if previous[0] in '"\'`/' and len(previous) > 1:
+        return False  # A literal
+    if previous in (')', ']', '}', '++', '--'):
+        return previous == '}'
+    if WORD.fullmatch(previous):
+        return previous in REGEX_KEYWORDS
+    return True
+
+
+SCRIPTS = sorted(STATIC_DIR.glob('*.js'))
+
+
+@pytest.mark.parametrize('path', SCRIPTS, ids=[path.name for path in SCRIPTS])
+def test_minified_scripts_keep_every_token(path):
+    source = path.read_text(encoding='utf-8')
+    minified = JSMinifier(source).minify()
+    assert tokenize(minified) == tokenize(source)
+    assert len(minified) < len(source)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+@pytest.mark.parametrize('path', SCRIPTS, ids=[path.name for path in SCRIPTS])
+def test_minified_scripts_parse(path, tmp_path):
+    minified_path = tmp_path / path.name
+    minified_path.write_text(JSMinifier(path.read_text(encoding='utf-8')).minify(), encoding='utf-8')
+    result = subprocess.run(['node', '--check', str(minified_path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.mark.parametrize('source, expected', [
+    # "/" after a postfix ++/--, an identifier, a number or a closing bracket is a division
+    ('let n = i++ / 2;\nconst url = "/api/x";\n', 'let n=i++/2;const url="/api/x";\n'),
+    ('x-- / 2; let y = a; d / 3;\n', 'x--/2;let y=a;d/3;\n'),
+    ('total = counts[i] / 2 + f(x) / 3;\n', 'total=counts[i]/2+f(x)/3;\n'),
+    # ... and a regular expression at the start of an expression or after a keyword
+    ('const re = / a b /g;\nreturn / c d /.test(s);\n', 'const re=/ a b /g;return/ c d /.test(s);\n'),
+    ('value = a + / x y /.source;\n', 'value=a+/ x y /.source;\n'),
+])
+def test_division_and_regex(source, expected):
+    assert JSMinifier(source).minify() == expected
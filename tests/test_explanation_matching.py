@@ -0,0 +1,55 @@
+"""Golden test: batch answer matching gives the same answers as the per-question matcher it replaced"""
+import random
+
+import pytest
+
+from app import EXAM_PAPERS_DIR, STUDY_TEXT_DIR, QuestionExplanations, QuestionParser
+
+
+@pytest.fixture(scope='module')
+def explanations():
+    return QuestionExplanations(STUDY_TEXT_DIR)
+
+
+@pytest.fixture(scope='module')
+def question_texts():
+    return [question['question'] for question in QuestionParser.load_questions_from_files(EXAM_PAPERS_DIR, STUDY_TEXT_DIR)]
+
+
+def variants(text, rng):
+    """Edits that move a question across get_answer()'s substring, overlap and similarity thresholds"""
+    words = text.split()
+    yield ' '.join(words[:20])
+    yield ' '.join(words[:8])
+    yield ' '.join(w for i, w in enumerate(words) if i % 5 != 4)
+    yield text + ' Explain your answer with reference to the policy wording.'
+    yield 'In the exam: ' + text
+    shuffled = words[:]
+    rng.shuffle(shuffled)
+    yield ' '.join(shuffled)
+    yield text.upper()
+
+
+def test_current_bank_matches_per_question_path(explanations, question_texts):
+    assert question_texts
+    batch = explanations.get_answers(question_texts)
+    assert batch == [explanations.get_answer(text) for text in question_texts]
+    assert sum(answer is not None for answer in batch) >= len(question_texts) // 2
+
+
+def test_perturbed_questions_match_per_question_path(explanations, question_texts):
+    rng = random.Random(33)
+    texts = [variant for text in question_texts for variant in variants(text, rng)]
+    texts += [stored for stored in explanations.explanations]
+    # Small chunks so several matrix products and the chunk boundaries are exercised
+    batch = explanations.get_answers(texts, chunk_size=37)
+    expected = [explanations.get_answer(text) for text in texts]
+    mismatches = [(text, got, want) for text, got, want in zip(texts, batch, expected) if got != want]
+    assert mismatches == []
+    # Both matched and unmatched questions are covered
+    assert None in batch and any(batch)
+
+
+def test_no_questions_or_no_bank(explanations, tmp_path):
+    assert explanations.get_answers([]) == []
+    assert QuestionExplanations(tmp_path).get_answers(['Anything at all?']) == [None]
@@ -0,0 +1,116 @@
+"""Golden test: the line parser gives the same explanations as the regex parser it replaced"""
+import io
+import re
+
+import pytest
+
+from app import STUDY_TEXT_DIR, QuestionExplanations, text_normalizer
+
+
+def legacy_parse_explanations(explanations, text):
+    """The whole-text regex parser from before the line-based rewrite, kept as the reference"""
+    sections = re.split(r'\n-{3,}|\n={3,}|(?=\nQuestion\s+\d+)', text, flags=re.MULTILINE)
+    parsed = {}
+    for section in sections:
+        if not section.strip():
+            continue
+        question_header_match = re.search(r'Question\s+(\d+)\s*\[.*?\]\s*\n(.+?)(?=\nAnswer:|\n[A-D]\.|$)', section, re.DOTALL | re.IGNORECASE)
+        if question_header_match:
+            question_text = question_header_match.group(2).strip()
+            question_text = re.sub(r'^\s*[A-D]\.\s*.+$', '', question_text, flags=re.MULTILINE)
+            question_text = re.sub(r'\s+', ' ', question_text).strip()
+        else:
+            question_match = re.search(r'(?:Question\s*\d*:|Q\d*:)\s*(.+?)(?:\n|Answer:|$)', section, re.DOTALL | re.IGNORECASE)
+            if not question_match:
+                question_match = re.search(r'^(.+?)(?=\n\s*[A-D]\.|\n\s*Answer:)', section, re.DOTALL | re.IGNORECASE)
+                if question_match:
+                    question_text = question_match.group(1).strip()
+                    question_text = re.sub(r'^Question\s+\d+.*?\n', '', question_text, flags=re.IGNORECASE)
+                    question_text = re.sub(r'\[.*?\]', '', question_text)
+                    question_text = re.sub(r'\s+', ' ', question_text).strip()
+                else:
+                    continue
+            else:
+                question_text = question_match.group(1).strip()
+                question_text = re.sub(r'^\d+[\.\)]\s*', '', question_text)
+                question_text = re.sub(r'\[.*?\]', '', question_text)
+                question_text = re.sub(r'\s+', ' ', question_text).strip()
+        answer_match = re.search(r'Answer:\s*([A-E](?:,\s*[A-E])*)', section, re.IGNORECASE)
+        answer = answer_match.group(1).strip() if answer_match else ""
+        explanation_match = re.search(r'Explanation:\s*(.+?)(?=\n\s*(?:Question|Q\d*:|--|==|$|\Z))', section, re.DOTALL | re.IGNORECASE)
+        explanation = explanation_match.group(1).strip() if explanation_match else ""
+        if question_text and explanation:
+            explanation = text_normalizer.normalize_line(explanation)
+            if not explanation.endswith(('.', '!', '?')):
+                explanation += '.'
+            parsed[explanations.normalize_text(question_text)] = {'explanation': explanation, 'answer': answer}
+    return parsed
+
+
+def parse(text):
+    """The explanations dict parse_explanations() builds from text"""
+    explanations = QuestionExplanations.__new__(QuestionExplanations)
+    explanations.explanations = {}
+    explanations.parse_explanations(io.StringIO(text))
+    return explanations.explanations
+
+
+BANK_FILE = STUDY_TEXT_DIR / 'M05_Complete_Question_Bank_Answers_Explanations.txt'
+
+
+def test_current_bank_matches_regex_parser():
+    text = BANK_FILE.read_text(encoding='utf-8')
+    parsed = parse(text)
+    assert len(parsed) >= 100
+    assert parsed == legacy_parse_explanations(QuestionExplanations.__new__(QuestionExplanations), text)
+
+
+def test_format_guide_examples():
+    # The regex parser found nothing here: it missed "E:" labels and an explanation on an entry's last line
+    parsed = parse((STUDY_TEXT_DIR / 'EXPLANATIONS_FORMAT.txt').read_text(encoding='utf-8'))
+    assert parsed == {'what is the definition of insurance?': {
+        'explanation': 'Insurance is a contract where one party agrees to indemnify another '
+                       'against specified losses in exchange for a premium.',
+        'answer': 'A',
+    }}
+
+
+def test_explanation_keeps_answer_like_continuation_lines():
+    text = (
+        "Question 1 [Learning Outcome 1.1]\n"
+        "Which duty applies before inception?\n"
+        "A. Utmost good faith\n"
+        "B. Contribution\n"
+        "Answer: A\n"
+        "Explanation: The proposer must disclose material facts.\n"
+        "A: fair presentation replaced the old duty for business insurance.\n"
+        "Answer: consumer insurance follows CIDRA instead.\n"
+    )
+    parsed = parse(text)
+    assert parsed == legacy_parse_explanations(QuestionExplanations.__new__(QuestionExplanations), text)
+    entry = parsed['which duty applies before inception?']
+    assert entry['answer'] == 'A'
+    assert 'A: fair presentation replaced' in entry['explanation']
+    assert 'Answer: consumer insurance follows CIDRA' in entry['explanation']
+
+
+def test_explanation_keeps_lines_starting_with_question_number():
+    text = (
+        "Question 4 [Learning Outcome 2.1]\n"
+        "What does average do?\n"
+        "Answer: B\n"
+        "Explanation: It reduces a claim in proportion to underinsurance.\n"
+        "Question 5 asks about the same principle from the insurer's side.\n"
+        "Question 5 [Learning Outcome 2.2]\n"
+        "What is an excess?\n"
+        "Answer: D\n"
+        "Explanation: The first part of each claim paid by the insured.\n"
+    )
+    parsed = parse(text)
+    assert set(parsed) == {'what does average do?', 'what is an excess?'}
+    assert parsed['what does average do?']['explanation'] == (
+        "It reduces a claim in proportion to underinsurance. "
+        "Question 5 asks about the same principle from the insurer's side."
+    )
+    assert parsed['what is an excess?'] == {'explanation': 'The first part of each claim paid by the insured.',
+                                            'answer': 'D'}
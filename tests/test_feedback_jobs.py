@@ -0,0 +1,111 @@
+"""Explanation tokens: pending until built, ready once, 404 when forgotten or someone else's, 503 past the waiter cap"""
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def slow_feedback(app_module, monkeypatch):
+    """A fresh job pool, an empty feedback cache and explanations that finish only when released"""
+    jobs = app_module.FeedbackJobs(workers=2, max_jobs=3, max_waiters=1)
+    monkeypatch.setattr(app_module, 'feedback_jobs', jobs)
+    module = app_module.modules.get(app_module.DEFAULT_MODULE)
+    module.feedback_cache.clear()
+    release = threading.Event()
+
+    def generate(question_text, *args, **kwargs):
+        release.wait(10)
+        return f"Explained: {question_text}"
+
+    monkeypatch.setattr(module.study_index, 'generate_feedback_explanation', generate)
+    yield jobs, module, release
+    release.set()
+    module.feedback_cache.clear()
+
+
+def answer(client, module, index=0, **extra):
+    question = module.corpus.get()[index]
+    response = client.post('/api/submit-answer', json=dict({'question_id': question['id'], 'answer': 'A'}, **extra))
+    assert response.status_code == 200
+    return question, response.get_json()
+
+
+def test_pending_then_ready(login, slow_feedback):
+    jobs, module, release = slow_feedback
+    client = login()
+    question, feedback = answer(client, module)
+    assert feedback['explanation_status'] == 'pending'
+    assert feedback['explanation'] is None
+    token = feedback['explanation_token']
+
+    assert client.get(f'/api/feedback/{token}').status_code == 202
+    release.set()
+    response = client.get(f'/api/feedback/{token}?wait=5')
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'ready', 'explanation': f"Explained: {question['question']}"}
+
+    # Built once, the explanation is cached and comes straight back with the verdict
+    _, feedback = answer(client, module)
+    assert feedback['explanation_status'] == 'ready'
+    assert feedback['explanation'] == f"Explained: {question['question']}"
+
+
+def test_token_belongs_to_its_login(login, slow_feedback):
+    jobs, module, release = slow_feedback
+    owner, other = login(), login()
+    _, feedback = answer(owner, module)
+    token = feedback['explanation_token']
+    release.set()
+    assert other.get(f'/api/feedback/{token}?wait=5').status_code == 404
+    assert owner.get(f'/api/feedback/{token}?wait=5').status_code == 200
+
+    # Joining the same running job still gets a token of its own
+    module.feedback_cache.clear()
+    release.clear()
+    _, first = answer(owner, module)
+    _, second = answer(other, module)
+    assert first['explanation_token'] != second['explanation_token']
+    assert len(jobs.in_flight) == 1
+    release.set()
+    assert other.get(f"/api/feedback/{first['explanation_token']}").status_code == 404
+    assert other.get(f"/api/feedback/{second['explanation_token']}?wait=5").status_code == 200
+
+
+def test_forgotten_token_is_404(login, slow_feedback):
+    jobs, module, release = slow_feedback
+    client = login()
+    release.set()
+    tokens = [answer(client, module, index)[1]['explanation_token'] for index in range(4)]
+    # max_jobs is 3: the oldest token is forgotten
+    assert client.get(f'/api/feedback/{tokens[0]}').get_json()['status'] == 'unknown'
+    assert client.get(f'/api/feedback/{tokens[-1]}?wait=5').status_code == 200
+    assert client.get('/api/feedback/not-a-token').status_code == 404
+
+
+def test_waiter_cap(app_module, login, slow_feedback):
+    jobs, module, release = slow_feedback
+    client = login()
+    _, feedback = answer(client, module)
+    token = feedback['explanation_token']
+    # A second client with the same session cookie, as a second tab of the same login would be
+    tab = app_module.app.test_client()
+    tab.set_cookie('session', client.get_cookie('session').value)
+    waiting = threading.Thread(target=lambda: tab.get(f'/api/feedback/{token}?wait=10'))
+    waiting.start()
+    try:
+        for _ in range(100):
+            if jobs.waiting:
+                break
+            time.sleep(0.05)
+        assert jobs.waiting == 1
+        response = client.get(f'/api/feedback/{token}?wait=10')
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+        # Asking without waiting never counts against the cap
+        assert client.get(f'/api/feedback/{token}').status_code == 202
+    finally:
+        release.set()
+        waiting.join()
+    assert jobs.waiting == 0
+    assert client.get(f'/api/feedback/{token}?wait=10').status_code == 200
@@ -0,0 +1,45 @@
+"""Item analysis reuses its columns until a results log actually changes"""
+from app import ItemAnalysis, ResultsStore
+
+
+def attempt(selected, correct):
+    return {'timestamp': '2025-01-01T10:00:00', 'module': 'M05', 'total': 1, 'correct': int(correct),
+            'questions': [{'id': 1}], 'answers': [{'answered': True, 'selected': selected, 'correct': correct}]}
+
+
+class CountingStore(ResultsStore):
+    """A results store that counts how often a log is read"""
+
+    def __init__(self, results_dir):
+        super().__init__(results_dir)
+        self.reads = 0
+
+    def read_log(self, partition, start=0):
+        self.reads += 1
+        return super().read_log(partition, start)
+
+
+def test_torn_tail_and_empty_log_do_not_reload(tmp_path):
+    store = CountingStore(tmp_path / 'results')
+    store.append('alice', attempt('A', True))
+    store.append('bob', attempt('B', False))
+    with open(store.log_path(store.partition_name('alice')), 'ab') as f:
+        f.write(b'{"id": 2, "questions": [')  # A save that never finished
+    empty = tmp_path / 'results' / store.partition_name('carol')
+    empty.mkdir()
+    (empty / ResultsStore.LOG_NAME).touch()
+
+    analysis = ItemAnalysis(store)
+    signature, columns = analysis.get_columns()
+    assert len(columns['attempt']) == 2
+    reads = store.reads
+    for _ in range(3):
+        assert analysis.get_columns()[1] is columns
+    assert store.reads == reads
+
+    # Finishing the torn save (the next append cuts it off and writes a whole line) is picked up
+    store.append('alice', attempt('C', False))
+    new_signature, new_columns = analysis.get_columns()
+    assert new_signature != signature
+    assert len(new_columns['attempt']) == 3
+    assert analysis.get_columns()[1] is new_columns
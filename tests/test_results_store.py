@@ -0,0 +1,84 @@
+"""Per-user results log: recovering from a torn last line and moving the old single-file history"""
+import json
+
+from app import DEFAULT_USERNAME, ResultsStore
+
+
+def attempt(correct, total=10):
+    return {'timestamp': '2025-01-01T10:00:00', 'total': total, 'correct': correct,
+            'incorrect': total - correct, 'percentage': round(100 * correct / total, 1),
+            'questions': [{'id': 'q1'}], 'answers': [{'question_id': 'q1', 'answer': 'A'}]}
+
+
+def log_lines(store, username):
+    return store.log_path(store.partition_name(username)).read_bytes().split(b'\n')
+
+
+def tear_log(store, username):
+    """Leave a half-written attempt at the end of the log, as a crash mid-save would"""
+    with open(store.log_path(store.partition_name(username)), 'ab') as f:
+        f.write(b'{"id": 2, "timestamp": "2025-01-01T11:')
+
+
+def test_append_after_torn_last_line(tmp_path):
+    store = ResultsStore(tmp_path / 'results')
+    store.append('alice', attempt(7))
+    tear_log(store, 'alice')
+
+    # The torn line is not an attempt yet
+    assert [a['correct'] for a in store.history('alice')] == [7]
+
+    saved = store.append('alice', attempt(9))
+    assert saved['id'] == 2
+    lines = log_lines(store, 'alice')
+    assert lines[-1] == b''
+    assert [json.loads(line)['correct'] for line in lines[:-1]] == [7, 9]
+    assert [a['id'] for a in store.history('alice')] == [1, 2]
+    assert [e['correct'] for e in store.entries('alice')] == [7, 9]
+
+
+def test_append_after_torn_last_line_with_fresh_store(tmp_path):
+    # After a restart the summary index is read back from disk and caught up with the log
+    ResultsStore(tmp_path / 'results').append('alice', attempt(7))
+    store = ResultsStore(tmp_path / 'results')
+    tear_log(store, 'alice')
+
+    store.append('alice', attempt(4))
+    assert [json.loads(line)['correct'] for line in log_lines(store, 'alice')[:-1]] == [7, 4]
+    assert [a['correct'] for a in ResultsStore(tmp_path / 'results').history('alice')] == [7, 4]
+
+
+def test_history_leaves_out_questions_and_answers(tmp_path):
+    store = ResultsStore(tmp_path / 'results')
+    store.append('alice', attempt(7))
+    [summary] = store.history('alice')
+    assert 'questions' not in summary and 'answers' not in summary
+    [entry] = store.entries('alice')
+    assert entry['questions'] and entry['answers']
+
+
+def test_migrates_legacy_history(tmp_path):
+    legacy_file = tmp_path / 'results_history.json'
+    legacy = [dict(attempt(5), id=1), dict(attempt(8), id=2)]
+    legacy_file.write_text(json.dumps(legacy, indent=2), encoding='utf-8')
+    store = ResultsStore(tmp_path / 'results', legacy_file=legacy_file)
+
+    history = store.history(DEFAULT_USERNAME)
+    assert [(a['id'], a['correct']) for a in history] == [(1, 5), (2, 8)]
+    assert list(store.entries(DEFAULT_USERNAME)) == legacy
+    assert not legacy_file.exists()
+    assert (tmp_path / 'results_history.json.migrated').exists()
+
+    # New attempts carry on numbering after the migrated ones, and other users start empty
+    assert store.append(DEFAULT_USERNAME, attempt(10))['id'] == 3
+    assert store.history('someone-else') == []
+
+
+def test_migration_runs_once(tmp_path):
+    legacy_file = tmp_path / 'results_history.json'
+    legacy_file.write_text(json.dumps([dict(attempt(5), id=1)]), encoding='utf-8')
+    ResultsStore(tmp_path / 'results', legacy_file=legacy_file).append(DEFAULT_USERNAME, attempt(6))
+
+    # A later store finds only the renamed file and keeps what the first one saved
+    store = ResultsStore(tmp_path / 'results', legacy_file=legacy_file)
+    assert [a['correct'] for a in store.history(DEFAULT_USERNAME)] == [5, 6]
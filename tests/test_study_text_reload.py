@@ -0,0 +1,80 @@
+"""Study text reloads swap in a whole new store while requests keep reading the old one"""
+import os
+import threading
+
+from app import StudyTextIndex
+
+GUIDE = 'guide.txt'
+
+VERSION_A = """The insurer must pay an indemnity promptly once the loss has been proven by the policyholder.
+
+Subrogation allows the insurer to step into the shoes of the insured after paying an indemnity claim.
+"""
+
+# Different paragraphs and lengths, so every byte offset moves
+VERSION_B = """A long opening paragraph about something else entirely, written here only so that the offsets of the paragraphs after it move well away from where they were in the first version of the guide, which is what a reader mixing the two versions would trip over.
+
+Contribution applies when two insurers cover the same loss and each pays a rateable share of the indemnity owed.
+
+The indemnity principle means that the policyholder is restored to the same financial position as before the loss occurred.
+"""
+
+QUESTIONS = [('Which principle is the indemnity about?', ['Subrogation', 'Contribution']),
+             ('When does contribution apply to an indemnity?', None)]
+
+
+def write_guide(folder, text):
+    path = folder / GUIDE
+    path.write_text(text, encoding='utf-8')
+    # Size and mtime make up the signature: make sure each rewrite counts as a change
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def answers(index):
+    """What every lookup the feedback path makes returns, for each question"""
+    return [(index.find_relevant_text(question, options), index.core_feedback_explanation(question, 'an indemnity', options))
+            for question, options in QUESTIONS]
+
+
+def test_reload_while_reading(tmp_path):
+    expected = []
+    for version, text in (('a', VERSION_A), ('b', VERSION_B)):
+        (tmp_path / version).mkdir()
+        write_guide(tmp_path / version, text)
+        expected.append(answers(StudyTextIndex(tmp_path / version)))
+    assert expected[0] != expected[1]
+
+    folder = tmp_path / 'live'
+    folder.mkdir()
+    write_guide(folder, VERSION_A)
+    index = StudyTextIndex(folder)
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        try:
+            while not stop.is_set() and not errors:
+                for i, (question, options) in enumerate(QUESTIONS):
+                    # Each lookup sees one version or the other, never offsets of one with text of the other
+                    sections = index.find_relevant_text(question, options)
+                    if sections not in (expected[0][i][0], expected[1][i][0]):
+                        errors.append(sections)
+                    explanation = index.core_feedback_explanation(question, 'an indemnity', options)
+                    if explanation not in (expected[0][i][1], expected[1][i][1]):
+                        errors.append(explanation)
+        except Exception as e:  # A torn read used to end in UnicodeDecodeError or IndexError
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for i in range(20):
+        write_guide(folder, VERSION_B if i % 2 == 0 else VERSION_A)
+        assert index.refresh()
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+    assert answers(index) == expected[0]
@@ -0,0 +1,39 @@
+"""Load-time text cleaning removes PDF artifacts without touching ordinary text"""
+import pytest
+
+from app import TextNormalizer
+
+normalizer = TextNormalizer()
+
+
+@pytest.mark.parametrize('text', [
+    'a murmur heard; tartar and couscous',
+    'Bonbons, the tomtom and a dodo',
+    'Page 12 of the guide explains the duty of disclosure.',
+    'The Examination Guide explains how the questions are marked.',
+    'See part 2 and part 3 of the policy.',
+])
+def test_ordinary_text_is_kept(text):
+    assert normalizer.normalize(text, fix_ocr=False) == text
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Chapter 1Chapter 1\nIntroduction', 'Chapter 1\nIntroduction'),
+    ('Section 4 Section 4', 'Section 4'),
+    ('Chapter 1Chapter 12', 'Chapter 1Chapter 12'),
+])
+def test_duplicated_headings(text, expected):
+    assert normalizer.normalize(text, fix_ocr=False) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Before.\nPage 3\nAfter.', 'Before.\nAfter.'),
+    ('Before.\nPage 3 of 20\nAfter.', 'Before.\nAfter.'),
+    ('Before.\n1/15\nAfter.', 'Before.\nAfter.'),
+    ('Before.\nExamination Guide E05 Examination Guide 2025/2026 13\nAfter.', 'Before.\nAfter.'),
+    ('An insurer must act in good faith. Examination Guide E05 It also must pay.',
+     'An insurer must act in good faith. It also must pay.'),
+    ('The policy lapses. 2025/2026 13', 'The policy lapses.'),
+])
+def test_headers_and_footers_are_removed(text, expected):
+    assert normalizer.normalize(text, fix_ocr=False) == expected